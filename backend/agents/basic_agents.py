@@ -1,11 +1,24 @@
+import asyncio
 import requests
 import json
 import tiktoken # Import tiktoken
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+
+from backend import openrouter_client
+from backend.config.agent_config import (INDICATOR_CHUNK_SIZE,
+                                         INDICATOR_SCAN_MAX_IN_FLIGHT,
+                                         INDICATOR_SCAN_DEADLINE_SECONDS,
+                                         LOCAL_INDICATOR_CLASSIFIER_ENABLED)
+from backend.agents.embedding_classifier import classify_recent_narrative
+from backend.database.indicator_snapshots import FallbackIndicator, latest_message_id
 
 # --- Global Constants for Flask and API interactions ---
 FLASK_UPDATE_URL = "http://127.0.0.1:5000/update_label"
 FLASK_HEADERS = {'Content-Type': 'application/json'}
-OPENROUTER_API_CREDITS_URL = "https://openrouter.ai/api/v1/credits"
 LLM_CONFIG_FILE_PATH = "static/json/llm_config.json"
 
 def count_tokens(text: str, model_name: str) -> int:
@@ -47,12 +60,8 @@ def display_openrouter_balance():
     if not api_key:
         return None
 
-    headers = {
-        "Authorization": f"Bearer {api_key}"
-    }
-
     try:
-        response = requests.get(OPENROUTER_API_CREDITS_URL, headers=headers)
+        response = openrouter_client.get("/credits", api_key, timeout=10)
         response.raise_for_status()
         credits_data = response.json().get("data", {})
         
@@ -64,6 +73,38 @@ def display_openrouter_balance():
     except Exception:
         return None
 
+# --- Small-model reply parsing ---
+# Each cached_chat_completion call passes a cacheable predicate built from the same parser
+# the agent uses, so a reply the agent can't use is never cached and served again.
+
+def _reply_text(result: dict) -> str:
+    return result["choices"][0]["message"]["content"].strip()
+
+def _reply_int(result: dict) -> int:
+    return int(_reply_text(result))
+
+def _reply_json(result: dict) -> dict:
+    """The reply parsed as a JSON object (a markdown code fence around it is stripped)."""
+    llm_output = _reply_text(result)
+    if llm_output.startswith("```"):
+        llm_output = llm_output.strip("`").removeprefix("json").strip()
+    parsed_output = json.loads(llm_output)
+    if not isinstance(parsed_output, dict):
+        raise ValueError(f"expected a JSON object, got: {llm_output}")
+    return parsed_output
+
+def _cacheable_if(check):
+    """cacheable predicate: check(result) returns a truthy value without raising."""
+    def cacheable(result: dict) -> bool:
+        try:
+            return bool(check(result))
+        except (KeyError, IndexError, TypeError, AttributeError, ValueError):
+            return False
+    return cacheable
+
+def _int_reply_within(low: int, high: int):
+    return _cacheable_if(lambda result: low <= _reply_int(result) <= high)
+
 def get_safety_level(conversation_history: list[dict]) -> int:
     """
     Analyzes the conversation history to determine the threat level.
@@ -82,42 +123,32 @@ def get_safety_level(conversation_history: list[dict]) -> int:
         small_model = config.get("small_model")
     except Exception as e:
         print(f"Error loading LLM config: {e}")
-        return 5 # Default to unknown if config is missing
+        return FallbackIndicator(5) # Default to unknown if config is missing
 
     if not api_key or not small_model:
         print("API key or small model not found in config.")
-        return 5
+        return FallbackIndicator(5)
 
     # Use all available messages, up to the last 6
     formatted_history = "\n".join([f"{msg['role']}: {msg['content']}" for msg in conversation_history[-6:]])
 
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
     payload = {
         "model": small_model,
         "messages": [
             {"role": "system", "content": SAFETY_INDICATOR_SYS},
             {"role": "user", "content": SAFETY_INDICATOR_USER.format(conversation_history=formatted_history)}
         ],
-        "max_tokens": 1
+        "max_tokens": 1,
+        "temperature": 0.0
     }
 
     try:
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=15
-        )
-        response.raise_for_status()
-        result = response.json()
-        threat_level = int(result["choices"][0]["message"]["content"].strip())
+        result = openrouter_client.cached_chat_completion(api_key, payload, timeout=15, cacheable=_int_reply_within(0, 5))
+        threat_level = _reply_int(result)
         return max(0, min(5, threat_level)) # Clamp the value between 0 and 5
     except (requests.exceptions.RequestException, KeyError, ValueError, IndexError) as e:
         print(f"Error getting safety level: {e}")
-        return 5 # Default to unknown on error
+        return FallbackIndicator(5) # Default to unknown on error
 
 if __name__ == "__main__":
     balance = display_openrouter_balance()
@@ -140,49 +171,116 @@ def get_perceived_time_of_day(conversation_history: list[dict]) -> int:
         small_model = config.get("small_model")
     except Exception as e:
         print(f"Error loading LLM config: {e}")
-        return 13 # Default to unknown if config is missing
+        return FallbackIndicator(13) # Default to unknown if config is missing
 
     if not api_key or not small_model:
         print("API key or small model not found in config.")
-        return 13
+        return FallbackIndicator(13)
 
     # Use all available messages, up to the last 12
     formatted_history = "\n".join([f"{msg['role']}: {msg['content']}" for msg in conversation_history[-12:]])
 
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
     payload = {
         "model": small_model,
         "messages": [
             {"role": "system", "content": PERCEIVED_TIME_SYS},
             {"role": "user", "content": PERCEIVED_TIME_USER.format(conversation_history=formatted_history)}
         ],
-        "max_tokens": 1
+        "max_tokens": 1,
+        "temperature": 0.0
     }
 
     try:
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=15
-        )
-        response.raise_for_status()
-        result = response.json()
-        perceived_time_index = int(result["choices"][0]["message"]["content"].strip())
+        result = openrouter_client.cached_chat_completion(api_key, payload, timeout=15, cacheable=_int_reply_within(0, 13))
+        perceived_time_index = _reply_int(result)
         return max(0, min(13, perceived_time_index)) # Clamp the value between 0 and 13
     except (requests.exceptions.RequestException, KeyError, ValueError, IndexError) as e:
         print(f"Error getting perceived time of day: {e}")
-        return 13 # Default to unknown on error
+        return FallbackIndicator(13) # Default to unknown on error
+
+# --- Backward chunk scanning ---
+# Shared by the agents that search history newest-to-oldest for the most recent hint.
+# Up to INDICATOR_SCAN_MAX_IN_FLIGHT chunks are classified speculatively at once, but results
+# are consumed strictly newest-first, so the answer is always the newest chunk with a hint.
+_scan_semaphores = weakref.WeakValueDictionary()
+_scan_semaphores_lock = threading.Lock()
+
+def _scan_semaphore(session_id: str | None) -> threading.BoundedSemaphore:
+    """Returns the in-flight request limiter shared by every scan of one session."""
+    if session_id is None:
+        return threading.BoundedSemaphore(INDICATOR_SCAN_MAX_IN_FLIGHT)
+    with _scan_semaphores_lock:
+        semaphore = _scan_semaphores.get(session_id)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(INDICATOR_SCAN_MAX_IN_FLIGHT)
+            _scan_semaphores[session_id] = semaphore
+        return semaphore
+
+def scan_history_backwards(conversation_history: list[dict], classify_chunk, session_id: str | None = None,
+                           default=None):
+    """
+    Classifies conversation_history in chunks of INDICATOR_CHUNK_SIZE, newest first.
 
-def get_environment_accuracy_modifier(conversation_history: list[dict]) -> int:
+    classify_chunk(chunk) returns the indicator value when the chunk contains a hint, None
+    to keep searching older chunks, or raises when the chunk could not be classified.
+    Returns the newest chunk's value, or default if no chunk had a hint. When a chunk newer
+    than the answer failed, or the scan ran past INDICATOR_SCAN_DEADLINE_SECONDS, the answer
+    is not final and comes back as a FallbackIndicator.
+    """
+    chunks = [conversation_history[max(0, i - INDICATOR_CHUNK_SIZE):i]
+              for i in range(len(conversation_history), 0, -INDICATOR_CHUNK_SIZE)]
+    if not chunks:
+        return default
+
+    semaphore = _scan_semaphore(session_id)
+
+    def classify_with_limit(chunk):
+        with semaphore:
+            return classify_chunk(chunk)
+
+    deadline = time.monotonic() + INDICATOR_SCAN_DEADLINE_SECONDS
+    executor = ThreadPoolExecutor(max_workers=INDICATOR_SCAN_MAX_IN_FLIGHT)
+    try:
+        pending = deque()
+        next_chunk = 0
+        while next_chunk < len(chunks) and len(pending) < INDICATOR_SCAN_MAX_IN_FLIGHT:
+            pending.append(executor.submit(classify_with_limit, chunks[next_chunk]))
+            next_chunk += 1
+
+        failed = False
+        while pending:
+            try:
+                result = pending.popleft().result(timeout=max(0, deadline - time.monotonic()))
+            except FuturesTimeoutError:
+                print(f"Indicator scan deadline reached after {INDICATOR_SCAN_DEADLINE_SECONDS}s; using default.")
+                return FallbackIndicator(default)
+            except Exception:
+                # Already reported by classify_chunk; older chunks may still have a hint
+                failed, result = True, None
+            if result is not None:
+                return FallbackIndicator(result) if failed else result
+            # Newest pending chunk had no hint: keep the speculation window full
+            if next_chunk < len(chunks):
+                pending.append(executor.submit(classify_with_limit, chunks[next_chunk]))
+                next_chunk += 1
+        return FallbackIndicator(default) if failed else default
+    finally:
+        # Older speculative chunks are no longer needed once an answer is known
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def get_environment_accuracy_modifier(conversation_history: list[dict], session_id: str | None = None) -> int:
     """
     Analyzes the conversation history to determine the environment accuracy modifier (weather).
-    Searches backwards in chunks until a weather hint is found.
+    Searches backwards in chunks until a weather hint is found; pass session_id to share
+    the per-session cap on speculative in-flight chunk requests.
     """
     from prompts import ENVIRONMENT_ACCURACY_SYS, ENVIRONMENT_ACCURACY_USER
+
+    # Try the on-box embedding classifier first; it returns None when the match is ambiguous
+    if LOCAL_INDICATOR_CLASSIFIER_ENABLED:
+        local_index = classify_recent_narrative(conversation_history, "environment_accuracy_modifier")
+        if local_index is not None:
+            return local_index
     
     # Load LLM config to get API key and small model
     try:
@@ -192,27 +290,14 @@ def get_environment_accuracy_modifier(conversation_history: list[dict]) -> int:
         small_model = config.get("small_model")
     except Exception as e:
         print(f"Error loading LLM config: {e}")
-        return 5 # Default to Indoors/Dark if config is missing
+        return FallbackIndicator(5) # Default to Indoors/Dark if config is missing
 
     if not api_key or not small_model:
         print("API key or small model not found in config.")
-        return 5
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-
-    # Iterate backwards through conversation history in chunks of 12
-    # This allows finding the *last* relevant hint
-    history_length = len(conversation_history)
-    for i in range(history_length, 0, -12):
-        start_index = max(0, i - 12)
-        chunk = conversation_history[start_index:i]
-        
-        if not chunk:
-            continue # Skip empty chunks
+        return FallbackIndicator(5)
 
+    # Classify one chunk; None means no hint was found in it, an exception that the call failed
+    def classify_chunk(chunk):
         formatted_chunk = "\n".join([f"{msg['role']}: {msg['content']}" for msg in chunk])
 
         payload = {
@@ -221,19 +306,13 @@ def get_environment_accuracy_modifier(conversation_history: list[dict]) -> int:
                 {"role": "system", "content": ENVIRONMENT_ACCURACY_SYS},
                 {"role": "user", "content": ENVIRONMENT_ACCURACY_USER.format(conversation_history=formatted_chunk)}
             ],
-            "max_tokens": 1
+            "max_tokens": 1,
+            "temperature": 0.0
         }
 
         try:
-            response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=15
-            )
-            response.raise_for_status()
-            result = response.json()
-            environment_index = int(result["choices"][0]["message"]["content"].strip())
+            result = openrouter_client.cached_chat_completion(api_key, payload, timeout=15, cacheable=_int_reply_within(0, 5))
+            environment_index = _reply_int(result)
             
             # If the LLM returns a valid index (0-4), it means a hint was found in this chunk
             # If it returns 5 (Indoors/Dark), it means no hint was found in this chunk, or it's an enclosed space
@@ -249,19 +328,30 @@ def get_environment_accuracy_modifier(conversation_history: list[dict]) -> int:
             
         except (requests.exceptions.RequestException, KeyError, ValueError, IndexError) as e:
             print(f"Error getting environment accuracy modifier for chunk: {e}")
-            # Continue to next chunk if there's an error with this one
-            
+            # The scan continues with older chunks but won't treat its answer as final
+            raise
+        return None
+
+    # Search backwards through conversation history in chunks, several at a time.
+    # This still finds the *last* relevant hint
     # If no specific hint is found after checking all chunks, default to 0 (Clear skies)
     # This is a fallback if the LLM consistently returns ambiguous or unknown for outdoor settings
     # or if the conversation is too short.
-    return 0
+    return scan_history_backwards(conversation_history, classify_chunk, session_id, default=0)
 
-def get_location_terrain_category(conversation_history: list[dict]) -> int:
+def get_location_terrain_category(conversation_history: list[dict], session_id: str | None = None) -> int:
     """
     Analyzes the conversation history to determine the location/terrain category.
-    Searches backwards in chunks until a location/terrain hint is found.
+    Searches backwards in chunks until a location/terrain hint is found; pass session_id to
+    share the per-session cap on speculative in-flight chunk requests.
     """
     from prompts import LOCATION_TERRAIN_SYS, LOCATION_TERRAIN_USER
+
+    # Try the on-box embedding classifier first; it returns None when the match is ambiguous
+    if LOCAL_INDICATOR_CLASSIFIER_ENABLED:
+        local_index = classify_recent_narrative(conversation_history, "location_terrain_category")
+        if local_index is not None:
+            return local_index
     
     # Load LLM config to get API key and small model
     try:
@@ -271,27 +361,14 @@ def get_location_terrain_category(conversation_history: list[dict]) -> int:
         small_model = config.get("small_model")
     except Exception as e:
         print(f"Error loading LLM config: {e}")
-        return 19 # Default to Unknown/Obscured if config is missing
+        return FallbackIndicator(19) # Default to Unknown/Obscured if config is missing
 
     if not api_key or not small_model:
         print("API key or small model not found in config.")
-        return 19
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-
-    # Iterate backwards through conversation history in chunks of 12
-    # This allows finding the *last* relevant hint
-    history_length = len(conversation_history)
-    for i in range(history_length, 0, -12):
-        start_index = max(0, i - 12)
-        chunk = conversation_history[start_index:i]
-        
-        if not chunk:
-            continue # Skip empty chunks
+        return FallbackIndicator(19)
 
+    # Classify one chunk; None means no hint was found in it, an exception that the call failed
+    def classify_chunk(chunk):
         formatted_chunk = "\n".join([f"{msg['role']}: {msg['content']}" for msg in chunk])
 
         payload = {
@@ -300,19 +377,13 @@ def get_location_terrain_category(conversation_history: list[dict]) -> int:
                 {"role": "system", "content": LOCATION_TERRAIN_SYS},
                 {"role": "user", "content": LOCATION_TERRAIN_USER.format(conversation_history=formatted_chunk)}
             ],
-            "max_tokens": 1
+            "max_tokens": 1,
+            "temperature": 0.0
         }
 
         try:
-            response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=15
-            )
-            response.raise_for_status()
-            result = response.json()
-            location_index = int(result["choices"][0]["message"]["content"].strip())
+            result = openrouter_client.cached_chat_completion(api_key, payload, timeout=15, cacheable=_int_reply_within(0, 35))
+            location_index = _reply_int(result)
             
             # If the LLM returns a valid index (0-34), it means a hint was found in this chunk
             # If it returns 19 (Unknown/Obscured), it means no hint was found in this chunk.
@@ -323,15 +394,20 @@ def get_location_terrain_category(conversation_history: list[dict]) -> int:
             
         except (requests.exceptions.RequestException, KeyError, ValueError, IndexError) as e:
             print(f"Error getting location/terrain category for chunk: {e}")
-            # Continue to next chunk if there's an error with this one
-            
+            # The scan continues with older chunks but won't treat its answer as final
+            raise
+        return None
+
+    # Search backwards through conversation history in chunks, several at a time.
+    # This still finds the *last* relevant hint
     # If no specific hint is found after checking all chunks, default to 19 (Unknown/Obscured)
-    return 19
+    return scan_history_backwards(conversation_history, classify_chunk, session_id, default=19)
 
-def get_temperature(conversation_history: list[dict]) -> int:
+def get_temperature(conversation_history: list[dict], session_id: str | None = None) -> int:
     """
     Analyzes the conversation history to determine the perceived temperature.
-    Searches backwards in chunks until a temperature hint is found.
+    Searches backwards in chunks until a temperature hint is found; pass session_id to share
+    the per-session cap on speculative in-flight chunk requests.
     """
     # If there is no history, the temperature is unknown.
     if not conversation_history:
@@ -347,27 +423,14 @@ def get_temperature(conversation_history: list[dict]) -> int:
         small_model = config.get("small_model")
     except Exception as e:
         print(f"Error loading LLM config: {e}")
-        return 8 # Default to unknown if config is missing
+        return FallbackIndicator(8) # Default to unknown if config is missing
 
     if not api_key or not small_model:
         print("API key or small model not found in config.")
-        return 8
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-
-    # Iterate backwards through conversation history in chunks of 12
-    # This allows finding the *last* relevant hint
-    history_length = len(conversation_history)
-    for i in range(history_length, 0, -12):
-        start_index = max(0, i - 12)
-        chunk = conversation_history[start_index:i]
-        
-        if not chunk:
-            continue # Skip empty chunks
+        return FallbackIndicator(8)
 
+    # Classify one chunk; None means no hint was found in it, an exception that the call failed
+    def classify_chunk(chunk):
         formatted_chunk = "\n".join([f"{msg['role']}: {msg['content']}" for msg in chunk])
 
         payload = {
@@ -376,19 +439,13 @@ def get_temperature(conversation_history: list[dict]) -> int:
                 {"role": "system", "content": TEMPERATURE_SYS},
                 {"role": "user", "content": TEMPERATURE_USER.format(conversation_history=formatted_chunk)}
             ],
-            "max_tokens": 1
+            "max_tokens": 1,
+            "temperature": 0.0
         }
 
         try:
-            response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=15
-            )
-            response.raise_for_status()
-            result = response.json()
-            temperature_index = int(result["choices"][0]["message"]["content"].strip())
+            result = openrouter_client.cached_chat_completion(api_key, payload, timeout=15, cacheable=_int_reply_within(0, 8))
+            temperature_index = _reply_int(result)
             
             # If the LLM returns a valid index (0-8), it means a hint was found in this chunk
             if 0 <= temperature_index <= 8:
@@ -396,31 +453,244 @@ def get_temperature(conversation_history: list[dict]) -> int:
             
         except (requests.exceptions.RequestException, KeyError, ValueError, IndexError) as e:
             print(f"Error getting temperature for chunk: {e}")
-            # Continue to next chunk if there's an error with this one
-            
+            # The scan continues with older chunks but won't treat its answer as final
+            raise
+        return None
+
+    # Search backwards through conversation history in chunks, several at a time.
+    # This still finds the *last* relevant hint
     # If no specific hint is found after checking all chunks, default to 8 (Unknown)
-    return 8
+    return scan_history_backwards(conversation_history, classify_chunk, session_id, default=8)
+
+# Per-field validation for the combined classifier: (min, max, unknown/default value, fallback agent).
+# The ranges and defaults match the individual indicator agents above.
+WORLD_STATE_WINDOW = 12
+WORLD_STATE_FIELDS = {
+    "safety_level": (0, 5, 5, get_safety_level),
+    "perceived_time_of_day": (0, 13, 13, get_perceived_time_of_day),
+    "environment_accuracy_modifier": (0, 5, 0, get_environment_accuracy_modifier),
+    "location_terrain_category": (0, 35, 19, get_location_terrain_category),
+    "temperature": (0, 8, 8, get_temperature),
+}
+# Indicators whose individual agent searches backwards beyond the combined window for a hint
+WORLD_STATE_SCANNING_FIELDS = ("environment_accuracy_modifier", "location_terrain_category", "temperature")
+
+def get_world_state_indicators(conversation_history: list[dict], session_id: str | None = None) -> dict:
+    """
+    Scores safety, perceived time of day, weather, terrain and temperature in a single
+    structured-output request instead of five separate small-model calls.
+
+    Each field is validated and clamped to the same range as its individual agent. A field
+    that is missing or malformed falls back to its individual agent; a null weather/terrain/
+    temperature (no hint in the recent window) falls back to the backward-searching agent
+    only when the history extends beyond that window. The fallback agents run concurrently,
+    and the searching ones share session_id's cap on in-flight chunk requests.
+    """
+    if not conversation_history:
+        return {name: spec[2] for name, spec in WORLD_STATE_FIELDS.items()}
+
+    from prompts import WORLD_STATE_INDICATORS_SYS, WORLD_STATE_INDICATORS_USER
+
+    parsed_output = {}
+    try:
+        with open(LLM_CONFIG_FILE_PATH, 'r') as f:
+            config = json.load(f)
+        api_key = config.get("api_key")
+        small_model = config.get("small_model")
+    except Exception as e:
+        print(f"Error loading LLM config: {e}")
+        api_key = small_model = None
+
+    if api_key and small_model:
+        formatted_history = "\n".join([f"{msg['role']}: {msg['content']}" for msg in conversation_history[-WORLD_STATE_WINDOW:]])
+        payload = {
+            "model": small_model,
+            "messages": [
+                {"role": "system", "content": WORLD_STATE_INDICATORS_SYS},
+                {"role": "user", "content": WORLD_STATE_INDICATORS_USER.format(conversation_history=formatted_history)}
+            ],
+            "response_format": {"type": "json_object"},
+            "max_tokens": 80,
+            "temperature": 0.0
+        }
+        try:
+            result = openrouter_client.cached_chat_completion(api_key, payload, timeout=15, cacheable=_cacheable_if(_reply_json))
+            parsed_output = _reply_json(result)
+        except (requests.exceptions.RequestException, KeyError, ValueError, IndexError) as e:
+            print(f"Error getting world-state indicators: {e}")
+            parsed_output = {}
+    else:
+        print("API key or small model not found in config.")
+
+    indicators, fallbacks = {}, []
+    for name, (low, high, default, agent) in WORLD_STATE_FIELDS.items():
+        value = parsed_output.get(name, "missing")
+        if value is None:
+            # No hint in the recent window: older history may still have one
+            if name in WORLD_STATE_SCANNING_FIELDS and len(conversation_history) > WORLD_STATE_WINDOW:
+                fallbacks.append(name)
+            else:
+                indicators[name] = default
+            continue
+        try:
+            if isinstance(value, bool):
+                raise ValueError(value)
+            indicators[name] = max(low, min(high, int(value)))
+        except (TypeError, ValueError):
+            # Missing or malformed field: ask the dedicated agent for just this indicator
+            fallbacks.append(name)
+
+    if fallbacks:
+        indicators.update(asyncio.run(async_world_state_fallbacks(fallbacks, conversation_history, session_id)))
+    return {name: indicators[name] for name in WORLD_STATE_FIELDS}
+
+# Scene hints recorded per assistant message at write time: (min, max) per label.
+# "Unknown" indices are excluded: a message that establishes nothing stores null instead.
+SCENE_ANNOTATION_FIELDS = {
+    "environment_accuracy_modifier": (0, 5),
+    "location_terrain_category": (0, 35),
+    "temperature": (0, 7),
+    "perceived_time_of_day": (0, 12),
+}
+
+def annotate_scene(message: str) -> dict | None:
+    """
+    Classifies one new assistant message for the weather, terrain, temperature and
+    time-of-day hints it establishes. Returns {label: index or None}, or None when the
+    message could not be annotated (missing config, API or parse error).
+    """
+    from prompts import SCENE_ANNOTATION_SYS, SCENE_ANNOTATION_USER
+
+    if not message:
+        return {name: None for name in SCENE_ANNOTATION_FIELDS}
+
+    try:
+        with open(LLM_CONFIG_FILE_PATH, 'r') as f:
+            config = json.load(f)
+        api_key = config.get("api_key")
+        small_model = config.get("small_model")
+    except Exception as e:
+        print(f"Error loading LLM config: {e}")
+        return None
+
+    if not api_key or not small_model:
+        print("API key or small model not found in config.")
+        return None
+
+    payload = {
+        "model": small_model,
+        "messages": [
+            {"role": "system", "content": SCENE_ANNOTATION_SYS},
+            {"role": "user", "content": SCENE_ANNOTATION_USER.format(message=message)}
+        ],
+        "response_format": {"type": "json_object"},
+        "max_tokens": 60,
+        "temperature": 0.0
+    }
+
+    try:
+        result = openrouter_client.cached_chat_completion(api_key, payload, timeout=15, cacheable=_cacheable_if(_reply_json))
+        parsed_output = _reply_json(result)
+    except (requests.exceptions.RequestException, KeyError, ValueError, IndexError) as e:
+        print(f"Error annotating scene: {e}")
+        return None
+
+    labels = {}
+    for name, (low, high) in SCENE_ANNOTATION_FIELDS.items():
+        value = parsed_output.get(name)
+        # Out-of-range or malformed labels are treated as "not established by this message"
+        if isinstance(value, int) and not isinstance(value, bool) and low <= value <= high and not (name == "location_terrain_category" and value == 19):
+            labels[name] = value
+        else:
+            labels[name] = None
+    return labels
+
+def summarize_turns(previous_summary: str | None, messages: list[dict]) -> str | None:
+    """
+    Folds messages into the rolling story summary that replaces older turns in the
+    narrative prompt. Returns the updated summary, or None when it could not be produced
+    (missing config, API error, empty answer) so the caller keeps the previous one.
+    """
+    from prompts import ROLLING_SUMMARY_SYS, ROLLING_SUMMARY_USER
+
+    if not messages:
+        return previous_summary
+
+    try:
+        with open(LLM_CONFIG_FILE_PATH, 'r') as f:
+            config = json.load(f)
+        api_key = config.get("api_key")
+        small_model = config.get("small_model")
+    except Exception as e:
+        print(f"Error loading LLM config: {e}")
+        return None
+
+    if not api_key or not small_model:
+        print("API key or small model not found in config.")
+        return None
+
+    formatted_messages = "\n".join([f"{msg.get('role', 'user')}: {msg.get('content', '')}" for msg in messages if isinstance(msg, dict)])
+    payload = {
+        "model": small_model,
+        "messages": [
+            {"role": "system", "content": ROLLING_SUMMARY_SYS},
+            {"role": "user", "content": ROLLING_SUMMARY_USER.format(
+                summary=previous_summary or "(none yet)",
+                messages=formatted_messages
+            )}
+        ],
+        "max_tokens": 500,
+        "temperature": 0.0
+    }
+
+    try:
+        result = openrouter_client.cached_chat_completion(api_key, payload, timeout=45, cacheable=_cacheable_if(_reply_text))
+        summary = _reply_text(result)
+    except (requests.exceptions.RequestException, KeyError, ValueError, IndexError) as e:
+        print(f"Error summarizing conversation turns: {e}")
+        return None
+    return summary or None
 
 from backend.database.db_manager import ConversationManager
+from backend.database.session_headers import SessionHeaderStore
+
+_conversation_manager = None
+
+# Per-session header row: objective time and token totals without aggregating the messages
+session_headers = SessionHeaderStore()
+
+def get_conversation_manager() -> ConversationManager:
+    """
+    Returns the ConversationManager shared by the agents in this module, created on first
+    use, instead of constructing a new one (and its connection) on every call.
+    """
+    global _conversation_manager
+    if _conversation_manager is None:
+        _conversation_manager = ConversationManager()
+    return _conversation_manager
 
 def get_total_input_tokens(session_id: str) -> int:
     """
     Retrieves the total input tokens for a given session ID from the database.
     """
-    manager = ConversationManager()
-    total_input, _ = manager.get_total_tokens(session_id)
+    totals = session_headers.total_tokens(session_id) or get_conversation_manager().get_total_tokens(session_id)
+    total_input, _ = totals
     return total_input
 
 def get_total_output_tokens(session_id: str) -> int:
     """
     Retrieves the total output tokens for a given session ID from the database.
     """
-    manager = ConversationManager()
-    _, total_output = manager.get_total_tokens(session_id)
+    totals = session_headers.total_tokens(session_id) or get_conversation_manager().get_total_tokens(session_id)
+    _, total_output = totals
     return total_output
 
 from prompts import TESA_ANCHOR_IDENTIFIER_SYS, TESA_ANCHOR_IDENTIFIER_USER
 import random
+from backend.singleflight import SingleFlight
+
+# Coalesces concurrent TESA requests for the same session and history version
+tesa_flights = SingleFlight()
 
 def format_time(seconds: float) -> str:
     """
@@ -476,15 +746,37 @@ def apply_anchor_modifiers(current_drift: float, anchors: list[str]) -> float:
         current_drift *= reductions.get(anchor, 1.0)
     return max(current_drift, 0.1)
 
-def get_tesa_indicator(session_id: str) -> dict:
+def get_tesa_indicator(session_id: str, conversation=None) -> dict:
     """
     Calculates the TESA (Time Elapsed Since Arrival) indicator values.
+    Concurrent calls for the same session and newest message share one computation.
+    conversation is the request's ConversationSnapshot, if any; without one the history
+    and objective time are loaded from the database.
     """
     try:
-        manager = ConversationManager()
-        objective_time_seconds = manager.get_latest_objective_time(session_id)
-        conversation_history = manager.load_conversation(session_id)
+        if conversation is not None:
+            objective_time_seconds = conversation.latest_objective_time()
+            conversation_history = conversation.history
+        else:
+            manager = get_conversation_manager()
+            objective_time_seconds = session_headers.latest_objective_time(session_id)
+            if objective_time_seconds is None:
+                objective_time_seconds = manager.get_latest_objective_time(session_id)
+            conversation_history = manager.load_conversation(session_id)
+    except Exception as e:
+        print(f"An unexpected error occurred in get_tesa_indicator: {e}")
+        return {
+            "perceived_time_days": "Unknown",
+            "temporal_drift_days": "Unknown",
+            "time_anchors_identified": []
+        }
+
+    key = (session_id, latest_message_id(conversation_history), objective_time_seconds)
+    return tesa_flights.do(key, _score_tesa_indicator, objective_time_seconds, conversation_history)
 
+
+def _score_tesa_indicator(objective_time_seconds, conversation_history: list[dict]) -> dict:
+    try:
         if objective_time_seconds == 0 and not conversation_history:
             return {
                 "perceived_time_days": "Unknown",
@@ -514,11 +806,6 @@ def get_tesa_indicator(session_id: str) -> dict:
                 "time_anchors_identified": []
             }
 
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-
         # Use the last 24 messages to identify time anchors
         formatted_history = "\n".join([f"{msg['role']}: {msg['content']}" for msg in conversation_history[-24:]])
 
@@ -530,30 +817,17 @@ def get_tesa_indicator(session_id: str) -> dict:
                     conversation_history=formatted_history
                 )}
             ],
-            "max_tokens": 100
+            "max_tokens": 100,
+            "temperature": 0.0
         }
 
         time_anchors = []
         try:
-            response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
-            response.raise_for_status()
-            result = response.json()
-            llm_output = result["choices"][0]["message"]["content"].strip()
-            
-            # Strip markdown code block if present
-            if llm_output.startswith("```json"):
-                llm_output = llm_output[7:-3].strip()
-            
+            result = openrouter_client.cached_chat_completion(api_key, payload, timeout=30, cacheable=_cacheable_if(_reply_json))
             try:
-                parsed_output = json.loads(llm_output)
-                time_anchors = parsed_output.get("time_anchors_identified", [])
-            except json.JSONDecodeError as json_e:
-                print(f"JSON decoding error from LLM: {json_e}. LLM output: {llm_output}")
+                time_anchors = _reply_json(result).get("time_anchors_identified", [])
+            except ValueError as json_e:
+                print(f"JSON decoding error from LLM: {json_e}. LLM output: {_reply_text(result)}")
                 time_anchors = [] # Default to no anchors if JSON is invalid
         except (requests.exceptions.RequestException, KeyError, ValueError, IndexError) as e:
             print(f"Error identifying time anchors: {e}")
@@ -584,7 +858,7 @@ def get_tesa_indicator(session_id: str) -> dict:
         }
 
 
-def validate_player_response(session_id: str, player_message: str) -> bool:
+def validate_player_response(session_id: str, player_message: str, conversation=None) -> bool:
     """
     Validate whether a player's message is plausibly grounded in the recent narrative.
 
@@ -600,6 +874,9 @@ def validate_player_response(session_id: str, player_message: str) -> bool:
     - Returns True if the LLM indicates the message is plausible, False if it is
       clearly narrative/physics-breaking.
 
+    conversation is the request's ConversationSnapshot, if any, so the history is not
+    loaded again.
+
     Liberal acceptance policy: on any error or ambiguous LLM response, default to True.
     """
     from prompts import RESPONSE_VALIDITY_SYS
@@ -619,8 +896,10 @@ def validate_player_response(session_id: str, player_message: str) -> bool:
         return True
 
     try:
-        manager = ConversationManager()
-        conversation_history = manager.load_conversation(session_id) or []
+        if conversation is not None:
+            conversation_history = conversation.history
+        else:
+            conversation_history = get_conversation_manager().load_conversation(session_id) or []
 
         # Activation check: require at least 3 intro assistant messages
         # (the three intro system messages are persisted as role 'assistant' in the DB)
@@ -644,10 +923,6 @@ def validate_player_response(session_id: str, player_message: str) -> bool:
             "without in-world justification)."
         )
 
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
         payload = {
             "model": small_model,
             "messages": [
@@ -658,15 +933,11 @@ def validate_player_response(session_id: str, player_message: str) -> bool:
             "temperature": 0.0
         }
 
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=15
-        )
-        response.raise_for_status()
-        result = response.json()
-        llm_text = result["choices"][0]["message"]["content"].strip()
+        # Ambiguous replies (neither true nor false) are not cached
+        result = openrouter_client.cached_chat_completion(
+            api_key, payload, timeout=15,
+            cacheable=_cacheable_if(lambda reply: "true" in _reply_text(reply).lower() or "false" in _reply_text(reply).lower()))
+        llm_text = _reply_text(result)
 
         lowered = llm_text.lower()
         if lowered.startswith("true"):
@@ -688,3 +959,71 @@ def validate_player_response(session_id: str, player_message: str) -> bool:
     except Exception as e:
         print(f"Unexpected error in validate_player_response: {e}")
         return True
+
+
+# --- Async indicator agents ---
+# Awaitable wrappers around the blocking indicator agents. Each one runs on a worker thread
+# over the pooled OpenRouter session, so awaiting them together with asyncio.gather makes an
+# indicator refresh take as long as the slowest single agent instead of the sum of all of them.
+
+async def async_get_safety_level(conversation_history: list[dict]) -> int:
+    return await asyncio.to_thread(get_safety_level, conversation_history)
+
+async def async_get_perceived_time_of_day(conversation_history: list[dict]) -> int:
+    return await asyncio.to_thread(get_perceived_time_of_day, conversation_history)
+
+async def async_get_environment_accuracy_modifier(conversation_history: list[dict], session_id: str | None = None) -> int:
+    return await asyncio.to_thread(get_environment_accuracy_modifier, conversation_history, session_id)
+
+async def async_get_location_terrain_category(conversation_history: list[dict], session_id: str | None = None) -> int:
+    return await asyncio.to_thread(get_location_terrain_category, conversation_history, session_id)
+
+async def async_get_temperature(conversation_history: list[dict], session_id: str | None = None) -> int:
+    return await asyncio.to_thread(get_temperature, conversation_history, session_id)
+
+async def async_get_tesa_indicator(session_id: str) -> dict:
+    return await asyncio.to_thread(get_tesa_indicator, session_id)
+
+async def async_get_world_state_indicators(conversation_history: list[dict], session_id: str | None = None) -> dict:
+    return await asyncio.to_thread(get_world_state_indicators, conversation_history, session_id)
+
+async def async_world_state_fallbacks(names: list[str], conversation_history: list[dict], session_id: str | None = None) -> dict:
+    """
+    Runs the individual agents for the named world-state fields concurrently (the fallback
+    when the combined classifier left them missing or unresolved) and returns {name: value}.
+    """
+    agents = {
+        "safety_level": lambda: async_get_safety_level(conversation_history),
+        "perceived_time_of_day": lambda: async_get_perceived_time_of_day(conversation_history),
+        "environment_accuracy_modifier": lambda: async_get_environment_accuracy_modifier(conversation_history, session_id),
+        "location_terrain_category": lambda: async_get_location_terrain_category(conversation_history, session_id),
+        "temperature": lambda: async_get_temperature(conversation_history, session_id),
+    }
+    results = await asyncio.gather(*(agents[name]() for name in names))
+    return dict(zip(names, results))
+
+async def async_refresh_indicators(conversation_history: list[dict], session_id: str | None = None, score_world_state=None) -> dict:
+    """
+    Runs the combined world-state classifier (and TESA, when a session_id is given)
+    concurrently and returns their values keyed like the session 'game_state' dict.
+    score_world_state(conversation_history) replaces get_world_state_indicators when given.
+    """
+    if score_world_state is None:
+        agents = [async_get_world_state_indicators(conversation_history, session_id)]
+    else:
+        agents = [asyncio.to_thread(score_world_state, conversation_history)]
+    if session_id:
+        agents.append(async_get_tesa_indicator(session_id))
+
+    results = await asyncio.gather(*agents)
+
+    indicators = dict(results[0])
+    if session_id:
+        indicators['tesa'] = results[1]
+    return indicators
+
+def refresh_indicators(conversation_history: list[dict], session_id: str | None = None, score_world_state=None) -> dict:
+    """
+    Blocking entry point for Flask routes: runs async_refresh_indicators on a private event loop.
+    """
+    return asyncio.run(async_refresh_indicators(conversation_history, session_id, score_world_state))
@@ -0,0 +1,118 @@
+import re
+import threading
+
+import numpy as np
+
+from backend import embedding_model
+from backend.config.agent_config import (INDICATOR_CHUNK_SIZE,
+                                         LOCAL_CLASSIFIER_MIN_SIMILARITY,
+                                         LOCAL_CLASSIFIER_MIN_MARGIN)
+
+# Category lines in the indicator system prompts look like:
+#   - 3: Wilderness/Forest (e.g., dense woods, wild natural area, deep forest)
+CATEGORY_LINE_RE = re.compile(r"^- (\d+): ([^(\n]+?)\s*(?:\(e\.g\.,\s*([^)]*)\))?\s*$", re.M)
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
+
+# Categories that mean "no hint" are not prototypes: the LLM decides those
+EXCLUDED_CATEGORIES = {
+    "location_terrain_category": {19},  # Unknown/Obscured
+    "environment_accuracy_modifier": set(),
+}
+
+_prototypes = {}
+_prototypes_lock = threading.Lock()
+
+
+def parse_categories(system_prompt: str) -> dict[int, tuple[str, list[str]]]:
+    """
+    Extracts {index: (label, [examples])} from an indicator system prompt
+    (LOCATION_TERRAIN_SYS, ENVIRONMENT_ACCURACY_SYS).
+    """
+    categories = {}
+    for match in CATEGORY_LINE_RE.finditer(system_prompt):
+        examples = [e.strip() for e in (match.group(3) or "").split(",") if e.strip()]
+        categories[int(match.group(1))] = (match.group(2).strip(), examples)
+    return categories
+
+
+def _category_prompt(indicator: str) -> str:
+    from prompts import LOCATION_TERRAIN_SYS, ENVIRONMENT_ACCURACY_SYS
+    return {
+        "location_terrain_category": LOCATION_TERRAIN_SYS,
+        "environment_accuracy_modifier": ENVIRONMENT_ACCURACY_SYS,
+    }[indicator]
+
+
+def get_prototypes(indicator: str):
+    """
+    Returns (indices, matrix) for an indicator: one L2-normalized prototype embedding per
+    category, the centroid of its label and each of its examples. Computed once per process.
+    Returns None if the embedding model is unavailable.
+    """
+    with _prototypes_lock:
+        if indicator in _prototypes:
+            return _prototypes[indicator]
+
+        categories = parse_categories(_category_prompt(indicator))
+        excluded = EXCLUDED_CATEGORIES.get(indicator, set())
+        indices, texts, owners = [], [], []
+        for index, (label, examples) in sorted(categories.items()):
+            if index in excluded:
+                continue
+            indices.append(index)
+            for text in [f"{label}: {', '.join(examples)}" if examples else label, *examples]:
+                texts.append(text)
+                owners.append(len(indices) - 1)
+
+        vectors = embedding_model.encode(texts)
+        if vectors is None:
+            return None
+
+        owners = np.asarray(owners)
+        matrix = np.stack([vectors[owners == i].mean(axis=0) for i in range(len(indices))])
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        _prototypes[indicator] = (indices, matrix.astype(np.float32))
+        return _prototypes[indicator]
+
+
+def classify_recent_narrative(conversation_history: list[dict], indicator: str) -> int | None:
+    """
+    On-box classifier for location_terrain_category / environment_accuracy_modifier.
+
+    Embeds the sentences of the last INDICATOR_CHUNK_SIZE messages and compares them with the
+    category prototypes, newest message first. Returns the category of the newest message whose
+    best sentence match is confident (similarity >= LOCAL_CLASSIFIER_MIN_SIMILARITY and ahead of
+    the runner-up category by LOCAL_CLASSIFIER_MIN_MARGIN), or None to defer to the LLM.
+    """
+    prototypes = get_prototypes(indicator)
+    if prototypes is None or not conversation_history:
+        return None
+    indices, matrix = prototypes
+
+    messages = [m for m in conversation_history[-INDICATOR_CHUNK_SIZE:]
+                if isinstance(m, dict) and isinstance(m.get("content"), str) and m["content"].strip()]
+    sentences, owners = [], []
+    for position, message in enumerate(messages):
+        for sentence in SENTENCE_SPLIT_RE.split(message["content"].strip()):
+            if sentence:
+                sentences.append(sentence)
+                owners.append(position)
+    if not sentences:
+        return None
+
+    vectors = embedding_model.encode(sentences)
+    if vectors is None:
+        return None
+    similarities = vectors @ matrix.T  # cosine: both sides are normalized
+    owners = np.asarray(owners)
+
+    for position in range(len(messages) - 1, -1, -1):
+        message_scores = similarities[owners == position]
+        if message_scores.size == 0:
+            continue
+        best_sentence = message_scores[message_scores.max(axis=1).argmax()]
+        ranked = np.sort(best_sentence)[::-1]
+        runner_up = ranked[1] if ranked.size > 1 else -1.0
+        if ranked[0] >= LOCAL_CLASSIFIER_MIN_SIMILARITY and ranked[0] - runner_up >= LOCAL_CLASSIFIER_MIN_MARGIN:
+            return indices[int(best_sentence.argmax())]
+    return None
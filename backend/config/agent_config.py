@@ -0,0 +1,177 @@
+# -----------------------------
+# OpenRouter HTTP client settings
+# -----------------------------
+# Shared by backend/openrouter_client.py. Every agent, helper and Flask route that
+# talks to OpenRouter goes through one pooled session, so these values apply process-wide.
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+# Number of per-host connection pools kept alive, and the maximum number of
+# keep-alive connections in each pool (i.e. concurrent requests to openrouter.ai
+# that can reuse a warm TCP+TLS connection).
+OPENROUTER_POOL_CONNECTIONS = 4
+OPENROUTER_POOL_MAXSIZE = 16
+
+# Connect timeout is shared by every call; read timeouts are chosen per call
+# (small classifiers answer quickly, narrative generation can take much longer).
+OPENROUTER_CONNECT_TIMEOUT = 5
+OPENROUTER_DEFAULT_READ_TIMEOUT = 30
+
+# -----------------------------
+# Backward-searching indicator agents
+# -----------------------------
+# get_environment_accuracy_modifier, get_location_terrain_category and get_temperature
+# walk the history newest-to-oldest in chunks until one chunk yields a hint.
+
+INDICATOR_CHUNK_SIZE = 12
+
+# Chunks classified speculatively at the same time (older chunks are only used if every
+# newer one came back without a hint). The cap is shared by all scans of one session.
+INDICATOR_SCAN_MAX_IN_FLIGHT = 4
+
+# Upper bound on one scan's wall-clock time; when reached the agent falls back to its
+# "no hint found" default instead of waiting on older chunks.
+INDICATOR_SCAN_DEADLINE_SECONDS = 30
+
+# -----------------------------
+# Local embedding model (bundled MiniLM)
+# -----------------------------
+# The sentence-transformers cache shipped under backend/database/data/vector_cache.
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_CACHE_DIR = "backend/database/data/vector_cache"
+EMBEDDING_DIMENSIONS = 384
+EMBEDDING_MAX_SEQ_LENGTH = 256
+
+# Inference backend: "sentence-transformers" (full-precision PyTorch) or "onnx-int8"
+# (dynamically quantized ONNX export + fast tokenizer, created with
+# `python -m backend.embedding_model export`). The ONNX model is only used if its export
+# passed the parity check; otherwise the PyTorch model is loaded instead.
+EMBEDDING_BACKEND = "sentence-transformers"
+ONNX_EXPORT_DIR = "backend/database/data/vector_cache/onnx-int8"
+# Minimum cosine similarity between ONNX and PyTorch embeddings of the parity sentences
+ONNX_MIN_PARITY_COSINE = 0.98
+
+# -----------------------------
+# Shared embedding server
+# -----------------------------
+# With several web worker processes, run one `python -m backend.embedding_server` and set
+# EMBEDDING_SERVER_URL (e.g. "http://127.0.0.1:8765"): workers then send texts to it instead
+# of each loading its own model. Empty = load the model in this process.
+
+EMBEDDING_SERVER_URL = ""
+EMBEDDING_SERVER_HOST = "127.0.0.1"
+EMBEDDING_SERVER_PORT = 8765
+EMBEDDING_SERVER_TIMEOUT_SECONDS = 60
+
+# The server merges concurrent requests into one forward pass: it waits up to
+# EMBEDDING_SERVER_MAX_WAIT_MS after the first request for up to EMBEDDING_SERVER_MAX_BATCH texts.
+EMBEDDING_SERVER_MAX_BATCH = 64
+EMBEDDING_SERVER_MAX_WAIT_MS = 5
+
+# -----------------------------
+# Local terrain/weather classifier
+# -----------------------------
+# get_location_terrain_category and get_environment_accuracy_modifier first compare the
+# recent narrative against category prototype embeddings and only call the LLM when the
+# best match is weak or too close to the runner-up.
+
+LOCAL_INDICATOR_CLASSIFIER_ENABLED = True
+LOCAL_CLASSIFIER_MIN_SIMILARITY = 0.45
+LOCAL_CLASSIFIER_MIN_MARGIN = 0.05
+
+# -----------------------------
+# Small-model response cache
+# -----------------------------
+# Deterministic classifier/validator calls (temperature 0) are keyed by a hash of (API key,
+# model, messages, sampling params); byte-identical requests are answered from the cache.
+# Only replies the calling agent can parse are cached.
+
+RESPONSE_CACHE_MAX_ENTRIES = 4096
+RESPONSE_CACHE_TTL_SECONDS = 6 * 3600
+
+# Optional on-disk tier (SQLite file) that survives restarts; None keeps the cache in memory only.
+RESPONSE_CACHE_DISK_PATH = "backend/database/data/response_cache.sqlite3"
+
+# -----------------------------
+# Narrative context budget (query_llm)
+# -----------------------------
+# The main-model prompt keeps the system prepends and the last CONTEXT_RECENT_MESSAGES
+# messages verbatim; older messages are replaced by the session's rolling summary so the
+# prompt stays within CONTEXT_TOKEN_BUDGET tokens.
+
+CONTEXT_TOKEN_BUDGET = 6000
+CONTEXT_RECENT_MESSAGES = 12
+
+# Older messages are folded into the rolling summary in batches of this size, in the
+# background, once they fall out of the verbatim window.
+SUMMARY_BATCH_MESSAGES = 8
+
+# A session whose scene annotations fell behind (e.g. queued messages lost on a restart) has
+# at most this many of its newest unannotated assistant messages annotated; the scene hints
+# only need the newest labels.
+SCENE_ANNOTATION_BACKFILL_MESSAGES = 4
+
+# -----------------------------
+# Long-term memory retrieval (query_llm)
+# -----------------------------
+# Older messages of a session are embedded with the bundled MiniLM model; each turn the
+# MEMORY_TOP_K passages most similar to the player's message (outside the verbatim window)
+# are injected as a compact memory block.
+
+MEMORY_TOP_K = 4
+MEMORY_MIN_SIMILARITY = 0.30
+# Each recalled passage is truncated to this many characters in the prompt
+MEMORY_PASSAGE_MAX_CHARS = 600
+
+# -----------------------------
+# Approximate nearest-neighbour index (message embeddings)
+# -----------------------------
+# IVF index over the memory-mapped vectors under ANN_INDEX_DIR: one index per session
+# plus a global one. Below ANN_MIN_TRAIN_VECTORS vectors an index is searched exactly.
+
+ANN_INDEX_DIR = "backend/database/data/ann_index"
+ANN_MIN_TRAIN_VECTORS = 4096
+# Queries scan the ANN_NPROBE lists whose centroids are closest to the query
+ANN_NPROBE = 8
+# Unsorted inserts are merged into the list layout once they exceed this share of the index
+ANN_COMPACT_RATIO = 0.25
+
+# -----------------------------
+# Background vectorization (MessageMemory)
+# -----------------------------
+# save_message queues the session for embedding; the worker waits at most
+# VECTORIZE_MAX_LATENCY_MS after the first queued message to collect up to
+# VECTORIZE_BATCH_SIZE messages, then embeds them in one forward pass.
+
+VECTORIZE_BATCH_SIZE = 64
+VECTORIZE_MAX_LATENCY_MS = 200
+
+# Queued notifications beyond this are not dropped silently: the session is remembered
+# and caught up after the backlog clears (see /api/get_vectorization_status).
+VECTORIZE_QUEUE_MAX = 10000
+
+# Worker processes for embedding large batches (0 = embed in the worker thread, using
+# the model's own intra-op threads). Each process loads its own copy of the model.
+VECTORIZE_PROCESSES = 0
+
+# -----------------------------
+# Compact vector storage
+# -----------------------------
+# Format of stored message embeddings (database blobs and ANN index files):
+# "float32", "float16" (half the size, but ~8x slower to search: numpy converts half floats
+# in software) or "int8" (per-vector scale, ~4x smaller; brute-force scoring ~1.2x float32's
+# time in RAM, since codes are widened block by block, and less I/O when memory-mapped).
+# Existing data stays readable after a change; ANN indexes convert on their next rebuild/compaction.
+# Compare with: python -m backend.database.vector_codec
+
+VECTOR_STORAGE_FORMAT = "int8"
+
+# -----------------------------
+# Conversation history API (/api/get_conversation_history)
+# -----------------------------
+# Messages per page when the client pages the history (limit / before_id / since_id);
+# requests for larger pages are capped at HISTORY_PAGE_MAX.
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_PAGE_MAX = 200
@@ -0,0 +1,56 @@
+# -----------------------------
+# PostgreSQL connection settings
+# -----------------------------
+# Shared by main.py and the backend/database helpers that talk to roleplay_db directly.
+
+PG = dict(dbname="roleplay_db", user="rp_user", password="rp_pass",
+          host="localhost", port=5432)
+
+# -----------------------------
+# Connection pool (backend/database/pg_pool.py)
+# -----------------------------
+# One pool per process, shared by every store and ConversationManager instance.
+
+PG_POOL_MIN_CONNECTIONS = 1
+PG_POOL_MAX_CONNECTIONS = 10
+
+# A caller waits this long for a free connection before getting PoolTimeout
+PG_POOL_ACQUIRE_TIMEOUT_SECONDS = 10
+
+# Connections idle longer than this are checked with SELECT 1 before being handed out
+PG_POOL_HEALTHCHECK_IDLE_SECONDS = 30
+
+# -----------------------------
+# Schema (backend/database/schema.sql, applied by backend/database/migrate.py)
+# -----------------------------
+# Hash partitions for conversation_messages by session_id (0 = one plain table). Only
+# takes effect when the migration runner creates the table.
+
+PG_MESSAGE_PARTITIONS = 0
+
+# -----------------------------
+# Write-behind message persistence (backend/database/write_behind.py)
+# -----------------------------
+# When enabled, save_message returns once the message is queued and a background flusher
+# writes queued messages through ConversationManager.save_message, in order per session.
+# Reads through load_conversation still include queued messages. Off by default: a crash
+# (anything short of SIGTERM or a normal exit) loses whatever was still queued.
+
+WRITE_BEHIND_ENABLED = False
+
+# save_message blocks while this many messages are waiting to be written
+WRITE_BEHIND_MAX_PENDING = 1000
+
+# Messages the flusher takes off the queue per round, and how long it waits for more to
+# arrive before writing a partial batch
+WRITE_BEHIND_BATCH_SIZE = 100
+WRITE_BEHIND_FLUSH_INTERVAL_MS = 20
+
+# A failed write is retried with exponential backoff capped at this delay, for as long as
+# it keeps failing; meanwhile the queue fills up and save_message blocks (see MAX_PENDING)
+WRITE_BEHIND_RETRY_MAX_BACKOFF_MS = 5000
+
+# While stopping, attempts per message before the session's unwritten messages are
+# appended to WRITE_BEHIND_SPILL_FILE instead; start() queues them again
+WRITE_BEHIND_MAX_RETRIES = 3
+WRITE_BEHIND_SPILL_FILE = "backend/database/data/write_behind_spill.jsonl"
@@ -0,0 +1,603 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from backend.config.agent_config import (EMBEDDING_DIMENSIONS,
+                                         ANN_INDEX_DIR,
+                                         ANN_MIN_TRAIN_VECTORS,
+                                         ANN_NPROBE,
+                                         ANN_COMPACT_RATIO,
+                                         VECTOR_STORAGE_FORMAT)
+from backend.database.vector_codec import CODE_DTYPES, dequantize, quantize, row_bytes, similarities
+
+META_FILE = "meta.json"
+TRAINING_SAMPLE_SIZE = 65536
+COPY_BATCH_ROWS = 65536
+VECTOR_FILES = {"float32": "vectors.{generation}.f32",
+                "float16": "vectors.{generation}.f16",
+                "int8": "vectors.{generation}.i8"}
+SCALES_FILE = "scales.{generation}.f32"
+
+
+def best_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Returns the positions of the k highest scores, best first."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def top_k(matrix: np.ndarray, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Exact cosine top-k over L2-normalized rows. Returns (row indices, similarities),
+    best first.
+    """
+    if matrix.shape[0] == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    similarities = np.asarray(matrix @ query)
+    order = best_k(similarities, k)
+    return order, similarities[order]
+
+
+def default_nlist(count: int) -> int:
+    """Number of IVF lists for count vectors (~4*sqrt(n): ~250 vectors per list at 1M)."""
+    return int(min(max(4 * np.sqrt(count), 1), 8192))
+
+
+def assign_lists(vectors, centroids: np.ndarray) -> np.ndarray:
+    """Returns the index of the most similar centroid for every row of vectors."""
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), COPY_BATCH_ROWS):
+        batch = np.asarray(vectors[start:start + COPY_BATCH_ROWS], dtype=np.float32)
+        assignment[start:start + len(batch)] = np.argmax(batch @ centroids.T, axis=1)
+    return assignment
+
+
+def train_centroids(sample: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means over a sample of normalized vectors; returns (nlist, dim) unit centroids."""
+    rng = np.random.default_rng(seed)
+    sample = np.ascontiguousarray(sample, dtype=np.float32)
+    nlist = min(nlist, len(sample))
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = assign_lists(sample, centroids)
+        counts = np.bincount(assignment, minlength=nlist)
+        nonempty = np.flatnonzero(counts)
+        order = np.argsort(assignment, kind="stable")
+        starts = (np.cumsum(counts) - counts)[nonempty]
+        centroids[nonempty] = np.add.reduceat(sample[order], starts, axis=0)
+        empty = np.flatnonzero(counts == 0)
+        if empty.size:
+            # Re-seed lists that lost all their members
+            centroids[empty] = sample[rng.choice(len(sample), empty.size, replace=False)]
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+    return centroids
+
+
+class AnnIndex:
+    """
+    IVF (inverted file) index over L2-normalized vectors, stored memory-mapped in one directory.
+
+    Rows [0, sorted_count) are grouped by list (offsets[l]:offsets[l + 1] is list l), so a
+    query reads ANN_NPROBE contiguous slices. Inserts are appended to an unsorted tail
+    (already assigned to their list) and become searchable immediately; compact() merges
+    the tail into the grouped layout and drops removed ids, rebuild() also retrains the
+    centroids. Until ANN_MIN_TRAIN_VECTORS vectors exist the index is untrained and
+    searched exactly.
+
+    Vectors are stored as float32, float16 or int8 with a per-row scale (see
+    vector_codec); searches dequantize on the fly. An existing index keeps the format in
+    its meta.json and converts to vector_format at its next compaction or rebuild.
+
+    Files are written per generation and meta.json is replaced last, so a crash during
+    compaction leaves the previous generation intact. Compaction and rebuild write the next
+    generation from a snapshot of the rows without holding the index lock; add() and
+    search() keep working on the current generation meanwhile, and rows added during the
+    rewrite are carried over when it is swapped in. When add() makes a compaction (or the
+    first training) due, it runs on a background thread unless background_maintenance is
+    off.
+    """
+
+    def __init__(self, directory: str, dim: int = EMBEDDING_DIMENSIONS, vector_format: str = VECTOR_STORAGE_FORMAT,
+                 background_maintenance: bool = True):
+        self.directory = directory
+        self.dim = dim
+        self.vector_format = vector_format
+        self.background_maintenance = background_maintenance
+        self._lock = threading.RLock()
+        # Serializes compact()/rebuild(); held for a whole rewrite, unlike _lock
+        self._maintenance_lock = threading.Lock()
+        self._maintenance_thread = None
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    # --- storage -----------------------------------------------------------
+
+    def _path(self, name: str, generation: int | None = None) -> str:
+        generation = self.meta["generation"] if generation is None else generation
+        return os.path.join(self.directory, name.format(generation=generation))
+
+    def _load(self) -> None:
+        meta_path = os.path.join(self.directory, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                self.meta = json.load(f)
+            self.dim = self.meta["dim"]
+            self.meta.setdefault("format", "float32")
+        else:
+            self.meta = {"dim": self.dim, "generation": 0, "capacity": 0, "format": self.vector_format,
+                         "sorted_count": 0, "tail_count": 0, "nlist": 0}
+        self._map_arrays()
+
+        if self.meta["nlist"]:
+            self.centroids = np.load(self._path("centroids.{generation}.npy"))
+            self.offsets = np.load(self._path("offsets.{generation}.npy"))
+        else:
+            self.centroids = np.empty((0, self.dim), dtype=np.float32)
+            self.offsets = np.zeros(1, dtype=np.int64)
+
+        deleted_path = os.path.join(self.directory, "deleted.npy")
+        self.deleted = set(np.load(deleted_path).tolist()) if os.path.exists(deleted_path) else set()
+        self._deleted_array = np.fromiter(self.deleted, dtype=np.int64, count=len(self.deleted))
+
+        # list -> tail row numbers, so probing a list finds its unsorted inserts without a scan
+        self._tail_rows = defaultdict(list)
+        start = self.meta["sorted_count"]
+        if self.meta["nlist"]:
+            for offset, list_id in enumerate(np.asarray(self.lists[start:start + self.meta["tail_count"]]).tolist()):
+                self._tail_rows[list_id].append(start + offset)
+
+    def _map_arrays(self) -> None:
+        capacity, vector_format = self.meta["capacity"], self.meta["format"]
+        self.scales = None
+        if capacity == 0:
+            self.vectors = np.empty((0, self.dim), dtype=CODE_DTYPES[vector_format])
+            self.ids = np.empty(0, dtype=np.int64)
+            self.lists = np.empty(0, dtype=np.int32)
+            if vector_format == "int8":
+                self.scales = np.empty(0, dtype=np.float32)
+            return
+        self.vectors = np.memmap(self._path(VECTOR_FILES[vector_format]), dtype=CODE_DTYPES[vector_format], mode="r+", shape=(capacity, self.dim))
+        self.ids = np.memmap(self._path("ids.{generation}.i64"), dtype=np.int64, mode="r+", shape=(capacity,))
+        self.lists = np.memmap(self._path("lists.{generation}.i32"), dtype=np.int32, mode="r+", shape=(capacity,))
+        if vector_format == "int8":
+            self.scales = np.memmap(self._path(SCALES_FILE), dtype=np.float32, mode="r+", shape=(capacity,))
+
+    def _files(self, vector_format: str | None = None):
+        vector_format = vector_format or self.meta["format"]
+        files = [(VECTOR_FILES[vector_format], CODE_DTYPES[vector_format], self.dim),
+                 ("ids.{generation}.i64", np.int64, 1),
+                 ("lists.{generation}.i32", np.int32, 1)]
+        if vector_format == "int8":
+            files.append((SCALES_FILE, np.float32, 1))
+        return files
+
+    def _resize_files(self, generation: int, capacity: int, vector_format: str | None = None) -> None:
+        for name, dtype, width in self._files(vector_format):
+            with open(self._path(name, generation), "ab") as f:
+                f.truncate(capacity * width * np.dtype(dtype).itemsize)
+
+    def _similarities(self, rows, query: np.ndarray) -> np.ndarray:
+        """Similarities of query with the given rows (slice or row numbers), dequantized on the fly."""
+        return similarities(self.vectors[rows], None if self.scales is None else self.scales[rows], query)
+
+    def _decoded(self, rows, arrays: dict | None = None) -> np.ndarray:
+        """The given rows as float32 vectors (of a _snapshot() when arrays is given)."""
+        vectors, scales = (self.vectors, self.scales) if arrays is None else (arrays["vectors"], arrays["scales"])
+        return dequantize(vectors[rows], None if scales is None else scales[rows])
+
+    def _save_meta(self) -> None:
+        meta_path = os.path.join(self.directory, META_FILE)
+        with open(meta_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def _flush(self) -> None:
+        for array in (self.vectors, self.ids, self.lists, self.scales):
+            if isinstance(array, np.memmap):
+                array.flush()
+
+    def _grow(self, needed: int) -> None:
+        capacity = self.meta["capacity"]
+        if needed <= capacity:
+            return
+        self._flush()
+        new_capacity = max(needed, capacity * 2, 1024)
+        self._resize_files(self.meta["generation"], new_capacity)
+        self.meta["capacity"] = new_capacity
+        self._map_arrays()
+
+    # --- public API -------------------------------------------------------------
+
+    @property
+    def row_count(self) -> int:
+        return self.meta["sorted_count"] + self.meta["tail_count"]
+
+    @property
+    def trained(self) -> bool:
+        return self.meta["nlist"] > 0
+
+    def __len__(self) -> int:
+        return self.row_count - len(self.deleted)
+
+    def all_ids(self) -> np.ndarray:
+        """Returns the ids of every live (not removed) vector."""
+        with self._lock:
+            ids = np.asarray(self.ids[:self.row_count])
+            return ids[~np.isin(ids, self._deleted_array)] if self.deleted else ids.copy()
+
+    def add(self, ids, vectors) -> None:
+        """Appends vectors under new ids; they are searchable as soon as this returns."""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if ids.size == 0:
+            return
+        with self._lock:
+            start = self.row_count
+            self._grow(start + ids.size)
+            codes, scales = quantize(vectors, self.meta["format"])
+            self.vectors[start:start + ids.size] = codes
+            if scales is not None:
+                self.scales[start:start + ids.size] = scales
+            self.ids[start:start + ids.size] = ids
+            if self.trained:
+                assignment = assign_lists(vectors, self.centroids)
+                self.lists[start:start + ids.size] = assignment
+                for offset, list_id in enumerate(assignment.tolist()):
+                    self._tail_rows[list_id].append(start + offset)
+            else:
+                self.lists[start:start + ids.size] = 0
+            self.meta["tail_count"] += ids.size
+            self._flush()
+            self._save_meta()
+        self._schedule_maintenance()
+
+    def remove(self, ids) -> None:
+        """Tombstones ids; their rows are dropped at the next compaction."""
+        with self._lock:
+            self.deleted.update(int(i) for i in np.asarray(ids).reshape(-1))
+            self._deleted_array = np.fromiter(self.deleted, dtype=np.int64, count=len(self.deleted))
+            np.save(os.path.join(self.directory, "deleted.npy"), self._deleted_array)
+
+    def search(self, query, k: int, nprobe: int = ANN_NPROBE) -> tuple[np.ndarray, np.ndarray]:
+        """Returns (ids, similarities) of the approximate top-k vectors, best first."""
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        with self._lock:
+            sorted_count, row_count = self.meta["sorted_count"], self.row_count
+            if row_count == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+            if not self.trained:
+                id_blocks = [self.ids[:row_count]]
+                similarity_blocks = [self._similarities(slice(0, row_count), query)]
+            else:
+                probe, _ = top_k(self.centroids, query, nprobe)
+                id_blocks, similarity_blocks = [], []
+                for list_id in probe.tolist():
+                    start, end = self.offsets[list_id], self.offsets[list_id + 1]
+                    if end > start:
+                        id_blocks.append(self.ids[start:end])
+                        similarity_blocks.append(self._similarities(slice(start, end), query))
+                tail_rows = [row for list_id in probe.tolist() for row in self._tail_rows.get(list_id, ())]
+                if tail_rows:
+                    id_blocks.append(self.ids[tail_rows])
+                    similarity_blocks.append(self._similarities(tail_rows, query))
+
+            if not id_blocks:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            ids = np.concatenate([np.asarray(block) for block in id_blocks])
+            similarities = np.concatenate([np.asarray(block) for block in similarity_blocks])
+            if self.deleted:
+                live = ~np.isin(ids, self._deleted_array)
+                ids, similarities = ids[live], similarities[live]
+
+        order = best_k(similarities, k)
+        return ids[order], similarities[order]
+
+    def compact(self) -> None:
+        """Merges the unsorted tail into the list layout and drops removed ids (same centroids)."""
+        with self._maintenance_lock:
+            with self._lock:
+                snapshot = self._snapshot()
+            self._rewrite(snapshot, snapshot["centroids"], np.asarray(snapshot["lists"][:snapshot["row_count"]]))
+
+    def rebuild(self, nlist: int | None = None) -> None:
+        """Retrains the centroids on the live vectors, then reassigns and compacts every row."""
+        with self._maintenance_lock:
+            with self._lock:
+                snapshot = self._snapshot()
+            row_count = snapshot["row_count"]
+            rows = np.arange(row_count)
+            if snapshot["deleted"].size:
+                rows = rows[~np.isin(np.asarray(snapshot["ids"][:row_count]), snapshot["deleted"])]
+            if rows.size < ANN_MIN_TRAIN_VECTORS and nlist is None:
+                self._rewrite(snapshot, np.empty((0, self.dim), dtype=np.float32), np.zeros(row_count, dtype=np.int32))
+                return
+            live_count = rows.size
+            rng = np.random.default_rng(0)
+            if rows.size > TRAINING_SAMPLE_SIZE:
+                rows = np.sort(rng.choice(rows, TRAINING_SAMPLE_SIZE, replace=False))
+            centroids = train_centroids(self._decoded(rows, snapshot), nlist or default_nlist(live_count))
+            assignment = np.empty(row_count, dtype=np.int32)
+            for start in range(0, row_count, COPY_BATCH_ROWS):
+                batch = self._decoded(slice(start, min(start + COPY_BATCH_ROWS, row_count)), snapshot)
+                assignment[start:start + len(batch)] = assign_lists(batch, centroids)
+            self._rewrite(snapshot, centroids, assignment)
+
+    def maintain(self) -> None:
+        """Runs the compactions (or the first training) that add() has made due, until none is."""
+        try:
+            while True:
+                with self._lock:
+                    due, trained = self._maintenance_due(), self.trained
+                if not due:
+                    return
+                if trained:
+                    self.compact()
+                else:
+                    self.rebuild()
+        except Exception as e:
+            print(f"Error maintaining ANN index {self.directory}: {e}")
+
+    def wait_for_maintenance(self) -> None:
+        """Blocks until a background maintenance run, if any, has finished."""
+        thread = self._maintenance_thread
+        if thread is not None:
+            thread.join()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "vectors": len(self),
+                "sorted": self.meta["sorted_count"],
+                "unsorted_tail": self.meta["tail_count"],
+                "removed_pending": len(self.deleted),
+                "lists": self.meta["nlist"],
+                "capacity": self.meta["capacity"],
+                "format": self.meta["format"],
+                "disk_bytes": self.meta["capacity"] * (row_bytes(self.meta["format"], self.dim) + 8 + 4),
+            }
+
+    # --- maintenance ------------------------------------------------------------
+
+    def _maintenance_due(self) -> bool:
+        if not self.trained:
+            return len(self) >= ANN_MIN_TRAIN_VECTORS
+        return self.meta["tail_count"] > ANN_COMPACT_RATIO * max(self.meta["sorted_count"], 1)
+
+    def _schedule_maintenance(self) -> None:
+        """Runs maintain() when it is due: on a background thread, or inline if that is off."""
+        with self._lock:
+            if not self._maintenance_due():
+                return
+            if self.background_maintenance:
+                if self._maintenance_thread is None or not self._maintenance_thread.is_alive():
+                    self._maintenance_thread = threading.Thread(target=self.maintain, name="ann-maintenance", daemon=True)
+                    self._maintenance_thread.start()
+                return
+        self.maintain()
+
+    def _snapshot(self) -> dict:
+        """The current generation's arrays and row count (called with _lock held). Rows below
+        row_count are never modified, so a rewrite can read them without the lock."""
+        return {"row_count": self.row_count, "generation": self.meta["generation"], "format": self.meta["format"],
+                "vectors": self.vectors, "scales": self.scales, "ids": self.ids, "lists": self.lists,
+                "centroids": self.centroids, "deleted": self._deleted_array.copy()}
+
+    def _open_generation(self, generation: int, capacity: int, vector_format: str) -> dict:
+        arrays = {"vectors": np.memmap(self._path(VECTOR_FILES[vector_format], generation), dtype=CODE_DTYPES[vector_format], mode="r+", shape=(capacity, self.dim)),
+                  "ids": np.memmap(self._path("ids.{generation}.i64", generation), dtype=np.int64, mode="r+", shape=(capacity,)),
+                  "lists": np.memmap(self._path("lists.{generation}.i32", generation), dtype=np.int32, mode="r+", shape=(capacity,)),
+                  "scales": None}
+        if vector_format == "int8":
+            arrays["scales"] = np.memmap(self._path(SCALES_FILE, generation), dtype=np.float32, mode="r+", shape=(capacity,))
+        return arrays
+
+    def _copy_rows(self, source: dict, source_format: str, rows, target: dict, target_start: int, vector_format: str) -> None:
+        """Copies rows of source into target from target_start, re-encoding on a format change."""
+        end = target_start + len(rows)
+        if vector_format == source_format:
+            target["vectors"][target_start:end] = source["vectors"][rows]
+            if target["scales"] is not None:
+                target["scales"][target_start:end] = source["scales"][rows]
+        else:
+            codes, row_scales = quantize(self._decoded(rows, source), vector_format)
+            target["vectors"][target_start:end] = codes
+            if target["scales"] is not None:
+                target["scales"][target_start:end] = row_scales
+        target["ids"][target_start:end] = source["ids"][rows]
+
+    def _rewrite(self, snapshot: dict, centroids: np.ndarray, assignment: np.ndarray) -> None:
+        """
+        Writes the next generation with the snapshot's live rows grouped by assignment, then
+        (under the lock) appends the rows added since the snapshot and swaps it in.
+        """
+        row_count = snapshot["row_count"]
+        keep = np.arange(row_count)
+        if snapshot["deleted"].size:
+            keep = keep[~np.isin(np.asarray(snapshot["ids"][:row_count]), snapshot["deleted"])]
+        nlist = centroids.shape[0]
+        order = keep[np.argsort(assignment[keep], kind="stable")] if nlist else keep
+
+        old_generation, old_format = snapshot["generation"], snapshot["format"]
+        generation, vector_format = old_generation + 1, self.vector_format
+        capacity = max(order.size, 1024)
+        self._resize_files(generation, capacity, vector_format)
+        target = self._open_generation(generation, capacity, vector_format)
+        for start in range(0, order.size, COPY_BATCH_ROWS):
+            rows = order[start:start + COPY_BATCH_ROWS]
+            self._copy_rows(snapshot, old_format, rows, target, start, vector_format)
+            target["lists"][start:start + rows.size] = assignment[rows]
+
+        if nlist:
+            counts = np.bincount(assignment[order], minlength=nlist)
+            offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+            np.save(self._path("centroids.{generation}.npy", generation), centroids.astype(np.float32))
+            np.save(self._path("offsets.{generation}.npy", generation), offsets)
+
+        with self._lock:
+            # Rows added while the snapshot was rewritten become the new generation's tail
+            added = np.arange(row_count, self.row_count)
+            if order.size + added.size > capacity:
+                for array in target.values():
+                    if array is not None:
+                        array.flush()
+                capacity = order.size + added.size
+                self._resize_files(generation, capacity, vector_format)
+                target = self._open_generation(generation, capacity, vector_format)
+            if added.size:
+                current = {"vectors": self.vectors, "scales": self.scales, "ids": self.ids}
+                self._copy_rows(current, old_format, added, target, order.size, vector_format)
+                target["lists"][order.size:order.size + added.size] = (
+                    assign_lists(self._decoded(added), centroids) if nlist else 0)
+            for array in target.values():
+                if array is not None:
+                    array.flush()
+            del target
+
+            old_files = [name for name, _, _ in self._files(old_format)]
+            self.meta.update(generation=generation, capacity=capacity, nlist=nlist, format=vector_format,
+                             sorted_count=int(order.size) if nlist else 0,
+                             tail_count=int(added.size) if nlist else int(order.size + added.size))
+            self._save_meta()
+            # Removals that arrived during the rewrite still apply to the new generation
+            remaining = np.setdiff1d(self._deleted_array, snapshot["deleted"])
+            deleted_path = os.path.join(self.directory, "deleted.npy")
+            if remaining.size:
+                np.save(deleted_path, remaining)
+            elif os.path.exists(deleted_path):
+                os.remove(deleted_path)
+            for name in old_files + ["centroids.{generation}.npy", "offsets.{generation}.npy"]:
+                try:
+                    os.remove(self._path(name, old_generation))
+                except FileNotFoundError:
+                    pass
+            self._load()
+
+
+class AnnIndexSet:
+    """One AnnIndex per session under <root>/sessions/, plus a global index under <root>/global."""
+
+    def __init__(self, root: str = ANN_INDEX_DIR):
+        self.root = os.path.join(os.getcwd(), root) if not os.path.isabs(root) else root
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _directory_name(session_id: str) -> str:
+        if re.fullmatch(r"[A-Za-z0-9_-]{1,64}", session_id):
+            return session_id
+        return hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+
+    def _open(self, directory: str) -> AnnIndex:
+        with self._lock:
+            index = self._indexes.get(directory)
+            if index is None:
+                index = self._indexes[directory] = AnnIndex(directory)
+            return index
+
+    def session(self, session_id: str) -> AnnIndex:
+        return self._open(os.path.join(self.root, "sessions", self._directory_name(session_id)))
+
+    def global_index(self) -> AnnIndex:
+        return self._open(os.path.join(self.root, "global"))
+
+
+# -----------------------------
+# Maintenance commands and benchmark
+# -----------------------------
+# Run from the repository root:
+#   python -m backend.database.ann_index stats|compact|rebuild <session_id|global>
+#   python -m backend.database.ann_index reload-global   (re-index every stored embedding)
+#   python -m backend.database.ann_index bench [vectors] [float32|float16|int8]
+
+def run_benchmark(count: int = 1_000_000, queries: int = 200, k: int = 10,
+                  vector_format: str = VECTOR_STORAGE_FORMAT) -> None:
+    import shutil
+    import tempfile
+
+    rng = np.random.default_rng(1)
+    # Clustered synthetic corpus, closer to sentence embeddings than uniform noise
+    centers = rng.standard_normal((2000, EMBEDDING_DIMENSIONS)).astype(np.float32)
+    directory = tempfile.mkdtemp(prefix="ann_bench_")
+    try:
+        # The float32 originals are kept beside the index so recall is measured against them
+        originals = np.memmap(os.path.join(directory, "originals.f32"), dtype=np.float32, mode="w+",
+                              shape=(count, EMBEDDING_DIMENSIONS))
+        index = AnnIndex(os.path.join(directory, "index"), vector_format=vector_format)
+        started, add_latencies = time.perf_counter(), []
+        for start in range(0, count, 10_000):
+            size = min(10_000, count - start)
+            batch = centers[rng.integers(len(centers), size=size)] + 0.6 * rng.standard_normal((size, EMBEDDING_DIMENSIONS)).astype(np.float32)
+            batch /= np.linalg.norm(batch, axis=1, keepdims=True)
+            originals[start:start + size] = batch
+            added = time.perf_counter()
+            index.add(np.arange(start, start + size), batch)
+            add_latencies.append((time.perf_counter() - added) * 1000)
+        index.wait_for_maintenance()
+        index.rebuild()
+        print(f"Indexed {count} vectors in {time.perf_counter() - started:.1f}s "
+              f"(add() of 10000: median {np.median(add_latencies):.1f} ms, max {max(add_latencies):.1f} ms): {index.stats()}")
+
+        query_vectors = centers[rng.integers(len(centers), size=queries)] + 0.6 * rng.standard_normal((queries, EMBEDDING_DIMENSIONS)).astype(np.float32)
+        query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+        # Exact float32 top-k, computed in blocks so the corpus never has to fit in memory at once
+        truth_scores = np.full((queries, k), -np.inf, dtype=np.float32)
+        truth_ids = np.zeros((queries, k), dtype=np.int64)
+        for start in range(0, count, COPY_BATCH_ROWS):
+            block = np.asarray(originals[start:start + COPY_BATCH_ROWS])
+            scores = np.concatenate([truth_scores, query_vectors @ block.T], axis=1)
+            ids = np.concatenate([truth_ids, np.broadcast_to(np.arange(start, start + len(block)), (queries, len(block)))], axis=1)
+            best = np.argsort(-scores, axis=1)[:, :k]
+            truth_scores, truth_ids = np.take_along_axis(scores, best, 1), np.take_along_axis(ids, best, 1)
+        index.search(query_vectors[0], k)  # warm the page cache for the centroids
+
+        latencies, hits, stored_hits = [], 0, 0
+        for query, truth in zip(query_vectors, truth_ids):
+            started = time.perf_counter()
+            ids, _ = index.search(query, k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            found = set(ids.tolist())
+            hits += len(found & set(truth.tolist()))
+            # Exact search over the stored (possibly quantized) vectors separates ANN loss from codec loss
+            exact = best_k(index._similarities(slice(0, index.row_count), query), k)
+            stored_hits += len(found & set(np.asarray(index.ids[exact]).tolist()))
+        latencies = np.sort(latencies)
+        print(f"top-{k} over {count} {vector_format} vectors, nprobe={ANN_NPROBE}: "
+              f"median {np.median(latencies):.3f} ms, p99 {latencies[int(0.99 * (len(latencies) - 1))]:.3f} ms, "
+              f"recall@{k} vs float32 {hits / (queries * k):.3f} "
+              f"(vs exact search over stored vectors {stored_hits / (queries * k):.3f})")
+        del originals
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "bench"
+    if command == "bench":
+        run_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000,
+                      vector_format=sys.argv[3] if len(sys.argv) > 3 else VECTOR_STORAGE_FORMAT)
+    elif command in ("stats", "compact", "rebuild") and len(sys.argv) > 2:
+        indexes = AnnIndexSet()
+        target = indexes.global_index() if sys.argv[2] == "global" else indexes.session(sys.argv[2])
+        if command == "compact":
+            target.compact()
+        elif command == "rebuild":
+            target.rebuild()
+        print(json.dumps(target.stats(), indent=2))
+    elif command == "reload-global":
+        from backend.database.message_memory import MessageMemory
+        print(f"Global index holds {MessageMemory(load_conversation=None).reload_global_index()} vectors")
+    else:
+        print("usage: python -m backend.database.ann_index stats|compact|rebuild <session_id|global>")
+        print("       python -m backend.database.ann_index reload-global")
+        print("       python -m backend.database.ann_index bench [vectors] [float32|float16|int8]")
@@ -0,0 +1,100 @@
+import psycopg2
+
+from backend.config.agent_config import HISTORY_PAGE_SIZE, HISTORY_PAGE_MAX
+from backend.config.db_config import PG
+from backend.database.pg_pool import get_pool
+
+HISTORY_COLUMNS = "id, role, content, objective_time, timestamp"
+
+
+def clamp_limit(limit: int | None) -> int:
+    return HISTORY_PAGE_SIZE if limit is None else max(1, min(int(limit), HISTORY_PAGE_MAX))
+
+
+def _page(messages: list[dict], has_more: bool) -> dict:
+    return {
+        "messages": messages,
+        "has_more": has_more,
+        "oldest_id": messages[0]["id"] if messages else None,
+        "newest_id": messages[-1]["id"] if messages else None,
+    }
+
+
+def page_from_history(history: list[dict], before_id: int | None = None, since_id: int | None = None,
+                      limit: int | None = None) -> dict:
+    """
+    Same pages as ConversationPages, cut from an already loaded history. Cursors are
+    message ids, so paging needs every message to carry its database id; a history
+    without them is returned whole as the newest page, with no cursors (and no has_more),
+    and a before_id / since_id request against it raises ValueError. Numbering such
+    messages by position would hand the client cursors that mean something else to
+    ConversationPages.
+    """
+    limit = clamp_limit(limit)
+    messages = list(history or [])
+    if not all(isinstance(message.get("id"), int) for message in messages):
+        if before_id is not None or since_id is not None:
+            raise ValueError("the loaded history has no message ids to page by")
+        return {"messages": messages, "has_more": False, "oldest_id": None, "newest_id": None}
+    if since_id is not None:
+        newer = [m for m in messages if m["id"] > since_id]
+        return _page(newer[:limit], len(newer) > limit)
+    if before_id is not None:
+        messages = [m for m in messages if m["id"] < before_id]
+    return _page(messages[-limit:], len(messages) > limit)
+
+
+class ConversationPages:
+    """
+    Keyset-paginated reads of a session's messages for /api/get_conversation_history, so the
+    client fetches one page at a time instead of the whole session.
+
+    before(): the `limit` messages just older than before_id (the newest page without it),
+    for scrolling back. since(): the messages newer than since_id, so a client only fetches
+    what it has not seen. Both are range scans of the (session_id, id) primary key of
+    conversation_messages; pages are returned oldest first, with has_more telling whether
+    the range continues past the page.
+
+    Methods return None when the table cannot be read, so the route can fall back to
+    page_from_history over ConversationManager.load_conversation.
+    """
+
+    def __init__(self, pg_settings: dict | None = None):
+        self.pg_settings = pg_settings or PG
+
+    def _fetch(self, session_id: str, sql: str, params: tuple) -> list[dict] | None:
+        try:
+            with get_pool(self.pg_settings).connection() as conn:
+                with conn, conn.cursor() as cur:
+                    cur.execute(sql, params)
+                    columns = [column[0] for column in cur.description]
+                    return [dict(zip(columns, row)) for row in cur.fetchall()]
+        except psycopg2.Error as e:
+            print(f"Error reading conversation page for session {session_id}: {e}")
+            return None
+
+    def before(self, session_id: str, before_id: int | None = None, limit: int | None = None) -> dict | None:
+        limit = clamp_limit(limit)
+        if before_id is None:
+            rows = self._fetch(session_id,
+                               f"SELECT {HISTORY_COLUMNS} FROM conversation_messages "
+                               "WHERE session_id = %s ORDER BY id DESC LIMIT %s",
+                               (session_id, limit + 1))
+        else:
+            rows = self._fetch(session_id,
+                               f"SELECT {HISTORY_COLUMNS} FROM conversation_messages "
+                               "WHERE session_id = %s AND id < %s ORDER BY id DESC LIMIT %s",
+                               (session_id, before_id, limit + 1))
+        if rows is None:
+            return None
+        return _page(rows[:limit][::-1], len(rows) > limit)
+
+    def since(self, session_id: str, since_id: int, limit: int | None = None) -> dict | None:
+        limit = clamp_limit(limit)
+        rows = self._fetch(session_id,
+                           f"SELECT {HISTORY_COLUMNS} FROM conversation_messages "
+                           "WHERE session_id = %s AND id > %s ORDER BY id LIMIT %s",
+                           (session_id, since_id, limit + 1))
+        if rows is None:
+            return None
+        return _page(rows[:limit], len(rows) > limit)
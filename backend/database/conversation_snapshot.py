@@ -0,0 +1,47 @@
+class ConversationSnapshot:
+    """
+    Request-scoped view of one session's conversation, so the agents called while handling
+    a chat turn share one load instead of each querying the full history again.
+
+    The history is loaded on first access. Messages saved through the snapshot are written
+    with conversation_manager.save_message as usual and, once the history has been loaded,
+    appended to it in memory. The latest objective time is likewise read once and then
+    tracked from the saved messages; with a SessionHeaderStore that first read is a
+    primary-key lookup on the session's header row.
+
+    A snapshot is only meant to live for one request (or the background task that finishes
+    it); messages saved elsewhere in the meantime are not seen.
+    """
+
+    def __init__(self, conversation_manager, session_id: str, session_headers=None):
+        self.conversation_manager = conversation_manager
+        self.session_id = session_id
+        self.session_headers = session_headers
+        self._history = None
+        self._objective_time = None
+
+    @property
+    def history(self) -> list[dict]:
+        """The session's messages, oldest first (loaded on first access)."""
+        if self._history is None:
+            self._history = self.conversation_manager.load_conversation(self.session_id) or []
+        return self._history
+
+    def latest_objective_time(self) -> int:
+        if self._objective_time is None and self.session_headers is not None:
+            self._objective_time = self.session_headers.latest_objective_time(self.session_id)
+        if self._objective_time is None:
+            self._objective_time = self.conversation_manager.get_latest_objective_time(self.session_id)
+        return self._objective_time
+
+    def save_message(self, role: str, content: str, **kwargs):
+        """Saves a message for the session and keeps the snapshot in step with it."""
+        result = self.conversation_manager.save_message(self.session_id, role, content, **kwargs)
+        if self._history is not None:
+            message = {"role": role, "content": content}
+            if isinstance(result, int):
+                message["id"] = result
+            self._history.append(message)
+        if kwargs.get("objective_time") is not None:
+            self._objective_time = kwargs["objective_time"]
+        return result
@@ -0,0 +1,140 @@
+import contextlib
+import functools
+import queue
+import threading
+
+import psycopg2
+
+from backend.config.agent_config import CONTEXT_RECENT_MESSAGES, SUMMARY_BATCH_MESSAGES
+from backend.config.db_config import PG
+from backend.database.pg_pool import get_pool
+
+CONVERSATION_SUMMARIES_DDL = """
+CREATE TABLE IF NOT EXISTS conversation_summaries (
+    session_id     TEXT        PRIMARY KEY,
+    covered_count  INTEGER     NOT NULL,
+    summary        TEXT        NOT NULL,
+    updated_at     TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+
+class RollingSummaryStore:
+    """
+    Keeps one rolling summary per session covering its oldest messages, so the narrative
+    prompt can replace those turns with a few hundred tokens of summary.
+
+    The summary is extended incrementally in the background: once at least
+    SUMMARY_BATCH_MESSAGES messages have left the verbatim window (the last
+    CONTEXT_RECENT_MESSAGES), they are folded into the previous summary with one
+    small-model call. covered_count is the number of leading messages the summary covers;
+    messages are only ever appended, so positions are stable.
+    """
+
+    def __init__(self, summarize, load_conversation, pg_settings: dict | None = None):
+        # summarize(previous_summary, messages) -> updated summary, or None on failure
+        self.summarize = summarize
+        # load_conversation(session_id) -> list of message dicts, oldest first
+        self.load_conversation = load_conversation
+        self.pg_settings = pg_settings or PG
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._queued_lock = threading.Lock()
+        self._schema_ready = False
+        self._worker = None
+
+    @contextlib.contextmanager
+    def _connection(self):
+        """Borrows a connection from the process-wide pool, creating the tables on first use."""
+        with get_pool(self.pg_settings).connection() as conn:
+            if not self._schema_ready:
+                with conn, conn.cursor() as cur:
+                    cur.execute(CONVERSATION_SUMMARIES_DDL)
+                self._schema_ready = True
+            yield conn
+
+    def attach_to(self, conversation_manager) -> None:
+        """
+        Hooks into conversation_manager.save_message: each saved assistant message
+        schedules a (cheap, usually no-op) summary update for its session.
+        """
+        save_message = conversation_manager.save_message
+
+        @functools.wraps(save_message)
+        def save_and_summarize(session_id, role, content, *args, **kwargs):
+            result = save_message(session_id, role, content, *args, **kwargs)
+            if role == "assistant":
+                self.enqueue(session_id)
+            return result
+
+        conversation_manager.save_message = save_and_summarize
+
+    def start(self) -> None:
+        """Starts the background summarizer (idempotent)."""
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="rolling-summarizer", daemon=True)
+            self._worker.start()
+
+    def enqueue(self, session_id: str) -> None:
+        """Schedules a summary update; a session already waiting in the queue is not added twice."""
+        with self._queued_lock:
+            if session_id in self._queued:
+                return
+            self._queued.add(session_id)
+        self._queue.put(session_id)
+
+    def get(self, session_id: str) -> tuple[int, str | None]:
+        """Returns (covered_count, summary) for the session, or (0, None) if none is stored."""
+        try:
+            with self._connection() as conn:
+                with conn, conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT covered_count, summary FROM conversation_summaries WHERE session_id = %s",
+                        (session_id,)
+                    )
+                    row = cur.fetchone()
+        except psycopg2.Error as e:
+            print(f"Error reading rolling summary for session {session_id}: {e}")
+            return 0, None
+        return (row[0], row[1]) if row else (0, None)
+
+    def _put(self, session_id: str, covered_count: int, summary: str) -> None:
+        with self._connection() as conn:
+            with conn, conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO conversation_summaries (session_id, covered_count, summary) "
+                    "VALUES (%s, %s, %s) "
+                    "ON CONFLICT (session_id) DO UPDATE "
+                    "SET covered_count = EXCLUDED.covered_count, summary = EXCLUDED.summary, updated_at = now() "
+                    "WHERE conversation_summaries.covered_count < EXCLUDED.covered_count",
+                    (session_id, covered_count, summary)
+                )
+
+    def update(self, session_id: str) -> None:
+        """
+        Folds every complete batch of messages that has left the verbatim window into the
+        stored summary, one batch per small-model call. Stops at the first failed call.
+        """
+        history = self.load_conversation(session_id) or []
+        summarizable = len(history) - CONTEXT_RECENT_MESSAGES
+        covered_count, summary = self.get(session_id)
+
+        while summarizable - covered_count >= SUMMARY_BATCH_MESSAGES:
+            batch_end = covered_count + SUMMARY_BATCH_MESSAGES
+            updated = self.summarize(summary, history[covered_count:batch_end])
+            if not updated:
+                return
+            self._put(session_id, batch_end, updated)
+            covered_count, summary = batch_end, updated
+
+    def _run(self) -> None:
+        while True:
+            session_id = self._queue.get()
+            with self._queued_lock:
+                self._queued.discard(session_id)
+            try:
+                self.update(session_id)
+            except Exception as e:
+                print(f"Error updating rolling summary for session {session_id}: {e}")
+            finally:
+                self._queue.task_done()
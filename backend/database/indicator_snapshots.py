@@ -0,0 +1,142 @@
+import contextlib
+import json
+
+import psycopg2
+
+from backend.config.db_config import PG
+from backend.database.pg_pool import get_pool
+from backend.singleflight import SingleFlight
+
+INDICATOR_SNAPSHOTS_DDL = """
+CREATE TABLE IF NOT EXISTS indicator_snapshots (
+    session_id  TEXT        NOT NULL,
+    indicator   TEXT        NOT NULL,
+    message_id  BIGINT      NOT NULL,
+    value       JSONB       NOT NULL,
+    updated_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (session_id, indicator)
+);
+"""
+
+
+class FallbackIndicator(int):
+    """
+    An indicator agent's default, returned in place of a classification it could not make
+    (LLM config missing, request failed, unparseable reply, scan cut short). Behaves as the
+    int it wraps; IndicatorSnapshotStore never stores it, so the next request tries again
+    instead of serving the default until the conversation advances.
+    """
+
+    def __repr__(self):
+        return f"FallbackIndicator({int(self)})"
+
+
+def latest_message_id(conversation_history: list[dict]) -> int:
+    """
+    Returns the id of the newest message in a loaded conversation, i.e. the history
+    version an indicator was computed from. Trailing rows without an id (e.g. messages
+    still queued by the write-behind queue) count up from the newest id before them; a
+    history without ids falls back to the message count. Both only grow as the
+    conversation advances.
+    """
+    for position in range(len(conversation_history or []) - 1, -1, -1):
+        message = conversation_history[position]
+        message_id = message.get("id") if isinstance(message, dict) else None
+        if isinstance(message_id, int):
+            return message_id + len(conversation_history) - 1 - position
+    return len(conversation_history or [])
+
+
+class IndicatorSnapshotStore:
+    """
+    Persists indicator results per session, tagged with the id of the newest message
+    they were computed from. Indicator routes return the stored value while no newer
+    message exists and only rerun the LLM classifier once the conversation has advanced.
+
+    Any database error degrades to "no snapshot", so callers simply recompute.
+    Concurrent get_or_compute calls for the same (session, indicator, history version)
+    share one computation.
+    """
+
+    def __init__(self, pg_settings: dict | None = None):
+        self.pg_settings = pg_settings or PG
+        self._schema_ready = False
+        self.flights = SingleFlight()
+
+    @contextlib.contextmanager
+    def _connection(self):
+        """Borrows a connection from the process-wide pool, creating the tables on first use."""
+        with get_pool(self.pg_settings).connection() as conn:
+            if not self._schema_ready:
+                with conn, conn.cursor() as cur:
+                    cur.execute(INDICATOR_SNAPSHOTS_DDL)
+                self._schema_ready = True
+            yield conn
+
+    def get(self, session_id: str, indicator: str, message_id: int):
+        """Returns the stored value if it was computed at message_id, else None."""
+        return self.get_many(session_id, message_id, [indicator]).get(indicator)
+
+    def get_many(self, session_id: str, message_id: int, indicators) -> dict:
+        """
+        Returns {indicator: value} for every requested indicator whose snapshot was
+        computed at message_id; stale or missing indicators are left out.
+        """
+        try:
+            with self._connection() as conn:
+                with conn, conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT indicator, value FROM indicator_snapshots "
+                        "WHERE session_id = %s AND message_id = %s AND indicator = ANY(%s)",
+                        (session_id, message_id, list(indicators))
+                    )
+                    rows = cur.fetchall()
+            return {indicator: value for indicator, value in rows}
+        except psycopg2.Error as e:
+            print(f"Error reading indicator snapshots for session {session_id}: {e}")
+            return {}
+
+    def put(self, session_id: str, indicator: str, message_id: int, value) -> None:
+        """Stores (or replaces) the snapshot for one indicator of a session."""
+        self.put_many(session_id, message_id, {indicator: value})
+
+    def put_many(self, session_id: str, message_id: int, values: dict) -> None:
+        """
+        Stores several indicators computed from the same history version in one transaction.
+        FallbackIndicator values are skipped.
+        """
+        values = {indicator: value for indicator, value in values.items() if not isinstance(value, FallbackIndicator)}
+        if not values:
+            return
+        try:
+            with self._connection() as conn:
+                with conn, conn.cursor() as cur:
+                    for indicator, value in values.items():
+                        cur.execute(
+                            "INSERT INTO indicator_snapshots (session_id, indicator, message_id, value) "
+                            "VALUES (%s, %s, %s, %s) "
+                            "ON CONFLICT (session_id, indicator) DO UPDATE "
+                            "SET message_id = EXCLUDED.message_id, value = EXCLUDED.value, updated_at = now() "
+                            "WHERE indicator_snapshots.message_id <= EXCLUDED.message_id",
+                            (session_id, indicator, message_id, json.dumps(value))
+                        )
+        except psycopg2.Error as e:
+            print(f"Error storing indicator snapshots for session {session_id}: {e}")
+
+    def get_or_compute(self, session_id: str, indicator: str, conversation_history: list[dict], compute):
+        """
+        Returns the snapshot for the current history version, computing and storing it
+        with compute(conversation_history) when the conversation has advanced. Callers that
+        arrive while the same snapshot is being computed wait for it instead of recomputing.
+        A FallbackIndicator from compute is returned but not stored.
+        """
+        message_id = latest_message_id(conversation_history)
+        return self.flights.do((session_id, indicator, message_id), self._get_or_compute,
+                               session_id, indicator, message_id, conversation_history, compute)
+
+    def _get_or_compute(self, session_id: str, indicator: str, message_id: int, conversation_history: list[dict], compute):
+        value = self.get(session_id, indicator, message_id)
+        if value is None:
+            value = compute(conversation_history)
+            self.put(session_id, indicator, message_id, value)
+        return value
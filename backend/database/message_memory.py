@@ -0,0 +1,530 @@
+import contextlib
+import functools
+import hashlib
+import queue
+import threading
+import time
+
+import numpy as np
+import psycopg2
+
+from backend import embedding_model
+from backend.config.agent_config import (CONTEXT_RECENT_MESSAGES,
+                                         EMBEDDING_DIMENSIONS,
+                                         EMBEDDING_SERVER_URL,
+                                         MEMORY_TOP_K,
+                                         MEMORY_MIN_SIMILARITY,
+                                         MEMORY_PASSAGE_MAX_CHARS,
+                                         VECTORIZE_BATCH_SIZE,
+                                         VECTORIZE_MAX_LATENCY_MS,
+                                         VECTORIZE_QUEUE_MAX,
+                                         VECTORIZE_PROCESSES,
+                                         VECTOR_STORAGE_FORMAT)
+from backend.config.db_config import PG
+from backend.database.ann_index import AnnIndexSet, top_k
+from backend.database.pg_pool import get_pool
+from backend.database.session_headers import SessionHeaderStore
+from backend.database.vector_codec import pack, unpack
+
+# Embeddings are content-addressed: identical text (e.g. the posthuman premise every
+# session starts with) is embedded and stored once and referenced by its hash. A
+# message_embeddings table of the earlier inline shape (embedding BYTEA) is left alone by
+# the IF NOT EXISTS below; migrations/0002_message_embeddings_content_hash.sql converts it.
+MESSAGE_EMBEDDINGS_DDL = """
+CREATE TABLE IF NOT EXISTS embedding_blobs (
+    id            BIGSERIAL   UNIQUE,
+    content_hash  BYTEA       PRIMARY KEY,
+    embedding     BYTEA       NOT NULL,
+    created_at    TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS message_embeddings (
+    session_id    TEXT        NOT NULL,
+    position      INTEGER     NOT NULL,
+    role          TEXT        NOT NULL,
+    content_hash  BYTEA       NOT NULL REFERENCES embedding_blobs (content_hash),
+    created_at    TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (session_id, position)
+);
+"""
+
+
+def content_hash(text: str) -> bytes:
+    """SHA-256 of a message body, the key its embedding is stored under."""
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def latest_player_message(conversation_history: list[dict]) -> str | None:
+    """Returns the content of the newest user message, the retrieval query for a turn."""
+    for message in reversed(conversation_history or []):
+        if isinstance(message, dict) and message.get("role") == "user" and isinstance(message.get("content"), str):
+            return message["content"]
+    return None
+
+
+class MessageMemory:
+    """
+    Long-term memory for the narrative prompt: every saved message of a session is embedded
+    with the bundled MiniLM model (in the background) and stored by its position in the
+    conversation. Each turn, recall() returns the older passages most similar to the
+    player's message, which query_llm injects as a compact memory block while the recent
+    turns stay verbatim.
+
+    The database rows are the source of truth; lookups go through the on-disk ANN indexes
+    (one per session, ids = positions, and a global one over distinct texts,
+    ids = embedding_blobs.id), which are filled incrementally and reloaded from the
+    database when missing. Messages whose text was embedded before reuse that embedding.
+
+    Vectorization is event-driven: every save queues the message with its position (read
+    from the session header the insert just updated), and the worker embeds the messages
+    collected within VECTORIZE_MAX_LATENCY_MS (up to VECTORIZE_BATCH_SIZE) in one batch,
+    without reloading the conversation. A session is only reloaded and diffed against its
+    index (a backfill) when a save could not be queued with its position: the queue was
+    full, so a burst never blocks save_message, or the session has no header row. recall()
+    also backfills sessions from before memory existed.
+    """
+
+    def __init__(self, load_conversation, pg_settings: dict | None = None, indexes: AnnIndexSet | None = None):
+        # load_conversation(session_id) -> list of message dicts, oldest first
+        self.load_conversation = load_conversation
+        self.pg_settings = pg_settings or PG
+        self.indexes = indexes or AnnIndexSet()
+        self._queue = queue.Queue(maxsize=VECTORIZE_QUEUE_MAX)
+        # Sessions whose notification didn't fit in the queue
+        self._overflow = set()
+        self._overflow_lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        # Read without the write-behind overlay: the hook runs once the message is written
+        self.session_headers = SessionHeaderStore(self.pg_settings)
+        # Per-session locks keeping save and header read together, so positions are not swapped
+        self._save_locks = {}
+        self._schema_ready = False
+        self._worker = None
+        self._stats = {"notifications_dropped": 0, "batches": 0, "messages_indexed": 0, "messages_embedded": 0,
+                       "last_batch_size": 0, "last_batch_seconds": 0.0, "busy": False}
+
+    @contextlib.contextmanager
+    def _connection(self):
+        """Borrows a connection from the process-wide pool, creating the tables on first use."""
+        with get_pool(self.pg_settings).connection() as conn:
+            if not self._schema_ready:
+                with conn, conn.cursor() as cur:
+                    cur.execute(MESSAGE_EMBEDDINGS_DDL)
+                self._schema_ready = True
+            yield conn
+
+    def attach_to(self, conversation_manager) -> None:
+        """
+        Hooks into conversation_manager.save_message: each save queues the message for
+        embedding at its position, the session's message count after the insert minus one.
+        """
+        save_message = conversation_manager.save_message
+
+        @functools.wraps(save_message)
+        def save_and_embed(session_id, role, content, *args, **kwargs):
+            with self._save_locks.setdefault(session_id, threading.Lock()):
+                result = save_message(session_id, role, content, *args, **kwargs)
+                header = self.session_headers.get(session_id)
+            if header is None:
+                self.enqueue(session_id)
+            else:
+                self.enqueue(session_id, header["message_count"] - 1, role, content)
+            return result
+
+        conversation_manager.save_message = save_and_embed
+
+    def start(self) -> None:
+        """Starts the background embedding worker (idempotent)."""
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="message-memory", daemon=True)
+            self._worker.start()
+
+    def enqueue(self, session_id: str, position: int | None = None, role: str | None = None, content: str | None = None) -> None:
+        """
+        Queues one saved message for embedding, or the whole session for a backfill when no
+        position is given; never blocks (a full queue turns the message into a backfill).
+        """
+        try:
+            self._queue.put_nowait((session_id, position, role, content))
+        except queue.Full:
+            with self._overflow_lock:
+                self._overflow.add(session_id)
+                self._stats["notifications_dropped"] += 1
+
+    def _collect_batch(self) -> tuple[set, dict]:
+        """
+        Waits for the first queued message, then keeps collecting until VECTORIZE_BATCH_SIZE
+        messages are queued or VECTORIZE_MAX_LATENCY_MS has passed. Returns (sessions to
+        backfill, {(session_id, position): (role, content)} of the queued messages).
+        """
+        items = [self._queue.get()]
+        deadline = time.monotonic() + VECTORIZE_MAX_LATENCY_MS / 1000
+        while len(items) < VECTORIZE_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Drain whatever else is already waiting
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        backfill, messages = set(), {}
+        for session_id, position, role, content in items:
+            if position is None:
+                backfill.add(session_id)
+            else:
+                messages[(session_id, position)] = (role, content)
+        with self._overflow_lock:
+            backfill |= self._overflow
+            self._overflow.clear()
+        # A backfill reloads the whole session, queued messages included
+        messages = {key: value for key, value in messages.items() if key[0] not in backfill}
+        return backfill, messages
+
+    def _run(self) -> None:
+        while True:
+            backfill, messages = self._collect_batch()
+            self._stats["busy"] = True
+            try:
+                self.index_messages(messages)
+                self.sync_many(backfill)
+            except Exception as e:
+                sessions = backfill | {session_id for session_id, _ in messages}
+                print(f"Error embedding messages for sessions {sorted(sessions)}: {e}")
+            finally:
+                self._stats["busy"] = False
+
+    def vectorization_status(self) -> dict:
+        """Queue depth, backpressure and throughput of the background vectorizer."""
+        with self._overflow_lock:
+            overflow = len(self._overflow)
+        status = dict(self._stats)
+        status.update(
+            queue_depth=self._queue.qsize(),
+            queue_capacity=VECTORIZE_QUEUE_MAX,
+            overflow_sessions=overflow,
+            backpressure=overflow > 0 or self._queue.qsize() >= VECTORIZE_QUEUE_MAX,
+            batch_size=VECTORIZE_BATCH_SIZE,
+            max_latency_ms=VECTORIZE_MAX_LATENCY_MS,
+            processes=VECTORIZE_PROCESSES,
+            worker_alive=self._worker is not None and self._worker.is_alive(),
+            messages_per_second=(status["last_batch_size"] / status["last_batch_seconds"]
+                                 if status["last_batch_seconds"] else 0.0),
+        )
+        if EMBEDDING_SERVER_URL:
+            status["embedding_server"] = embedding_model.server_stats()
+        return status
+
+    def _session_index(self, session_id: str):
+        """Returns the session's ANN index, reloading it from the database if it is empty."""
+        with self._index_lock:
+            index = self.indexes.session(session_id)
+            if len(index) == 0:
+                with self._connection() as conn:
+                    with conn, conn.cursor() as cur:
+                        cur.execute(
+                            "SELECT m.position, b.embedding FROM message_embeddings m "
+                            "JOIN embedding_blobs b ON b.content_hash = m.content_hash "
+                            "WHERE m.session_id = %s ORDER BY m.position",
+                            (session_id,)
+                        )
+                        rows = cur.fetchall()
+                if rows:
+                    index.add([row[0] for row in rows], self._decode([row[1] for row in rows]))
+            return index
+
+    @staticmethod
+    def _decode(blobs) -> np.ndarray:
+        matrix = np.empty((len(blobs), EMBEDDING_DIMENSIONS), dtype=np.float32)
+        for i, blob in enumerate(blobs):
+            matrix[i] = unpack(blob, EMBEDDING_DIMENSIONS)
+        return matrix
+
+    def reload_global_index(self, batch_size: int = 10000) -> int:
+        """Rebuilds the global ANN index from every distinct stored embedding. Returns the vector count."""
+        index = self.indexes.global_index()
+        index.remove(index.all_ids())
+        index.compact()
+        with self._connection() as conn:
+            with conn, conn.cursor(name="embedding_blobs_scan") as cur:
+                cur.itersize = batch_size
+                cur.execute("SELECT id, embedding FROM embedding_blobs ORDER BY id")
+                while True:
+                    rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    index.add([row[0] for row in rows], self._decode([row[1] for row in rows]))
+        index.rebuild()
+        return len(index)
+
+    def sync(self, session_id: str) -> int:
+        """
+        Embeds and stores every message of the session that has no embedding yet.
+        Returns the number of messages embedded.
+        """
+        return self.sync_many([session_id])
+
+    def sync_many(self, session_ids) -> int:
+        """
+        Backfills several sessions in one batch (see sync): each history is reloaded and
+        diffed against the session index. Returns the number of messages indexed.
+        """
+        pending = []  # (session_id, index, positions, roles, content hashes)
+        texts = {}    # content hash -> text, distinct texts of the whole batch
+        for session_id in session_ids:
+            history = self.load_conversation(session_id) or []
+            index = self._session_index(session_id)
+            known = set(index.all_ids().tolist())
+            missing = [i for i, m in enumerate(history)
+                       if i not in known and isinstance(m, dict) and isinstance(m.get("content"), str) and m["content"].strip()]
+            if missing:
+                hashes = [content_hash(history[i]["content"]) for i in missing]
+                pending.append((session_id, index, missing, [history[i].get("role", "user") for i in missing], hashes))
+                texts.update(zip(hashes, (history[i]["content"] for i in missing)))
+        # The positions are missing from the index, so they are added even where the table
+        # already has them (an index that fell behind its rows)
+        return self._index_pending(pending, texts, reindex=True)
+
+    def index_messages(self, messages: dict) -> int:
+        """
+        Indexes messages queued by the save_message hook, {(session_id, position): (role,
+        content)}, without reloading the conversations. Positions already stored are
+        skipped. Returns the number of messages indexed.
+        """
+        by_session = {}
+        for (session_id, position), (role, content) in sorted(messages.items()):
+            if isinstance(content, str) and content.strip():
+                by_session.setdefault(session_id, []).append((position, role or "user", content))
+        pending, texts = [], {}
+        for session_id, rows in by_session.items():
+            hashes = [content_hash(content) for _, _, content in rows]
+            pending.append((session_id, self._session_index(session_id), [row[0] for row in rows],
+                            [row[1] for row in rows], hashes))
+            texts.update(zip(hashes, (content for _, _, content in rows)))
+        return self._index_pending(pending, texts)
+
+    def _index_pending(self, pending: list, texts: dict, reindex: bool = False) -> int:
+        """
+        Stores the embeddings of pending (session_id, index, positions, roles, content
+        hashes) entries. Only texts without a stored embedding are run through the model,
+        each distinct text once.
+        """
+        if not pending:
+            return 0
+
+        started = time.perf_counter()
+        embeddings = self._load_blobs(list(texts))
+        new_hashes = [h for h in texts if h not in embeddings]
+        if new_hashes:
+            vectors = embedding_model.encode_many([texts[h] for h in new_hashes])
+            if vectors is None:
+                return 0
+            vectors = np.asarray(vectors, dtype=np.float32)
+            self._store_blobs(new_hashes, vectors)
+            embeddings.update(zip(new_hashes, vectors))
+
+        indexed = 0
+        for session_id, index, positions, roles, hashes in pending:
+            indexed += self._store(session_id, index, positions, roles, hashes,
+                                   np.stack([embeddings[h] for h in hashes]), reindex)
+
+        self._stats.update(batches=self._stats["batches"] + 1,
+                           messages_indexed=self._stats["messages_indexed"] + indexed,
+                           messages_embedded=self._stats["messages_embedded"] + len(new_hashes),
+                           last_batch_size=len(new_hashes),
+                           last_batch_seconds=time.perf_counter() - started)
+        return indexed
+
+    def _load_blobs(self, hashes: list[bytes]) -> dict:
+        """Returns {content hash: embedding} for the hashes that are already stored."""
+        if not hashes:
+            return {}
+        with self._connection() as conn:
+            with conn, conn.cursor() as cur:
+                cur.execute(
+                    "SELECT content_hash, embedding FROM embedding_blobs WHERE content_hash = ANY(%s::bytea[])",
+                    ([psycopg2.Binary(h) for h in hashes],)
+                )
+                rows = cur.fetchall()
+        return dict(zip((bytes(row[0]) for row in rows), self._decode([row[1] for row in rows])))
+
+    def _store_blobs(self, hashes: list[bytes], vectors: np.ndarray) -> None:
+        """Stores new embeddings by content hash and adds each new text to the global index."""
+        global_ids, global_rows = [], []
+        with self._connection() as conn:
+            with conn, conn.cursor() as cur:
+                for row, (digest, vector) in enumerate(zip(hashes, vectors)):
+                    cur.execute(
+                        "INSERT INTO embedding_blobs (content_hash, embedding) VALUES (%s, %s) "
+                        "ON CONFLICT (content_hash) DO NOTHING RETURNING id",
+                        (psycopg2.Binary(digest), psycopg2.Binary(pack(vector, VECTOR_STORAGE_FORMAT)))
+                    )
+                    inserted = cur.fetchone()
+                    if inserted:
+                        global_ids.append(inserted[0])
+                        global_rows.append(row)
+        self.indexes.global_index().add(global_ids, vectors[global_rows])
+
+    def _store(self, session_id: str, index, positions: list[int], roles: list[str], hashes: list[bytes],
+               vectors: np.ndarray, reindex: bool = False) -> int:
+        """
+        Stores the positions not stored yet and adds them to the session index (every
+        position with reindex). Returns how many were added.
+        """
+        inserted = []
+        with self._connection() as conn:
+            with conn, conn.cursor() as cur:
+                for row, (position, role, digest) in enumerate(zip(positions, roles, hashes)):
+                    cur.execute(
+                        "INSERT INTO message_embeddings (session_id, position, role, content_hash) "
+                        "VALUES (%s, %s, %s, %s) ON CONFLICT (session_id, position) DO NOTHING RETURNING position",
+                        (session_id, position, role, psycopg2.Binary(digest))
+                    )
+                    if cur.fetchone() or reindex:
+                        inserted.append(row)
+        index.add([positions[row] for row in inserted], vectors[inserted])
+        return len(inserted)
+
+    def recall(self, session_id: str, conversation_history: list[dict], k: int = MEMORY_TOP_K) -> list[dict]:
+        """
+        Returns up to k older passages relevant to the newest player message, as
+        [{"position", "role", "content", "similarity"}] in conversation order.
+
+        Only messages outside the verbatim window (the last CONTEXT_RECENT_MESSAGES) are
+        candidates, and only matches with similarity >= MEMORY_MIN_SIMILARITY are kept.
+        Returns [] when the embedding model or database is unavailable.
+        """
+        query_text = latest_player_message(conversation_history)
+        window_start = len(conversation_history) - CONTEXT_RECENT_MESSAGES
+        if not query_text or window_start <= 0:
+            return []
+
+        try:
+            index = self._session_index(session_id)
+        except psycopg2.Error as e:
+            print(f"Error loading message embeddings for session {session_id}: {e}")
+            return []
+        if len(index) < window_start:
+            # Older messages not embedded yet (e.g. a session from before memory existed)
+            self.enqueue(session_id)
+
+        query = embedding_model.encode([query_text])
+        if query is None:
+            return []
+
+        # The verbatim window can take up to CONTEXT_RECENT_MESSAGES of the best matches
+        positions, similarities = index.search(np.asarray(query[0], dtype=np.float32), k + CONTEXT_RECENT_MESSAGES)
+
+        passages = []
+        for position, similarity in zip(positions.tolist(), similarities.tolist()):
+            if position >= window_start or similarity < MEMORY_MIN_SIMILARITY:
+                continue
+            if len(passages) == k:
+                break
+            message = conversation_history[position]
+            passages.append({
+                "position": position,
+                "role": message.get("role", "user"),
+                "content": message.get("content", "")[:MEMORY_PASSAGE_MAX_CHARS],
+                "similarity": float(similarity),
+            })
+        return sorted(passages, key=lambda p: p["position"])
+
+
+# -----------------------------
+# Benchmark: recall@k on a synthetic long session
+# -----------------------------
+# Run from the repository root:  python -m backend.database.message_memory [messages]
+
+BENCHMARK_FACTS = [
+    ("The potter Ninsun sells you a cracked clay lamp for two copper rings.", "What did we buy from the potter?"),
+    ("A scribe named Ur-Nanshe warns you that the temple guards hunt strangers after dark.", "Who warned us about the guards?"),
+    ("You bury the dead phone beneath the third palm tree east of the well.", "Where did we hide the phone?"),
+    ("Lena twists her ankle on the quay steps and can barely walk.", "Which of us got injured and how?"),
+    ("The merchant Abi-ešuh promises passage on his barge if you cure his fever.", "What deal did the merchant offer us?"),
+    ("A priestess recognises the silver watch and calls it an omen of the sky god.", "How did the priestess react to the watch?"),
+    ("You trade the lighter to a herdsman for a goat-hair cloak and a skin of milk.", "What did we get in exchange for the lighter?"),
+    ("The city gate closes at sunset and only reopens when the horn sounds at dawn.", "When does the city gate open again?"),
+    ("An old woman named Geme-Enlil lets you sleep in her reed storehouse.", "Who gave us a place to sleep?"),
+    ("Soldiers confiscate the steel pocketknife and take it to the governor.", "What happened to the pocketknife?"),
+    ("You learn that the river floods every spring and the farmers fear a bad year.", "What do the farmers worry about?"),
+    ("A boy called Lugal follows you everywhere, hoping to learn your strange words.", "Which child keeps following us?"),
+    ("The governor demands that you appear before him on the day of the new moon.", "When must we appear before the governor?"),
+    ("Marco carves a map of the canals onto a wax tablet stolen from the scribes.", "Who made a map and what did he draw it on?"),
+    ("The brewer offers barley beer in return for help repairing her kiln.", "What does the brewer want help with?"),
+    ("A sandstorm destroys your shelter and scatters the remaining medicine.", "How did we lose the medicine?"),
+]
+
+BENCHMARK_PLACES = ["the canal bank", "the market square", "the temple steps", "the date orchard",
+                    "the reed marsh", "the harbor", "the mud-brick alleys", "the barley fields"]
+BENCHMARK_WEATHER = ["the sun beats down", "a dry wind lifts the dust", "clouds gather over the river",
+                     "the evening air cools", "the heat shimmers over the fields"]
+BENCHMARK_ACTIONS = ["Traders argue over the price of wool.", "Children chase a dog between the stalls.",
+                     "A donkey cart rattles past loaded with bricks.", "Fishermen mend their nets in silence.",
+                     "Women carry water jars balanced on their heads.", "A drum sounds somewhere in the distance.",
+                     "Laborers haul baskets of clay toward a half-built wall.", "Smoke rises from the bread ovens."]
+
+
+def build_synthetic_session(message_count: int, seed: int = 7) -> tuple[list[dict], list[tuple[int, str]]]:
+    """
+    Builds a long filler conversation with BENCHMARK_FACTS planted at random positions
+    before the verbatim window. Returns (history, [(fact position, query)]).
+    """
+    rng = np.random.default_rng(seed)
+    history = []
+    for i in range(message_count):
+        if i % 2 == 0:
+            content = f"We keep walking toward {BENCHMARK_PLACES[rng.integers(len(BENCHMARK_PLACES))]} and look around."
+            history.append({"role": "user", "content": content})
+        else:
+            content = (f"You reach {BENCHMARK_PLACES[rng.integers(len(BENCHMARK_PLACES))]} as "
+                       f"{BENCHMARK_WEATHER[rng.integers(len(BENCHMARK_WEATHER))]}. "
+                       f"{BENCHMARK_ACTIONS[rng.integers(len(BENCHMARK_ACTIONS))]} "
+                       f"{BENCHMARK_ACTIONS[rng.integers(len(BENCHMARK_ACTIONS))]}")
+            history.append({"role": "assistant", "content": content})
+
+    odd_positions = np.arange(1, message_count - CONTEXT_RECENT_MESSAGES, 2)
+    fact_positions = rng.choice(odd_positions, size=len(BENCHMARK_FACTS), replace=False)
+    planted = []
+    for position, (fact, query) in zip(fact_positions, BENCHMARK_FACTS):
+        history[position]["content"] += " " + fact
+        planted.append((int(position), query))
+    return history, planted
+
+
+def run_benchmark(message_count: int = 2000, ks=(1, 3, 5, 10)) -> None:
+    history, planted = build_synthetic_session(message_count)
+    started = time.perf_counter()
+    matrix = embedding_model.encode([m["content"] for m in history])
+    if matrix is None:
+        print("Embedding model unavailable; install sentence-transformers to run the benchmark.")
+        return
+    embed_seconds = time.perf_counter() - started
+    matrix = np.asarray(matrix, dtype=np.float32)
+    eligible = matrix[:message_count - CONTEXT_RECENT_MESSAGES]
+
+    queries = np.asarray(embedding_model.encode([query for _, query in planted]), dtype=np.float32)
+    hits = {k: 0 for k in ks}
+    started = time.perf_counter()
+    for (position, _), query in zip(planted, queries):
+        rows, _ = top_k(eligible, query, max(ks))
+        for k in ks:
+            hits[k] += int(position in rows[:k])
+    search_ms = (time.perf_counter() - started) * 1000 / len(planted)
+
+    print(f"Synthetic session: {message_count} messages, {len(planted)} planted facts "
+          f"(embedded in {embed_seconds:.1f}s)")
+    for k in ks:
+        print(f"  recall@{k:<2} = {hits[k] / len(planted):.2f}")
+    print(f"  mean top-k search time: {search_ms:.3f} ms over {eligible.shape[0]} candidates")
+    print(f"  memory block per turn: <= {MEMORY_TOP_K} x {MEMORY_PASSAGE_MAX_CHARS} chars, independent of session length")
+
+
+if __name__ == "__main__":
+    import sys
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,312 @@
+import glob
+import hashlib
+import os
+import re
+import time
+import uuid
+
+import psycopg2
+
+from backend.config.db_config import PG, PG_MESSAGE_PARTITIONS
+from backend.database.session_headers import SESSION_HEADER_SQL
+
+DATABASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_FILE = os.path.join(DATABASE_DIR, "schema.sql")
+MIGRATIONS_DIR = os.path.join(DATABASE_DIR, "migrations")
+SCHEMA_VERSION = "0000_schema"
+
+SCHEMA_MIGRATIONS_DDL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version     TEXT        PRIMARY KEY,
+    checksum    TEXT        NOT NULL,
+    applied_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+# Serializes concurrent runners (e.g. several workers starting at once)
+MIGRATION_LOCK_KEY = 0x48425231
+
+# The ConversationManager queries the schema's indexes are built for
+LOAD_CONVERSATION_SQL = ("SELECT id, role, content, timestamp FROM conversation_messages "
+                         "WHERE session_id = %s ORDER BY id")
+LATEST_OBJECTIVE_TIME_SQL = "SELECT COALESCE(MAX(objective_time), 0) FROM conversation_messages WHERE session_id = %s"
+TOTAL_TOKENS_SQL = ("SELECT COALESCE(SUM(input_tokens), 0), COALESCE(SUM(output_tokens), 0) "
+                    "FROM conversation_messages WHERE session_id = %s")
+
+
+def migration_files() -> list[tuple[str, str]]:
+    """(version, path) of schema.sql followed by migrations/NNNN_<name>.sql, in apply order."""
+    files = [(SCHEMA_VERSION, SCHEMA_FILE)]
+    for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, "*.sql"))):
+        files.append((os.path.splitext(os.path.basename(path))[0], path))
+    return files
+
+
+def messages_table_sql(schema_sql: str, partitions: int = 0, primary_key: bool = True) -> str:
+    """
+    The conversation_messages CREATE TABLE statement from schema.sql, hash-partitioned by
+    session_id into `partitions` tables when partitions > 0.
+    """
+    match = re.search(r"CREATE TABLE IF NOT EXISTS conversation_messages \(.*?\n\);", schema_sql, re.S)
+    if match is None:
+        raise ValueError("schema.sql has no conversation_messages table")
+    statement = match.group(0)
+    if not primary_key:
+        statement = re.sub(r",\s*PRIMARY KEY \([^)]*\)", "", statement)
+    if partitions <= 0:
+        return statement
+    statements = [statement[:-1] + " PARTITION BY HASH (session_id);"]
+    for remainder in range(partitions):
+        statements.append(f"CREATE TABLE IF NOT EXISTS conversation_messages_p{remainder} "
+                          f"PARTITION OF conversation_messages "
+                          f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder});")
+    return "\n".join(statements)
+
+
+def _checksum(sql: str) -> str:
+    return hashlib.sha256(sql.encode("utf-8")).hexdigest()
+
+
+def migrate(pg_settings: dict | None = None, partitions: int = PG_MESSAGE_PARTITIONS) -> list[str]:
+    """
+    Applies schema.sql and every pending migration, each in its own transaction, and
+    records them in schema_migrations. Returns the versions applied by this call.
+    """
+    applied_now = []
+    conn = psycopg2.connect(**(pg_settings or PG))
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(SCHEMA_MIGRATIONS_DDL)
+
+        for version, path in migration_files():
+            with open(path, 'r', encoding='utf-8') as f:
+                sql = f.read()
+            with conn, conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+                cur.execute("SELECT checksum FROM schema_migrations WHERE version = %s", (version,))
+                row = cur.fetchone()
+                if row:
+                    if row[0] != _checksum(sql):
+                        print(f"Warning: {os.path.basename(path)} changed after it was applied as {version}; "
+                              "add a new migration instead of editing it")
+                    continue
+                if version == SCHEMA_VERSION and partitions > 0:
+                    # Must run before schema.sql's own CREATE TABLE IF NOT EXISTS; an
+                    # existing table is left as it is
+                    cur.execute("SELECT to_regclass('conversation_messages')")
+                    if cur.fetchone()[0] is None:
+                        cur.execute(messages_table_sql(sql, partitions))
+                cur.execute(sql)
+                cur.execute("INSERT INTO schema_migrations (version, checksum) VALUES (%s, %s)",
+                            (version, _checksum(sql)))
+            applied_now.append(version)
+    finally:
+        conn.close()
+    return applied_now
+
+
+def status(pg_settings: dict | None = None) -> list[dict]:
+    """Every known migration with the time it was applied (None if pending)."""
+    conn = psycopg2.connect(**(pg_settings or PG))
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(SCHEMA_MIGRATIONS_DDL)
+            cur.execute("SELECT version, applied_at FROM schema_migrations")
+            applied = dict(cur.fetchall())
+    finally:
+        conn.close()
+    return [{"version": version, "applied_at": applied[version].isoformat() if version in applied else None}
+            for version, _ in migration_files()]
+
+
+def check_conversation_manager(pg_settings: dict | None = None) -> list[str]:
+    """
+    Saves two probe messages through the real ConversationManager and checks that they land
+    in conversation_messages with schema.sql's columns, and that load_conversation,
+    get_total_tokens and get_latest_objective_time agree with the table. The probe rows are
+    deleted afterwards. Returns the mismatches found (empty when the schema fits).
+    """
+    from backend.database.db_manager import ConversationManager
+
+    with open(SCHEMA_FILE, 'r', encoding='utf-8') as f:
+        table_sql = messages_table_sql(f.read())
+    expected_columns = set(re.findall(r"^\s+(\w+)\s+[A-Z]", table_sql, re.M)) - {"PRIMARY"}
+    probes = [("user", "Schema check: the player speaks.", {"input_tokens": 7, "objective_time": 60}),
+              ("assistant", "Schema check: the narrator answers.", {"output_tokens": 11, "objective_time": 60})]
+    session_id = f"migrate-check-{uuid.uuid4().hex}"
+    manager = ConversationManager()
+    problems = []
+    conn = psycopg2.connect(**(pg_settings or PG))
+    try:
+        for role, content, kwargs in probes:
+            manager.save_message(session_id, role, content, **kwargs)
+
+        with conn, conn.cursor() as cur:
+            cur.execute("SELECT column_name FROM information_schema.columns "
+                        "WHERE table_schema = current_schema() AND table_name = 'conversation_messages'")
+            columns = {row[0] for row in cur.fetchall()}
+            if not columns:
+                return problems + ["conversation_messages does not exist"]
+            if columns != expected_columns:
+                problems.append(f"conversation_messages columns: missing {sorted(expected_columns - columns)}, "
+                                f"not in schema.sql {sorted(columns - expected_columns)}")
+                return problems
+            cur.execute("SELECT role, content, timestamp, input_tokens, output_tokens, objective_time "
+                        "FROM conversation_messages WHERE session_id = %s ORDER BY id", (session_id,))
+            rows = cur.fetchall()
+
+        saved = [(role, content, kwargs.get("input_tokens", 0), kwargs.get("output_tokens", 0), kwargs["objective_time"])
+                 for role, content, kwargs in probes]
+        if [(row[0], row[1], row[3], row[4], row[5]) for row in rows] != saved:
+            problems.append(f"save_message wrote {rows!r} to conversation_messages, expected {saved!r}")
+            return problems
+
+        history = manager.load_conversation(session_id) or []
+        if [(m.get("role"), m.get("content")) for m in history] != [(row[0], row[1]) for row in rows]:
+            problems.append(f"load_conversation returned {history!r}")
+        for message, row in zip(history, rows):
+            if message.get("timestamp") not in (row[2], row[2].isoformat(), str(row[2])):
+                problems.append(f"load_conversation timestamp {message.get('timestamp')!r}, column holds {row[2]!r}")
+        if tuple(manager.get_total_tokens(session_id)) != (7, 11):
+            problems.append(f"get_total_tokens returned {manager.get_total_tokens(session_id)!r}, expected (7, 11)")
+        if manager.get_latest_objective_time(session_id) != 60:
+            problems.append(f"get_latest_objective_time returned {manager.get_latest_objective_time(session_id)!r}, expected 60")
+    finally:
+        try:
+            with conn, conn.cursor() as cur:
+                cur.execute("SELECT to_regclass('conversation_messages')")
+                if cur.fetchone()[0] is not None:
+                    cur.execute("DELETE FROM conversation_messages WHERE session_id = %s", (session_id,))
+        finally:
+            conn.close()
+    return problems
+
+
+# -----------------------------
+# Migration commands and benchmark
+# -----------------------------
+# Run from the repository root:
+#   python -m backend.database.migrate            (apply pending migrations)
+#   python -m backend.database.migrate status
+#   python -m backend.database.migrate check      (probe the schema with the real ConversationManager)
+#   python -m backend.database.migrate bench [sessions] [messages per session] [partitions]
+#
+# The benchmark works in a scratch schema (migrate_bench, dropped afterwards). It loads
+# sessions x messages rows interleaved across sessions, as a live server writes them, then
+# times the three per-turn queries on a bare table and again with schema.sql's keys and
+# indexes, then the header-row lookup added by the migrations.
+
+BENCH_SCHEMA = "migrate_bench"
+BENCH_QUERIES = (("load_conversation", LOAD_CONVERSATION_SQL),
+                 ("get_latest_objective_time", LATEST_OBJECTIVE_TIME_SQL),
+                 ("get_total_tokens", TOTAL_TOKENS_SQL))
+
+
+def _time_queries(cur, sessions: int, samples: int, queries=BENCH_QUERIES) -> dict:
+    import random
+
+    results = {}
+    rng = random.Random(7)
+    for name, sql in queries:
+        latencies = []
+        for _ in range(samples):
+            session_id = f"session-{rng.randint(1, sessions)}"
+            started = time.perf_counter()
+            cur.execute(sql, (session_id,))
+            cur.fetchall()
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        results[name] = {"median_ms": round(latencies[len(latencies) // 2], 3),
+                         "p99_ms": round(latencies[int(0.99 * (len(latencies) - 1))], 3)}
+    return results
+
+
+def _plans(cur) -> dict:
+    plans = {}
+    for name, sql in BENCH_QUERIES:
+        cur.execute("EXPLAIN " + sql, ("session-1",))
+        plans[name] = " / ".join(line[0].strip() for line in cur.fetchall()[:3])
+    return plans
+
+
+def run_benchmark(sessions: int = 10_000, messages: int = 1_000, partitions: int = PG_MESSAGE_PARTITIONS,
+                  pg_settings: dict | None = None) -> None:
+    with open(SCHEMA_FILE, 'r', encoding='utf-8') as f:
+        schema_sql = f.read()
+    conn = psycopg2.connect(**(pg_settings or PG))
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+            cur.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+            cur.execute(f"SET search_path TO {BENCH_SCHEMA}")
+            cur.execute(messages_table_sql(schema_sql, partitions, primary_key=False))
+
+            started = time.perf_counter()
+            step = max(1, 1_000_000 // sessions)
+            for first in range(1, messages + 1, step):
+                last = min(first + step - 1, messages)
+                cur.execute(
+                    "INSERT INTO conversation_messages (session_id, role, content, timestamp, input_tokens, output_tokens, objective_time) "
+                    "SELECT 'session-' || s, CASE WHEN m %% 2 = 1 THEN 'user' ELSE 'assistant' END, "
+                    "       'Turn ' || m || ' of session ' || s || ': ' || repeat('the caravan moves on. ', 8), "
+                    "       TIMESTAMP '1200-01-01' + m * INTERVAL '60 seconds', "
+                    "       CASE WHEN m %% 2 = 1 THEN 20 + (m * s) %% 80 ELSE 0 END, "
+                    "       CASE WHEN m %% 2 = 0 THEN 150 + (m * s) %% 250 ELSE 0 END, m * 60 "
+                    "FROM generate_series(%s, %s) AS m, generate_series(1, %s) AS s",
+                    (first, last, sessions)
+                )
+            cur.execute("VACUUM ANALYZE conversation_messages")
+            print(f"Loaded {sessions} sessions x {messages} messages "
+                  f"({'%d hash partitions' % partitions if partitions else 'unpartitioned'}) "
+                  f"in {time.perf_counter() - started:.1f}s")
+
+            # Bare table: every query scans all rows, so only a few samples
+            print("Without keys or indexes:", _time_queries(cur, sessions, samples=5))
+
+            started = time.perf_counter()
+            cur.execute("ALTER TABLE conversation_messages ADD PRIMARY KEY (session_id, id)")
+            for statement in re.findall(r"CREATE INDEX IF NOT EXISTS .*?;", schema_sql, re.S):
+                cur.execute(statement)
+            cur.execute("VACUUM ANALYZE conversation_messages")
+            print(f"Built schema.sql keys and indexes in {time.perf_counter() - started:.1f}s")
+            print("With schema.sql indexes:", _time_queries(cur, sessions, samples=500))
+            for name, plan in _plans(cur).items():
+                print(f"  {name}: {plan}")
+
+            # Later migrations (the per-session header row and its triggers)
+            started = time.perf_counter()
+            for _, path in migration_files()[1:]:
+                with open(path, 'r', encoding='utf-8') as f:
+                    cur.execute(f.read())
+            cur.execute("VACUUM ANALYZE")
+            print(f"Applied migrations in {time.perf_counter() - started:.1f}s")
+            print("Session header lookups:", _time_queries(cur, sessions, samples=500,
+                                                         queries=(("session_header", SESSION_HEADER_SQL),)))
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        conn.close()
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    if command == "migrate":
+        applied = migrate()
+        print(f"Applied: {', '.join(applied)}" if applied else "Schema is up to date")
+    elif command == "status":
+        print(json.dumps(status(), indent=2))
+    elif command == "check":
+        problems = check_conversation_manager()
+        print("\n".join(problems) if problems else "ConversationManager reads and writes conversation_messages as schema.sql defines it")
+        sys.exit(1 if problems else 0)
+    elif command == "bench":
+        run_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 10_000,
+                      int(sys.argv[3]) if len(sys.argv) > 3 else 1_000,
+                      int(sys.argv[4]) if len(sys.argv) > 4 else PG_MESSAGE_PARTITIONS)
+    else:
+        print("usage: python -m backend.database.migrate [migrate|status|check]")
+        print("       python -m backend.database.migrate bench [sessions] [messages per session] [partitions]")
@@ -0,0 +1,86 @@
+-- -----------------------------
+-- Per-session header row
+-- -----------------------------
+-- One row per session with the aggregates ConversationManager used to compute over all
+-- of the session's messages on every turn (get_latest_objective_time, get_total_tokens).
+-- The triggers keep it current inside the same transaction as the message insert, so
+-- those reads become a primary-key lookup on conversation_sessions.
+
+CREATE TABLE IF NOT EXISTS conversation_sessions (
+    session_id             TEXT        PRIMARY KEY,
+    message_count          BIGINT      NOT NULL DEFAULT 0,
+    input_tokens           BIGINT      NOT NULL DEFAULT 0,
+    output_tokens          BIGINT      NOT NULL DEFAULT 0,
+    latest_objective_time  BIGINT      NOT NULL DEFAULT 0,
+    last_message_id        BIGINT      NOT NULL DEFAULT 0,
+    updated_at             TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Statement-level, so a multi-row insert updates each session's header once
+CREATE OR REPLACE FUNCTION conversation_sessions_after_insert() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO conversation_sessions AS s
+           (session_id, message_count, input_tokens, output_tokens, latest_objective_time, last_message_id)
+    SELECT session_id, count(*), sum(input_tokens), sum(output_tokens), max(objective_time), max(id)
+    FROM inserted_rows
+    GROUP BY session_id
+    ON CONFLICT (session_id) DO UPDATE SET
+        message_count         = s.message_count + EXCLUDED.message_count,
+        input_tokens          = s.input_tokens + EXCLUDED.input_tokens,
+        output_tokens         = s.output_tokens + EXCLUDED.output_tokens,
+        latest_objective_time = GREATEST(s.latest_objective_time, EXCLUDED.latest_objective_time),
+        last_message_id       = GREATEST(s.last_message_id, EXCLUDED.last_message_id),
+        updated_at            = now();
+    RETURN NULL;
+END;
+$$;
+
+-- Messages are append-only; deleting them (clearing a session) recomputes the header of
+-- each affected session from what is left, or drops it when nothing is.
+CREATE OR REPLACE FUNCTION conversation_sessions_after_delete() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM conversation_sessions s
+    WHERE s.session_id IN (SELECT DISTINCT session_id FROM deleted_rows)
+      AND NOT EXISTS (SELECT 1 FROM conversation_messages m WHERE m.session_id = s.session_id);
+
+    UPDATE conversation_sessions s SET
+        message_count         = t.message_count,
+        input_tokens          = t.input_tokens,
+        output_tokens         = t.output_tokens,
+        latest_objective_time = t.latest_objective_time,
+        last_message_id       = t.last_message_id,
+        updated_at            = now()
+    FROM (SELECT m.session_id, count(*) AS message_count, sum(m.input_tokens) AS input_tokens,
+                 sum(m.output_tokens) AS output_tokens, max(m.objective_time) AS latest_objective_time,
+                 max(m.id) AS last_message_id
+          FROM conversation_messages m
+          WHERE m.session_id IN (SELECT DISTINCT session_id FROM deleted_rows)
+          GROUP BY m.session_id) t
+    WHERE s.session_id = t.session_id;
+    RETURN NULL;
+END;
+$$;
+
+-- No insert may slip between creating the triggers and the backfill below
+LOCK TABLE conversation_messages IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS conversation_sessions_insert ON conversation_messages;
+CREATE TRIGGER conversation_sessions_insert
+    AFTER INSERT ON conversation_messages
+    REFERENCING NEW TABLE AS inserted_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION conversation_sessions_after_insert();
+
+DROP TRIGGER IF EXISTS conversation_sessions_delete ON conversation_messages;
+CREATE TRIGGER conversation_sessions_delete
+    AFTER DELETE ON conversation_messages
+    REFERENCING OLD TABLE AS deleted_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION conversation_sessions_after_delete();
+
+INSERT INTO conversation_sessions
+       (session_id, message_count, input_tokens, output_tokens, latest_objective_time, last_message_id)
+SELECT session_id, count(*), sum(input_tokens), sum(output_tokens), max(objective_time), max(id)
+FROM conversation_messages
+GROUP BY session_id
+ON CONFLICT (session_id) DO NOTHING;
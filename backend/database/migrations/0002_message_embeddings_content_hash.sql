@@ -0,0 +1,80 @@
+-- -----------------------------
+-- Content-addressed message embeddings
+-- -----------------------------
+-- message_embeddings first stored each vector inline (embedding BYTEA, raw float32). It
+-- now references embedding_blobs by the SHA-256 of the message text, but MessageMemory
+-- creates its tables with CREATE TABLE IF NOT EXISTS, which leaves an existing table of
+-- the old shape as it is. This converts one:
+--
+--   * the old table is renamed out of the way and the new tables are created;
+--   * each old row is matched to its message (position = 0-based place in the session's
+--     conversation, ORDER BY id) and keyed by sha256 of that message's content; its
+--     float32 vector goes into embedding_blobs as-is (unpack() reads every format);
+--   * rows whose message is gone or has a different role are dropped; the embedder
+--     re-embeds those positions on the session's next sync.
+--
+-- The global ANN index is not touched; rebuild it afterwards with
+--   python -m backend.database.ann_index reload-global
+-- A database without the old table only gets the new tables created.
+
+CREATE TABLE IF NOT EXISTS embedding_blobs (
+    id            BIGSERIAL   UNIQUE,
+    content_hash  BYTEA       PRIMARY KEY,
+    embedding     BYTEA       NOT NULL,
+    created_at    TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+DO $$
+DECLARE
+    legacy BOOLEAN;
+BEGIN
+    SELECT EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_schema = current_schema()
+                     AND table_name = 'message_embeddings'
+                     AND column_name = 'embedding')
+    INTO legacy;
+
+    IF legacy THEN
+        ALTER TABLE message_embeddings RENAME TO message_embeddings_inline;
+        ALTER INDEX IF EXISTS message_embeddings_pkey RENAME TO message_embeddings_inline_pkey;
+    END IF;
+
+    CREATE TABLE IF NOT EXISTS message_embeddings (
+        session_id    TEXT        NOT NULL,
+        position      INTEGER     NOT NULL,
+        role          TEXT        NOT NULL,
+        content_hash  BYTEA       NOT NULL REFERENCES embedding_blobs (content_hash),
+        created_at    TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (session_id, position)
+    );
+
+    IF NOT legacy THEN
+        RETURN;
+    END IF;
+
+    IF to_regclass('conversation_messages') IS NOT NULL THEN
+        CREATE TEMPORARY TABLE message_embeddings_matched ON COMMIT DROP AS
+        SELECT e.session_id, e.position, e.role, e.embedding, e.created_at,
+               sha256(convert_to(m.content, 'UTF8')) AS content_hash
+        FROM message_embeddings_inline e
+        JOIN (SELECT session_id, role, content,
+                     row_number() OVER (PARTITION BY session_id ORDER BY id) - 1 AS position
+              FROM conversation_messages
+              WHERE session_id IN (SELECT DISTINCT session_id FROM message_embeddings_inline)) m
+          ON m.session_id = e.session_id AND m.position = e.position AND m.role = e.role;
+
+        INSERT INTO embedding_blobs (content_hash, embedding, created_at)
+        SELECT DISTINCT ON (content_hash) content_hash, embedding, created_at
+        FROM message_embeddings_matched
+        ORDER BY content_hash, created_at
+        ON CONFLICT (content_hash) DO NOTHING;
+
+        INSERT INTO message_embeddings (session_id, position, role, content_hash, created_at)
+        SELECT session_id, position, role, content_hash, created_at
+        FROM message_embeddings_matched
+        ON CONFLICT (session_id, position) DO NOTHING;
+    END IF;
+
+    DROP TABLE message_embeddings_inline;
+END;
+$$;
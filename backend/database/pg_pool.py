@@ -0,0 +1,229 @@
+import contextlib
+import os
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+from backend.config.db_config import (PG,
+                                      PG_POOL_MIN_CONNECTIONS,
+                                      PG_POOL_MAX_CONNECTIONS,
+                                      PG_POOL_ACQUIRE_TIMEOUT_SECONDS,
+                                      PG_POOL_HEALTHCHECK_IDLE_SECONDS)
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """No connection became free within the acquire timeout (caught by `except psycopg2.Error`)."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe PostgreSQL connection pool.
+
+    Keeps at most max_connections open (min_connections are opened up front). A caller
+    that finds every connection in use waits up to acquire_timeout seconds. Connections
+    that sat idle longer than healthcheck_idle_seconds are pinged before reuse, and
+    closed or broken connections are replaced instead of being handed out. Connections
+    are returned with any open transaction rolled back.
+
+    A forked child never reuses its parent's sockets: the pool notices the new pid and
+    starts empty.
+    """
+
+    def __init__(self, settings: dict, min_connections: int = PG_POOL_MIN_CONNECTIONS,
+                 max_connections: int = PG_POOL_MAX_CONNECTIONS,
+                 acquire_timeout: float = PG_POOL_ACQUIRE_TIMEOUT_SECONDS,
+                 healthcheck_idle_seconds: float = PG_POOL_HEALTHCHECK_IDLE_SECONDS):
+        self.settings = settings
+        self.min_connections = min_connections
+        self.max_connections = max(max_connections, 1)
+        self.acquire_timeout = acquire_timeout
+        self.healthcheck_idle_seconds = healthcheck_idle_seconds
+        self._cond = threading.Condition()
+        self._reset()
+        self._stats = {"acquisitions": 0, "waits": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0,
+                       "timeouts": 0, "opened": 0, "discarded": 0, "healthchecks": 0}
+        try:
+            self._prefill()
+        except psycopg2.Error as e:
+            print(f"Error opening initial PostgreSQL pool connections: {e}")
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._idle = []  # (connection, monotonic time it was returned), most recent last
+        self._open_count = 0
+
+    def _check_pid(self) -> None:
+        # Called with self._cond held. Inherited connections belong to the parent; closing
+        # them here would end the parent's sessions, so they are simply forgotten.
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _prefill(self) -> None:
+        for _ in range(self.min_connections):
+            with self._cond:
+                if self._open_count >= self.min_connections:
+                    return
+                self._open_count += 1
+            try:
+                conn = self._open()
+            except psycopg2.Error:
+                with self._cond:
+                    self._open_count -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def _open(self):
+        conn = psycopg2.connect(**self.settings)
+        with self._cond:
+            self._stats["opened"] += 1
+        return conn
+
+    def _healthy(self, conn, idle_since: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.healthcheck_idle_seconds:
+            return True
+        with self._cond:
+            self._stats["healthchecks"] += 1
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn) -> None:
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._open_count -= 1
+            self._stats["discarded"] += 1
+            self._cond.notify()
+
+    def acquire(self):
+        """Borrows a connection; raises PoolTimeout if none is free within acquire_timeout."""
+        started = time.monotonic()
+        deadline = started + self.acquire_timeout
+        waited = False
+        while True:
+            with self._cond:
+                self._check_pid()
+                while not self._idle and self._open_count >= self.max_connections:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(f"no PostgreSQL connection free after {self.acquire_timeout}s "
+                                          f"({self.max_connections} in use)")
+                    waited = True
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                else:
+                    conn, idle_since = None, None
+                    self._open_count += 1
+
+            if conn is None:
+                try:
+                    conn = self._open()
+                except psycopg2.Error:
+                    with self._cond:
+                        self._open_count -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._healthy(conn, idle_since):
+                self._discard(conn)
+                continue
+
+            wait = time.monotonic() - started
+            with self._cond:
+                self._stats["acquisitions"] += 1
+                self._stats["waits"] += 1 if waited else 0
+                self._stats["wait_seconds_total"] += wait
+                self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], wait)
+            return conn
+
+    def release(self, conn, broken: bool = False) -> None:
+        """Returns a borrowed connection; broken or closed connections are replaced later."""
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+        if broken or conn.closed:
+            self._discard(conn)
+            return
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Borrows a connection for a with-block. Use `with conn:` inside it for a
+        transaction, as with a plain psycopg2 connection; the pool does not commit.
+        """
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken)
+
+    def stats(self) -> dict:
+        """Pool size, usage and acquisition-wait metrics."""
+        with self._cond:
+            self._check_pid()
+            stats = dict(self._stats)
+            stats.update(open=self._open_count, idle=len(self._idle),
+                         in_use=self._open_count - len(self._idle),
+                         min_connections=self.min_connections, max_connections=self.max_connections)
+        stats["wait_seconds_mean"] = (round(stats["wait_seconds_total"] / stats["acquisitions"], 6)
+                                      if stats["acquisitions"] else 0.0)
+        stats["wait_seconds_total"] = round(stats["wait_seconds_total"], 6)
+        stats["wait_seconds_max"] = round(stats["wait_seconds_max"], 6)
+        return stats
+
+    def close_all(self) -> None:
+        """Closes the idle connections (borrowed ones are closed when returned)."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(settings: dict | None = None) -> ConnectionPool:
+    """Returns the process-wide pool for the given connection settings (default PG)."""
+    settings = settings or PG
+    key = tuple(sorted(settings.items()))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(settings)
+    return pool
+
+
+def pool_stats() -> dict:
+    """Stats of every pool in this process, keyed by database name."""
+    return {f"{pool.settings.get('dbname')}@{pool.settings.get('host')}": pool.stats()
+            for pool in list(_pools.values())}
@@ -0,0 +1,214 @@
+import contextlib
+import functools
+import queue
+import threading
+
+import psycopg2
+
+from backend.config.agent_config import SCENE_ANNOTATION_BACKFILL_MESSAGES
+from backend.config.db_config import PG
+from backend.database.pg_pool import get_pool
+
+SCENE_ANNOTATIONS_DDL = """
+CREATE TABLE IF NOT EXISTS scene_annotations (
+    id                             BIGSERIAL PRIMARY KEY,
+    session_id                     TEXT     NOT NULL,
+    message_id                     BIGINT,
+    environment_accuracy_modifier  SMALLINT,
+    location_terrain_category      SMALLINT,
+    temperature                    SMALLINT,
+    perceived_time_of_day          SMALLINT,
+    created_at                     TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+-- The message could not be classified; its hints are unknown
+ALTER TABLE scene_annotations ADD COLUMN IF NOT EXISTS failed BOOLEAN NOT NULL DEFAULT FALSE;
+CREATE INDEX IF NOT EXISTS scene_annotations_session_id_idx
+    ON scene_annotations (session_id, id DESC);
+-- One annotation per conversation_messages row; also answers "is this message annotated"
+CREATE UNIQUE INDEX IF NOT EXISTS scene_annotations_message_id_idx
+    ON scene_annotations (session_id, message_id);
+"""
+
+SCENE_LABELS = ("environment_accuracy_modifier", "location_terrain_category",
+                "temperature", "perceived_time_of_day")
+
+# The session's newest annotated message id (0 if none); annotations are stored in message order
+ANNOTATED_UP_TO_SQL = ("COALESCE((SELECT MAX(message_id) FROM scene_annotations "
+                       "WHERE session_id = %(sid)s), 0)")
+
+
+class SceneAnnotationPipeline:
+    """
+    Write-time scene annotation: every assistant message saved through the attached
+    ConversationManager is classified once, in the background, for weather, terrain,
+    temperature and time-of-day hints, and the labels are stored alongside the message.
+
+    Indicator routes then answer with latest_hints(), a "latest non-null hint per label"
+    index query, instead of re-reading and re-classifying the history on every request.
+
+    The table is the record of what is done: a save only queues its session, and the worker
+    annotates the session's assistant messages in conversation_messages newer than its
+    newest annotation, in message order. is_current() asks the same tables, so it holds
+    across restarts and server processes, and start() re-queues the sessions left behind.
+
+    A message that could not be classified is stored as a failed row. Labels not set by a
+    message after it read as unknown, so the routes fall back to the LLM agents.
+    """
+
+    def __init__(self, classify, pg_settings: dict | None = None):
+        # classify(content) -> {label: index or None}, or None if the message couldn't be annotated
+        self.classify = classify
+        self.pg_settings = pg_settings or PG
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._queued_lock = threading.Lock()
+        self._schema_ready = False
+        self._worker = None
+
+    @contextlib.contextmanager
+    def _connection(self):
+        """Borrows a connection from the process-wide pool, creating the tables on first use."""
+        with get_pool(self.pg_settings).connection() as conn:
+            if not self._schema_ready:
+                with conn, conn.cursor() as cur:
+                    cur.execute(SCENE_ANNOTATIONS_DDL)
+                self._schema_ready = True
+            yield conn
+
+    def attach_to(self, conversation_manager) -> None:
+        """
+        Hooks the pipeline into conversation_manager.save_message: after each successful
+        save of an assistant message, its session is queued for annotation.
+        """
+        save_message = conversation_manager.save_message
+
+        @functools.wraps(save_message)
+        def save_and_annotate(session_id, role, content, *args, **kwargs):
+            result = save_message(session_id, role, content, *args, **kwargs)
+            if role == "assistant":
+                self.enqueue(session_id)
+            return result
+
+        conversation_manager.save_message = save_and_annotate
+
+    def start(self) -> None:
+        """
+        Starts the background annotation worker (idempotent), after queueing every session
+        whose newest assistant messages were saved but never annotated.
+        """
+        if self._worker is None or not self._worker.is_alive():
+            for session_id in self._unannotated_sessions():
+                self.enqueue(session_id)
+            self._worker = threading.Thread(target=self._run, name="scene-annotator", daemon=True)
+            self._worker.start()
+
+    def enqueue(self, session_id: str) -> None:
+        """Schedules annotation of the session; a session already waiting in the queue is not added twice."""
+        with self._queued_lock:
+            if session_id in self._queued:
+                return
+            self._queued.add(session_id)
+        self._queue.put(session_id)
+
+    def is_current(self, session_id: str) -> bool:
+        """
+        True when the session's newest assistant message has been annotated (or failed),
+        read from the tables. False when it has not, or the tables cannot be read.
+        """
+        try:
+            with self._connection() as conn:
+                with conn, conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT NOT EXISTS (SELECT 1 FROM conversation_messages "
+                        "WHERE session_id = %(sid)s AND role = 'assistant' "
+                        f"AND id > {ANNOTATED_UP_TO_SQL})",
+                        {"sid": session_id}
+                    )
+                    return cur.fetchone()[0]
+        except psycopg2.Error as e:
+            print(f"Error checking scene annotations for session {session_id}: {e}")
+            return False
+
+    def _unannotated_sessions(self) -> list[str]:
+        """Sessions with annotations whose newest assistant message has none (work lost on a restart)."""
+        try:
+            with self._connection() as conn:
+                with conn, conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT a.session_id FROM (SELECT session_id, COALESCE(MAX(message_id), 0) AS annotated "
+                        "FROM scene_annotations GROUP BY session_id) a "
+                        "WHERE EXISTS (SELECT 1 FROM conversation_messages m WHERE m.session_id = a.session_id "
+                        "AND m.role = 'assistant' AND m.id > a.annotated)"
+                    )
+                    return [row[0] for row in cur.fetchall()]
+        except psycopg2.Error as e:
+            print(f"Error finding unannotated scene messages: {e}")
+            return []
+
+    def annotate_session(self, session_id: str) -> None:
+        """
+        Annotates the session's assistant messages newer than its newest annotation (at
+        most the newest SCENE_ANNOTATION_BACKFILL_MESSAGES of them), oldest first.
+        """
+        with self._connection() as conn:
+            with conn, conn.cursor() as cur:
+                cur.execute(
+                    "SELECT id, content FROM conversation_messages "
+                    "WHERE session_id = %(sid)s AND role = 'assistant' "
+                    f"AND id > {ANNOTATED_UP_TO_SQL} ORDER BY id DESC LIMIT %(limit)s",
+                    {"sid": session_id, "limit": SCENE_ANNOTATION_BACKFILL_MESSAGES}
+                )
+                messages = cur.fetchall()[::-1]
+
+        for message_id, content in messages:
+            try:
+                labels = self.classify(content)
+            except Exception as e:
+                print(f"Error annotating message {message_id} for session {session_id}: {e}")
+                labels = None
+            self._store(session_id, message_id, labels)
+
+    def _run(self) -> None:
+        while True:
+            session_id = self._queue.get()
+            with self._queued_lock:
+                self._queued.discard(session_id)
+            try:
+                self.annotate_session(session_id)
+            except Exception as e:
+                print(f"Error storing scene annotations for session {session_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _store(self, session_id: str, message_id: int, labels: dict | None) -> None:
+        """Stores the message's labels, or a failed row when labels is None (once per message)."""
+        with self._connection() as conn:
+            with conn, conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO scene_annotations (session_id, message_id, failed, "
+                    + ", ".join(SCENE_LABELS) + ") VALUES (%s, %s, %s, %s, %s, %s, %s) "
+                    "ON CONFLICT (session_id, message_id) DO NOTHING",
+                    (session_id, message_id, labels is None,
+                     *((labels or {}).get(label) for label in SCENE_LABELS))
+                )
+
+    def latest_hints(self, session_id: str) -> dict:
+        """
+        Returns {label: latest non-null value or None} for the session. Each label is
+        an index range scan on (session_id, id DESC) that stops at the first hit; a failed
+        row hit first means a message since the latest value may have changed it (None).
+        """
+        selects = ", ".join(
+            f"(SELECT {label} FROM scene_annotations WHERE session_id = %(sid)s "
+            f"AND ({label} IS NOT NULL OR failed) ORDER BY id DESC LIMIT 1)"
+            for label in SCENE_LABELS
+        )
+        try:
+            with self._connection() as conn:
+                with conn, conn.cursor() as cur:
+                    cur.execute(f"SELECT {selects}", {"sid": session_id})
+                    row = cur.fetchone()
+        except psycopg2.Error as e:
+            print(f"Error reading scene annotations for session {session_id}: {e}")
+            return {label: None for label in SCENE_LABELS}
+        return dict(zip(SCENE_LABELS, row))
@@ -0,0 +1,49 @@
+-- -----------------------------
+-- Conversation schema (roleplay_db)
+-- -----------------------------
+-- Applied by `python -m backend.database.migrate`; later changes go in
+-- backend/database/migrations/NNNN_<name>.sql. Every statement is idempotent.
+--
+-- The tables of the feature stores (indicator_snapshots, scene_annotations,
+-- conversation_summaries, embedding_blobs, message_embeddings) are created by the stores
+-- themselves on first use.
+
+-- One row per saved message, in save order. id is global, so ORDER BY id within a
+-- session is the conversation order.
+--
+-- The columns are those ConversationManager (backend/database/db_manager.py) reads and
+-- writes: save_message(session_id, role, content, input_tokens=, output_tokens=,
+-- objective_time=) stores one row, with timestamp set to the in-game date (the game's
+-- start year from game_config plus objective_time seconds); load_conversation returns
+-- role, content and timestamp in id order. `python -m backend.database.migrate check`
+-- saves probe messages through the real ConversationManager and verifies they land here
+-- with these columns.
+--
+-- With PG_MESSAGE_PARTITIONS > 0 the migration runner creates this table hash-partitioned
+-- by session_id instead (the statement below, plus PARTITION BY HASH). Every query filters
+-- on session_id, so each one touches a single partition; the primary key therefore
+-- leads with session_id.
+CREATE TABLE IF NOT EXISTS conversation_messages (
+    session_id      TEXT        NOT NULL,
+    id              BIGSERIAL,
+    role            TEXT        NOT NULL,
+    content         TEXT        NOT NULL,
+    timestamp       TIMESTAMP   NOT NULL,
+    input_tokens    INTEGER     NOT NULL DEFAULT 0,
+    output_tokens   INTEGER     NOT NULL DEFAULT 0,
+    objective_time  BIGINT      NOT NULL DEFAULT 0,
+    PRIMARY KEY (session_id, id)
+);
+
+-- load_conversation: WHERE session_id = $1 ORDER BY id is a range scan of the primary key
+-- (session_id, id).
+
+-- get_latest_objective_time: MAX(objective_time) WHERE session_id = $1 reads one entry from
+-- the end of the session's range.
+CREATE INDEX IF NOT EXISTS conversation_messages_objective_time_idx
+    ON conversation_messages (session_id, objective_time);
+
+-- get_total_tokens: SUM(input_tokens), SUM(output_tokens) WHERE session_id = $1 as an
+-- index-only scan, without visiting the message bodies.
+CREATE INDEX IF NOT EXISTS conversation_messages_tokens_idx
+    ON conversation_messages (session_id) INCLUDE (input_tokens, output_tokens);
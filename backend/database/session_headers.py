@@ -0,0 +1,46 @@
+import psycopg2
+
+from backend.config.db_config import PG
+from backend.database.pg_pool import get_pool
+
+SESSION_HEADER_SQL = ("SELECT message_count, input_tokens, output_tokens, latest_objective_time, last_message_id "
+                      "FROM conversation_sessions WHERE session_id = %s")
+SESSION_HEADER_FIELDS = ("message_count", "input_tokens", "output_tokens", "latest_objective_time", "last_message_id")
+
+
+class SessionHeaderStore:
+    """
+    Reads the per-session header row (conversation_sessions, see
+    migrations/0001_conversation_sessions.sql) that the database keeps current on every
+    message insert, so the latest objective time and token totals are one primary-key
+    lookup instead of an aggregate over the whole session.
+
+    Methods return None when the header cannot be read (e.g. the migration has not been
+    applied) or the session has none, so callers fall back to ConversationManager's
+    aggregate queries. A missing row is not taken as "no messages": a session saved before
+    the migration's backfill, or through a table without the triggers, has no header either.
+    """
+
+    def __init__(self, pg_settings: dict | None = None):
+        self.pg_settings = pg_settings or PG
+
+    def get(self, session_id: str) -> dict | None:
+        """The session's header as a dict, or None when it has no header row or on error."""
+        try:
+            with get_pool(self.pg_settings).connection() as conn:
+                with conn, conn.cursor() as cur:
+                    cur.execute(SESSION_HEADER_SQL, (session_id,))
+                    row = cur.fetchone()
+        except psycopg2.Error as e:
+            print(f"Error reading session header for session {session_id}: {e}")
+            return None
+        return None if row is None else dict(zip(SESSION_HEADER_FIELDS, row))
+
+    def latest_objective_time(self, session_id: str) -> int | None:
+        header = self.get(session_id)
+        return None if header is None else header["latest_objective_time"]
+
+    def total_tokens(self, session_id: str) -> tuple[int, int] | None:
+        """(input tokens, output tokens), like ConversationManager.get_total_tokens."""
+        header = self.get(session_id)
+        return None if header is None else (header["input_tokens"], header["output_tokens"])
@@ -0,0 +1,118 @@
+import time
+
+import numpy as np
+
+from backend.config.agent_config import EMBEDDING_DIMENSIONS
+
+# float32: 4 bytes/dim; float16: 2 bytes/dim; int8: 1 byte/dim + one float32 scale per vector
+VECTOR_FORMATS = ("float32", "float16", "int8")
+CODE_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+# Rows widened to float32 per step when scoring int8/float16 codes (256 x 384 floats = 384 KiB)
+SCORE_BLOCK_ROWS = 256
+
+
+def row_bytes(vector_format: str, dim: int = EMBEDDING_DIMENSIONS) -> int:
+    """Storage size of one vector in the given format (codes + scale)."""
+    return dim * np.dtype(CODE_DTYPES[vector_format]).itemsize + (4 if vector_format == "int8" else 0)
+
+
+def quantize(vectors, vector_format: str) -> tuple[np.ndarray, np.ndarray | None]:
+    """
+    Encodes float vectors as (codes, scales). int8 uses a symmetric per-vector scale
+    (max |x| / 127); the float formats have no scales.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vector_format == "int8":
+        scales = np.abs(vectors).max(axis=-1) / 127.0
+        scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales[..., None]), -127, 127).astype(np.int8)
+        return codes, scales
+    return vectors.astype(CODE_DTYPES[vector_format]), None
+
+
+def dequantize(codes, scales=None) -> np.ndarray:
+    """Decodes codes (and int8 scales) back to float32 vectors."""
+    vectors = np.asarray(codes, dtype=np.float32)
+    if scales is not None:
+        vectors = vectors * np.asarray(scales, dtype=np.float32)[..., None]
+    return vectors
+
+
+def similarities(codes, scales, query: np.ndarray) -> np.ndarray:
+    """
+    Dot products of a float32 query with stored codes, dequantizing on the fly.
+
+    float32 codes go straight to the matrix-vector product. int8 and float16 codes are
+    widened SCORE_BLOCK_ROWS rows at a time into one small float32 buffer that stays in
+    cache, so a search never builds a float32 copy of the whole matrix; the per-vector
+    int8 scale is applied to the dot products instead of to every component.
+    """
+    query = np.asarray(query, dtype=np.float32)
+    if codes.dtype == np.float32:
+        result = np.asarray(codes @ query, dtype=np.float32)
+    else:
+        result = np.empty(codes.shape[0], dtype=np.float32)
+        buffer = np.empty((min(SCORE_BLOCK_ROWS, codes.shape[0]), codes.shape[1]), dtype=np.float32)
+        for start in range(0, codes.shape[0], SCORE_BLOCK_ROWS):
+            block = codes[start:start + SCORE_BLOCK_ROWS]
+            widened = buffer[:block.shape[0]]
+            np.copyto(widened, block, casting="unsafe")
+            np.matmul(widened, query, out=result[start:start + block.shape[0]])
+    if scales is not None:
+        result *= np.asarray(scales, dtype=np.float32)
+    return result
+
+
+def pack(vector, vector_format: str) -> bytes:
+    """Serializes one vector for the database (int8: float32 scale followed by the codes)."""
+    codes, scales = quantize(np.asarray(vector).reshape(1, -1), vector_format)
+    if scales is not None:
+        return scales.tobytes() + codes.tobytes()
+    return codes.tobytes()
+
+
+def unpack(blob, dim: int = EMBEDDING_DIMENSIONS) -> np.ndarray:
+    """Deserializes a packed vector of any format (told apart by length) to float32."""
+    blob = bytes(blob)
+    if len(blob) == row_bytes("float32", dim):
+        return np.frombuffer(blob, dtype=np.float32).copy()
+    if len(blob) == row_bytes("float16", dim):
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+    if len(blob) == row_bytes("int8", dim):
+        scale = np.frombuffer(blob[:4], dtype=np.float32)[0]
+        return np.frombuffer(blob[4:], dtype=np.int8).astype(np.float32) * scale
+    raise ValueError(f"unexpected packed vector size {len(blob)} for dim {dim}")
+
+
+# -----------------------------
+# Benchmark: memory and recall loss against float32
+# -----------------------------
+# Run from the repository root:  python -m backend.database.vector_codec [vectors]
+
+def run_benchmark(count: int = 200_000, queries: int = 200, k: int = 10) -> None:
+    rng = np.random.default_rng(3)
+    centers = rng.standard_normal((1000, EMBEDDING_DIMENSIONS)).astype(np.float32)
+    corpus = centers[rng.integers(len(centers), size=count)] + 0.8 * rng.standard_normal((count, EMBEDDING_DIMENSIONS)).astype(np.float32)
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    query_vectors = centers[rng.integers(len(centers), size=queries)] + 0.8 * rng.standard_normal((queries, EMBEDDING_DIMENSIONS)).astype(np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+
+    exact = [set(np.argpartition(-(corpus @ query), k)[:k].tolist()) for query in query_vectors]
+    print(f"Corpus: {count} x {EMBEDDING_DIMENSIONS} normalized vectors, {queries} queries, exact top-{k}")
+    for vector_format in VECTOR_FORMATS:
+        codes, scales = quantize(corpus, vector_format)
+        size = codes.nbytes + (scales.nbytes if scales is not None else 0)
+        hits, started = 0, time.perf_counter()
+        for query, expected in zip(query_vectors, exact):
+            scores = similarities(codes, scales, query)
+            hits += len(expected & set(np.argpartition(-scores, k)[:k].tolist()))
+        search_ms = (time.perf_counter() - started) * 1000 / queries
+        error = np.abs(dequantize(codes[:1000], scales[:1000] if scales is not None else None) - corpus[:1000]).max()
+        print(f"  {vector_format:<8} {size / 2**20:8.1f} MiB ({corpus.nbytes / size:4.2f}x smaller)  "
+              f"recall@{k} {hits / (queries * k):.4f}  max abs error {error:.5f}  brute-force {search_ms:.2f} ms/query")
+
+
+if __name__ == "__main__":
+    import sys
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
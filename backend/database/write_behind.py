@@ -0,0 +1,459 @@
+import atexit
+import datetime
+import functools
+import json
+import os
+import signal
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+
+from backend.config.db_config import (WRITE_BEHIND_MAX_PENDING, WRITE_BEHIND_BATCH_SIZE,
+                                      WRITE_BEHIND_FLUSH_INTERVAL_MS, WRITE_BEHIND_MAX_RETRIES,
+                                      WRITE_BEHIND_RETRY_MAX_BACKOFF_MS, WRITE_BEHIND_SPILL_FILE)
+
+MESSAGE_FIELDS = ("input_tokens", "output_tokens", "objective_time")
+
+
+class WriteBehindQueue:
+    """
+    Write-behind persistence for chat messages: the attached ConversationManager's
+    save_message puts the message on a bounded in-process queue and returns at once
+    (without a message id), and a background flusher writes the queued messages through
+    the manager's own save_message, one at a time, in batches taken off the queue.
+
+    Messages of a session are written in the order they were saved. A failed write is
+    retried (that message only, so nothing is written twice) with capped exponential
+    backoff until it succeeds; meanwhile the queue fills up and save_message waits for room,
+    so an outage slows the game down instead of losing messages. stop() (also run at
+    interpreter exit and on SIGTERM) writes whatever is still queued before returning;
+    messages that still cannot be written then are spilled to a file and queued again by
+    the next start(). Until start() has been called, and after stop(), save_message
+    writes through as before.
+
+    Queued and in-flight messages are "pending". The wrapped reads (load_conversation,
+    get_latest_objective_time, get_total_tokens, and SessionHeaderStore's
+    latest_objective_time / total_tokens) add a session's pending messages to what the
+    database returns, so a session reads its own writes before they are flushed.
+    """
+
+    def __init__(self, max_pending: int = WRITE_BEHIND_MAX_PENDING, batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+                 flush_interval_ms: int = WRITE_BEHIND_FLUSH_INTERVAL_MS, max_retries: int = WRITE_BEHIND_MAX_RETRIES,
+                 max_backoff_ms: int = WRITE_BEHIND_RETRY_MAX_BACKOFF_MS, spill_file: str = WRITE_BEHIND_SPILL_FILE):
+        self.max_pending = max(1, max_pending)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0, flush_interval_ms) / 1000.0
+        self.max_retries = max(1, max_retries)
+        self.max_backoff = max(0, max_backoff_ms) / 1000.0
+        self.spill_file = spill_file
+        self._cond = threading.Condition()
+        self._queue = deque()                 # (session_id, message) in save order
+        self._pending = defaultdict(list)     # session_id -> messages not yet written, oldest first
+        self._generation = defaultdict(int)   # session_id -> bumped when a write starts and ends
+        self._writing = set()                 # session_ids the flusher is writing right now
+        self._depth = 0
+        self._accepting = False
+        self._stopping = False
+        self._worker = None
+        self._write = None
+        self._signal_installed = False
+        self._stats = {"saved": 0, "written": 0, "batches": 0, "failed_attempts": 0,
+                       "spilled": 0, "replayed": 0, "blocked_saves": 0, "max_depth": 0}
+
+    # -----------------------------
+    # Hooks
+    # -----------------------------
+
+    def attach_to(self, conversation_manager) -> None:
+        """
+        Routes conversation_manager.save_message through the queue and wraps its reads (see
+        attach_reads). The flusher writes with the save_message found here, so attach the
+        queue after the stores that wrap save_message: their hooks run when a message is
+        actually written.
+        """
+        save_message = conversation_manager.save_message
+
+        def write(session_id: str, message: dict) -> None:
+            save_message(session_id, message["role"], message["content"],
+                         **{key: message[key] for key in MESSAGE_FIELDS if key in message})
+
+        self._write = write
+
+        @functools.wraps(save_message)
+        def save_later(session_id, role, content, **kwargs):
+            message = {"role": role, "content": content}
+            message.update((key, kwargs[key]) for key in MESSAGE_FIELDS if kwargs.get(key) is not None)
+            if not self._put(session_id, message):
+                return save_message(session_id, role, content, **kwargs)
+            return None
+
+        conversation_manager.save_message = save_later
+        self.attach_reads(conversation_manager)
+
+    def attach_reads(self, reader) -> None:
+        """
+        Makes a ConversationManager's (or a SessionHeaderStore's) reads include the
+        session's pending messages. Use it for readers that do not save messages themselves.
+        """
+        load_conversation = getattr(reader, "load_conversation", None)
+        if load_conversation is not None:
+            @functools.wraps(load_conversation)
+            def load_with_pending(session_id, *args, **kwargs):
+                history, pending = self._read_with_pending(session_id, lambda: load_conversation(session_id, *args, **kwargs))
+                if not pending:
+                    return history
+                history = list(history or [])
+                return history + pending_rows(history, pending)
+
+            reader.load_conversation = load_with_pending
+
+        for name in ("get_latest_objective_time", "latest_objective_time"):
+            latest_objective_time = getattr(reader, name, None)
+            if latest_objective_time is not None:
+                setattr(reader, name, self._wrap_objective_time(latest_objective_time))
+
+        for name in ("get_total_tokens", "total_tokens"):
+            total_tokens = getattr(reader, name, None)
+            if total_tokens is not None:
+                setattr(reader, name, self._wrap_total_tokens(total_tokens))
+
+    def _wrap_objective_time(self, latest_objective_time):
+        @functools.wraps(latest_objective_time)
+        def latest_with_pending(session_id):
+            value, pending = self._read_with_pending(session_id, lambda: latest_objective_time(session_id))
+            times = [message["objective_time"] for message in pending if message.get("objective_time") is not None]
+            # None means the reader failed; keep it so the caller falls back as before
+            return value if value is None or not times else max(value, *times)
+
+        return latest_with_pending
+
+    def _wrap_total_tokens(self, total_tokens):
+        @functools.wraps(total_tokens)
+        def totals_with_pending(session_id):
+            totals, pending = self._read_with_pending(session_id, lambda: total_tokens(session_id))
+            if totals is None or not pending:
+                return totals
+            return (totals[0] + sum(message.get("input_tokens") or 0 for message in pending),
+                    totals[1] + sum(message.get("output_tokens") or 0 for message in pending))
+
+        return totals_with_pending
+
+    def _read_with_pending(self, session_id: str, read):
+        """
+        Runs read() and returns (result, pending messages it cannot contain yet). Retried if
+        the flusher wrote to the session meanwhile, so a message is never both in the
+        result and pending, nor in neither.
+        """
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: session_id not in self._writing)
+                pending = list(self._pending.get(session_id, ()))
+                generation = self._generation[session_id]
+            result = read()
+            if not pending:
+                return result, []
+            with self._cond:
+                if self._generation[session_id] == generation and session_id not in self._writing:
+                    return result, pending
+
+    # -----------------------------
+    # Queue
+    # -----------------------------
+
+    def start(self) -> None:
+        """
+        Queues any messages spilled by an earlier stop(), starts the background flusher
+        (idempotent), and makes interpreter exit and SIGTERM stop it.
+        """
+        with self._cond:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._accepting = True
+            self._stopping = False
+            self._replay_spill()
+            self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._worker.start()
+        atexit.register(self.stop)
+        self._install_sigterm_handler()
+
+    def stop(self, timeout: float | None = None) -> None:
+        """
+        Writes every queued message, then stops the flusher; later saves write through.
+        Messages that still fail after max_retries attempts are spilled to spill_file.
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
+
+    def flush(self, session_id: str | None = None, timeout: float | None = None) -> bool:
+        """
+        Waits until the session's (or, without a session_id, every) pending message has
+        been written. Returns False on timeout.
+        """
+        with self._cond:
+            if session_id is None:
+                return self._cond.wait_for(lambda: self._depth == 0, timeout)
+            return self._cond.wait_for(lambda: not self._pending.get(session_id), timeout)
+
+    def depth(self) -> int:
+        """Number of messages queued or being written."""
+        with self._cond:
+            return self._depth
+
+    def stats(self) -> dict:
+        with self._cond:
+            return dict(self._stats, depth=self._depth, queued=len(self._queue), max_pending=self.max_pending,
+                        sessions=len(self._pending), running=self._accepting)
+
+    def _install_sigterm_handler(self) -> None:
+        """
+        atexit handlers do not run when the process is killed by SIGTERM (the default
+        action), so on SIGTERM stop() first and then hand over to the previous handler.
+        Signal handlers can only be set from the main thread; elsewhere this is skipped.
+        """
+        if self._signal_installed or threading.current_thread() is not threading.main_thread():
+            return
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def stop_on_sigterm(signum, frame):
+            self.stop()
+            if callable(previous):
+                previous(signum, frame)
+            elif previous != signal.SIG_IGN:
+                raise SystemExit(128 + signum)
+
+        signal.signal(signal.SIGTERM, stop_on_sigterm)
+        self._signal_installed = True
+
+    def _put(self, session_id: str, message: dict) -> bool:
+        with self._cond:
+            if not self._accepting:
+                return False
+            if self._depth >= self.max_pending:
+                self._stats["blocked_saves"] += 1
+                self._cond.wait_for(lambda: self._depth < self.max_pending or not self._accepting)
+                if not self._accepting:
+                    return False
+            self._enqueue(session_id, message)
+            self._stats["saved"] += 1
+            return True
+
+    def _enqueue(self, session_id: str, message: dict) -> None:
+        """Appends a message to the queue (called with _cond held)."""
+        self._queue.append((session_id, message))
+        self._pending[session_id].append(message)
+        self._depth += 1
+        self._stats["max_depth"] = max(self._stats["max_depth"], self._depth)
+        self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._stopping)
+                if not self._queue:
+                    # Stopping and drained; saves from now on write through
+                    self._accepting = False
+                    self._cond.notify_all()
+                    return
+                # Give a burst of saves a moment to fill the batch
+                self._cond.wait_for(lambda: len(self._queue) >= self.batch_size or self._stopping, self.flush_interval)
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+
+            by_session = OrderedDict()
+            for session_id, message in batch:
+                by_session.setdefault(session_id, []).append(message)
+            for session_id, messages in by_session.items():
+                self._write_session(session_id, messages)
+            with self._cond:
+                self._stats["batches"] += 1
+
+    def _write_session(self, session_id: str, messages: list[dict]) -> None:
+        """
+        Writes the session's messages in order. A failed message is retried on its own
+        (the ones before it are written and leave the pending list one by one) until it
+        succeeds, or, while stopping, until max_retries attempts have failed; then it and
+        the rest are spilled.
+        """
+        for position, message in enumerate(messages):
+            attempt = 0
+            while True:
+                with self._cond:
+                    self._writing.add(session_id)
+                    self._generation[session_id] += 1
+                written = False
+                try:
+                    self._write(session_id, message)
+                    written = True
+                except Exception as e:
+                    attempt += 1
+                    print(f"Error writing a queued message for session {session_id} (attempt {attempt}): {e}")
+                finally:
+                    with self._cond:
+                        if written:
+                            # The session's oldest pending message is exactly the one just written
+                            self._pop_pending(session_id, 1)
+                            self._stats["written"] += 1
+                        else:
+                            self._stats["failed_attempts"] += 1
+                        self._writing.discard(session_id)
+                        self._generation[session_id] += 1
+                        stopping = self._stopping
+                        self._cond.notify_all()
+                if written:
+                    break
+                if stopping and attempt >= self.max_retries:
+                    self._spill(session_id, messages[position:])
+                    return
+                time.sleep(min(self.max_backoff, 0.1 * 2 ** min(attempt - 1, 16)))
+
+    def _pop_pending(self, session_id: str, count: int) -> None:
+        """Removes the session's oldest `count` pending messages (called with _cond held)."""
+        del self._pending[session_id][:count]
+        if not self._pending[session_id]:
+            del self._pending[session_id]
+        self._depth -= count
+
+    def _spill(self, session_id: str, messages: list[dict]) -> None:
+        """Appends messages that could not be written before stopping to spill_file."""
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.spill_file)), exist_ok=True)
+            with open(self.spill_file, 'a', encoding='utf-8') as f:
+                for message in messages:
+                    f.write(json.dumps({"session_id": session_id, "message": message}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            print(f"Spilled {len(messages)} unwritten messages for session {session_id} to {self.spill_file}")
+        except OSError as e:
+            print(f"Error spilling {len(messages)} unwritten messages for session {session_id}: {e}")
+        with self._cond:
+            self._pop_pending(session_id, len(messages))
+            self._stats["spilled"] += len(messages)
+            self._generation[session_id] += 1
+            self._cond.notify_all()
+
+    def _replay_spill(self) -> None:
+        """Queues the messages an earlier stop() spilled (called with _cond held)."""
+        if not os.path.exists(self.spill_file):
+            return
+        replaying = self.spill_file + ".replaying"
+        try:
+            os.replace(self.spill_file, replaying)
+            with open(replaying, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._enqueue(entry["session_id"], entry["message"])
+                        self._stats["replayed"] += 1
+            os.remove(replaying)
+        except (OSError, ValueError) as e:
+            print(f"Error replaying spilled messages from {replaying}: {e}")
+
+
+def pending_rows(history: list[dict], pending: list[dict]) -> list[dict]:
+    """
+    Pending messages shaped like the rows load_conversation returned: the same keys (id
+    None until the row exists) and a provisional in-game timestamp, the newest row's
+    moved on by the difference in objective time when both are known.
+    """
+    last = history[-1] if history else {}
+    keys = list(last) or ["role", "content", "timestamp"]
+    base = last.get("timestamp")
+    base_time = last.get("objective_time")
+    rows = []
+    for message in pending:
+        row = dict.fromkeys(keys)
+        row.update(role=message["role"], content=message["content"],
+                   timestamp=_provisional_timestamp(base, base_time, message.get("objective_time")))
+        if "objective_time" in row and "objective_time" in message:
+            row["objective_time"] = message["objective_time"]
+        rows.append(row)
+    return rows
+
+
+def _provisional_timestamp(base, base_time, objective_time):
+    if base is None:
+        return datetime.datetime.now().isoformat(timespec="seconds")
+    if base_time is None or objective_time is None:
+        return base
+    try:
+        moved = (base if isinstance(base, datetime.datetime) else datetime.datetime.fromisoformat(str(base))) \
+            + datetime.timedelta(seconds=objective_time - base_time)
+    except (TypeError, ValueError, OverflowError):
+        return base
+    return moved if isinstance(base, datetime.datetime) else moved.isoformat()
+
+
+# -----------------------------
+# Benchmark
+# -----------------------------
+# Run from the repository root:
+#   python -m backend.database.write_behind [turns] [sessions] [write latency ms]
+#
+# Simulates chat turns (one user and one assistant save each) against a manager whose
+# writes take a fixed time per call, and compares the time callers spend in save_message
+# with synchronous writes and with the write-behind queue, then with the queue against a
+# manager that fails every 10th write (no message may be lost or written twice).
+
+def run_benchmark(turns: int = 200, sessions: int = 8, write_latency_ms: float = 5.0) -> None:
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    class SlowManager:
+        def __init__(self, fail_every: int = 0):
+            self.rows = defaultdict(list)
+            self.calls = 0
+            self.fail_every = fail_every
+
+        def save_message(self, session_id, role, content, **kwargs):
+            time.sleep(write_latency_ms / 1000.0)
+            self.calls += 1
+            if self.fail_every and self.calls % self.fail_every == 0:
+                raise ConnectionError("simulated write failure")
+            self.rows[session_id].append(dict(kwargs, role=role, content=content))
+
+        def load_conversation(self, session_id):
+            return list(self.rows[session_id])
+
+    def play(manager, session_number):
+        session_id = f"session-{session_number}"
+        spent = 0.0
+        for turn in range(turns // sessions):
+            for role in ("user", "assistant"):
+                started = time.perf_counter()
+                manager.save_message(session_id, role, f"{role} turn {turn}", objective_time=turn)
+                spent += time.perf_counter() - started
+            if len(manager.load_conversation(session_id)) != 2 * (turn + 1):
+                raise AssertionError(f"{session_id} lost a message")
+        return spent
+
+    for mode in ("synchronous", "write-behind", "flaky writes"):
+        manager = SlowManager(fail_every=10 if mode == "flaky writes" else 0)
+        queue = None
+        if mode != "synchronous":
+            queue = WriteBehindQueue(max_backoff_ms=20, spill_file=os.path.join(tempfile.mkdtemp(), "spill.jsonl"))
+            queue.attach_to(manager)
+            queue.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            spent = sum(pool.map(lambda number: play(manager, number), range(sessions)))
+        if queue is not None:
+            queue.stop()
+        elapsed = time.perf_counter() - started
+        saves = 2 * (turns // sessions) * sessions
+        in_order = all([(m["objective_time"], m["role"]) for m in rows] == [(turn, role) for turn in range(turns // sessions)
+                                                                           for role in ("user", "assistant")]
+                       for rows in manager.rows.values())
+        print(f"{mode:>12}: {1000 * spent / saves:.3f} ms per save_message, {manager.calls} write calls, "
+              f"{elapsed:.2f}s total, every message written once and in order: {in_order}"
+              + (f", {queue.stats()}" if queue is not None else ""))
+
+
+if __name__ == "__main__":
+    import sys
+
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+                  int(sys.argv[2]) if len(sys.argv) > 2 else 8,
+                  float(sys.argv[3]) if len(sys.argv) > 3 else 5.0)
@@ -0,0 +1,385 @@
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from backend.config.agent_config import (EMBEDDING_MODEL_NAME,
+                                         EMBEDDING_CACHE_DIR,
+                                         EMBEDDING_DIMENSIONS,
+                                         EMBEDDING_MAX_SEQ_LENGTH,
+                                         EMBEDDING_BACKEND,
+                                         ONNX_EXPORT_DIR,
+                                         ONNX_MIN_PARITY_COSINE,
+                                         EMBEDDING_SERVER_URL,
+                                         EMBEDDING_SERVER_TIMEOUT_SECONDS,
+                                         VECTORIZE_BATCH_SIZE,
+                                         VECTORIZE_PROCESSES)
+
+ONNX_MODEL_FILE = "model.int8.onnx"
+ONNX_PARITY_FILE = "parity.json"
+
+_model = None
+_model_failed = False
+_model_lock = threading.Lock()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# One HTTP session (kept-alive connection) per thread for the embedding server
+_client_local = threading.local()
+
+
+def _load_sentence_transformer():
+    try:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(EMBEDDING_MODEL_NAME,
+                                    cache_folder=os.path.join(os.getcwd(), EMBEDDING_CACHE_DIR),
+                                    device="cpu")
+        model.max_seq_length = EMBEDDING_MAX_SEQ_LENGTH
+        return model
+    except Exception as e:
+        print(f"Error loading embedding model {EMBEDDING_MODEL_NAME}: {e}")
+        return None
+
+
+def _load_onnx_model():
+    export_dir = os.path.join(os.getcwd(), ONNX_EXPORT_DIR)
+    try:
+        with open(os.path.join(export_dir, ONNX_PARITY_FILE), 'r', encoding='utf-8') as f:
+            parity = json.load(f)
+        if parity.get("min_cosine", 0) < ONNX_MIN_PARITY_COSINE:
+            print(f"ONNX embedding model failed the parity check ({parity}); using sentence-transformers.")
+            return None
+        return OnnxEmbeddingModel(export_dir)
+    except Exception as e:
+        print(f"Error loading ONNX embedding model from {export_dir}: {e}")
+        return None
+
+
+def get_embedding_model():
+    """
+    Returns the process-wide MiniLM model loaded from the bundled cache
+    (backend/database/data/vector_cache), loading it on first use. With
+    EMBEDDING_BACKEND = "onnx-int8" this is the quantized ONNX export, falling back to
+    the SentenceTransformer if the export is missing or failed its parity check.
+
+    Returns None if no backend can be loaded, so callers can fall back to their
+    non-embedding path.
+    """
+    global _model, _model_failed
+    if _model is None and not _model_failed:
+        with _model_lock:
+            if _model is None and not _model_failed:
+                if EMBEDDING_BACKEND == "onnx-int8":
+                    _model = _load_onnx_model()
+                if _model is None:
+                    _model = _load_sentence_transformer()
+                _model_failed = _model is None
+    return _model
+
+
+def encode(texts: list[str]):
+    """
+    Embeds texts with the shared model as L2-normalized float32 vectors (numpy array of
+    shape (len(texts), 384)), or returns None when the model is unavailable. When
+    EMBEDDING_SERVER_URL is set the texts are embedded by the shared embedding server.
+    """
+    if EMBEDDING_SERVER_URL:
+        return encode_remote(texts)
+    return _encode_local(texts)
+
+
+def _encode_local(texts: list[str]):
+    model = get_embedding_model()
+    if model is None:
+        return None
+    return model.encode(texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=True)
+
+
+# -----------------------------
+# Quantized ONNX backend
+# -----------------------------
+
+def snapshot_dir() -> str:
+    """Directory of the bundled MiniLM snapshot (config.json, tokenizer.json, weights)."""
+    repo_dir = os.path.join(os.getcwd(), EMBEDDING_CACHE_DIR, "models--" + EMBEDDING_MODEL_NAME.replace("/", "--"))
+    with open(os.path.join(repo_dir, "refs", "main"), 'r', encoding='utf-8') as f:
+        revision = f.read().strip()
+    return os.path.join(repo_dir, "snapshots", revision)
+
+
+class OnnxEmbeddingModel:
+    """
+    MiniLM as an int8-quantized ONNX graph run by onnxruntime, with the fast (Rust)
+    tokenizer from tokenizer.json and the same mean pooling as the sentence-transformers
+    model. encode() accepts the SentenceTransformer.encode arguments used in this repo.
+    """
+
+    def __init__(self, export_dir: str):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(os.path.join(export_dir, ONNX_MODEL_FILE), options,
+                                                    providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(export_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(EMBEDDING_MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+    def encode(self, texts: list[str], batch_size: int = 32, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = True, **kwargs):
+        import numpy as np
+
+        vectors = np.empty((len(texts), EMBEDDING_DIMENSIONS), dtype=np.float32)
+        # Batch similar lengths together so little compute goes to padding
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        for start in range(0, len(texts), batch_size):
+            rows = order[start:start + batch_size]
+            encodings = self.tokenizer.encode_batch([texts[i] for i in rows])
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                     "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+            hidden = self.session.run(None, feeds)[0]
+            mask = attention_mask[..., None].astype(np.float32)
+            vectors[rows] = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if normalize_embeddings:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors
+
+
+PARITY_SENTENCES = [
+    "The caravan halts at the edge of the salt flat as the sun sets.",
+    "A scribe in linen robes demands to know where you came from.",
+    "Rain hammers the reed roofs of the village all night.",
+    "We trade the lighter for a warm cloak and a skin of goat milk.",
+    "The temple courtyard is silent except for the doves.",
+    "Soldiers with bronze spears block the bridge over the river.",
+    "You wake in a cold cave, your phone dead and your head aching.",
+    "The market is crowded with merchants selling dates, wool and copper pots.",
+]
+
+
+def check_parity(texts: list[str] | None = None, export_dir: str = ONNX_EXPORT_DIR) -> dict:
+    """Compares ONNX and sentence-transformers embeddings: per-text cosine similarity stats."""
+    import numpy as np
+
+    texts = texts or PARITY_SENTENCES
+    reference = _load_sentence_transformer()
+    if reference is None:
+        raise RuntimeError("sentence-transformers model unavailable for the parity check")
+    expected = reference.encode(texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=True)
+    actual = OnnxEmbeddingModel(os.path.join(os.getcwd(), export_dir)).encode(texts)
+    cosines = (np.asarray(expected) * actual).sum(axis=1)
+    return {"texts": len(texts), "min_cosine": float(cosines.min()), "mean_cosine": float(cosines.mean())}
+
+
+def export_onnx_int8(export_dir: str = ONNX_EXPORT_DIR) -> dict:
+    """
+    Exports the bundled MiniLM transformer to ONNX, quantizes its weights to int8
+    (dynamic quantization), copies the fast tokenizer next to it and records the parity
+    check in parity.json. Returns the parity result.
+    """
+    import shutil
+
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel
+
+    source = snapshot_dir()
+    export_dir = os.path.join(os.getcwd(), export_dir)
+    os.makedirs(export_dir, exist_ok=True)
+    fp32_path = os.path.join(export_dir, "model.fp32.onnx")
+
+    model = AutoModel.from_pretrained(source).eval()
+    dummy = torch.ones((1, 8), dtype=torch.int64)
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    with torch.no_grad():
+        torch.onnx.export(model, (dummy, dummy, torch.zeros_like(dummy)), fp32_path,
+                          input_names=names, output_names=["last_hidden_state"],
+                          dynamic_axes={name: {0: "batch", 1: "sequence"} for name in names + ["last_hidden_state"]},
+                          opset_version=14)
+    quantize_dynamic(fp32_path, os.path.join(export_dir, ONNX_MODEL_FILE), weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    shutil.copy(os.path.join(source, "tokenizer.json"), os.path.join(export_dir, "tokenizer.json"))
+
+    parity = check_parity(export_dir=export_dir)
+    parity["passed"] = parity["min_cosine"] >= ONNX_MIN_PARITY_COSINE
+    with open(os.path.join(export_dir, ONNX_PARITY_FILE), 'w', encoding='utf-8') as f:
+        json.dump(parity, f, indent=2)
+    return parity
+
+
+# -----------------------------
+# Batched encoding for background vectorization
+# -----------------------------
+
+def _init_pool_process(threads: int) -> None:
+    # Split the cores between pool processes instead of letting each one use all of them
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except Exception:
+        pass
+    get_embedding_model()
+
+
+def _encode_batch(texts: list[str]):
+    model = get_embedding_model()
+    if model is None:
+        return None
+    return model.encode(texts, batch_size=VECTORIZE_BATCH_SIZE, convert_to_numpy=True, normalize_embeddings=True)
+
+
+def get_process_pool() -> ProcessPoolExecutor | None:
+    """
+    Returns the embedding process pool (VECTORIZE_PROCESSES workers, each with its own model),
+    or None when VECTORIZE_PROCESSES is 0.
+
+    Workers are spawned, not forked, so they never inherit the web process's threads; the
+    spawned interpreters re-import the entry module as __mp_main__ (see main.py).
+    """
+    global _pool
+    if VECTORIZE_PROCESSES <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                threads = max(1, (os.cpu_count() or 1) // VECTORIZE_PROCESSES)
+                _pool = ProcessPoolExecutor(max_workers=VECTORIZE_PROCESSES,
+                                            mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_init_pool_process,
+                                            initargs=(threads,))
+    return _pool
+
+
+def encode_many(texts: list[str]):
+    """
+    Embeds a large batch for background vectorization: forward passes of VECTORIZE_BATCH_SIZE
+    texts, spread over the process pool when one is configured. Same return value as encode().
+    """
+    if not texts:
+        return None
+    if EMBEDDING_SERVER_URL:
+        return encode_remote(texts)
+    return _encode_many_local(texts)
+
+
+def _encode_many_local(texts: list[str]):
+    pool = get_process_pool()
+    if pool is None:
+        return _encode_batch(texts)
+
+    import numpy as np
+    chunks = [texts[start:start + VECTORIZE_BATCH_SIZE] for start in range(0, len(texts), VECTORIZE_BATCH_SIZE)]
+    results = list(pool.map(_encode_batch, chunks))
+    if any(result is None for result in results):
+        return None
+    return np.concatenate(results)
+
+
+# -----------------------------
+# Shared embedding server client
+# -----------------------------
+
+def _server_session():
+    session = getattr(_client_local, "session", None)
+    if session is None:
+        import requests
+        session = _client_local.session = requests.Session()
+    return session
+
+
+def encode_remote(texts: list[str]):
+    """
+    Embeds texts with the embedding server at EMBEDDING_SERVER_URL (see embedding_server.py).
+    Same return value as encode(); None if the server cannot be reached or fails.
+    """
+    import base64
+
+    import numpy as np
+
+    if not texts:
+        return None
+    try:
+        response = _server_session().post(EMBEDDING_SERVER_URL.rstrip("/") + "/embed", json={"texts": texts},
+                                          timeout=EMBEDDING_SERVER_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        body = response.json()
+        vectors = np.frombuffer(base64.b64decode(body["embeddings"]), dtype=np.float32)
+        return vectors.reshape(body["count"], body["dim"])
+    except Exception as e:
+        print(f"Error embedding {len(texts)} texts with the embedding server at {EMBEDDING_SERVER_URL}: {e}")
+        return None
+
+
+def server_stats() -> dict | None:
+    """Health and throughput of the configured embedding server, or None if none is configured."""
+    if not EMBEDDING_SERVER_URL:
+        return None
+    try:
+        response = _server_session().get(EMBEDDING_SERVER_URL.rstrip("/") + "/stats", timeout=5)
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        return {"status": "unreachable", "error": str(e)}
+
+
+# -----------------------------
+# Export, parity check and benchmark
+# -----------------------------
+# Run from the repository root:
+#   python -m backend.embedding_model export    (writes ONNX_EXPORT_DIR, then set EMBEDDING_BACKEND)
+#   python -m backend.embedding_model parity
+#   python -m backend.embedding_model bench [sentences]
+
+def _benchmark_sentences(count: int) -> list[str]:
+    words = ("river temple market soldier scribe caravan bronze wool barley storm harbor priest "
+             "cloak lamp gate bridge desert village fever omen").split()
+    return [" ".join(words[(i * 7 + j * 3) % len(words)] for j in range(6 + i % 20)).capitalize() + "."
+            for i in range(count)]
+
+
+def _benchmark_backend(backend: str, count: int) -> dict:
+    import resource
+    import time
+
+    started = time.perf_counter()
+    model = OnnxEmbeddingModel(os.path.join(os.getcwd(), ONNX_EXPORT_DIR)) if backend == "onnx-int8" else _load_sentence_transformer()
+    load_seconds = time.perf_counter() - started
+    texts = _benchmark_sentences(count)
+    model.encode(texts[:64], batch_size=VECTORIZE_BATCH_SIZE, convert_to_numpy=True, normalize_embeddings=True)  # warm-up
+    started = time.perf_counter()
+    model.encode(texts, batch_size=VECTORIZE_BATCH_SIZE, convert_to_numpy=True, normalize_embeddings=True)
+    seconds = time.perf_counter() - started
+    return {"backend": backend, "sentences": count, "load_seconds": round(load_seconds, 2),
+            "sentences_per_second": round(count / seconds, 1),
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+
+if __name__ == "__main__":
+    import subprocess
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "bench"
+    if command == "export":
+        print(json.dumps(export_onnx_int8(), indent=2))
+    elif command == "parity":
+        print(json.dumps(check_parity(), indent=2))
+    elif command == "bench-backend":
+        print(json.dumps(_benchmark_backend(sys.argv[2], int(sys.argv[3]))))
+    elif command == "bench":
+        count = sys.argv[2] if len(sys.argv) > 2 else "2000"
+        # One process per backend so each RSS figure only includes that backend
+        for backend in ("sentence-transformers", "onnx-int8"):
+            result = subprocess.run([sys.executable, "-m", "backend.embedding_model", "bench-backend", backend, count],
+                                    capture_output=True, text=True)
+            print(result.stdout.strip().splitlines()[-1] if result.returncode == 0 and result.stdout.strip()
+                  else f"{backend}: failed\n{result.stderr.strip()[-500:]}")
+        print(json.dumps(check_parity(), indent=2))
+    else:
+        print("usage: python -m backend.embedding_model export|parity|bench [sentences]")
@@ -0,0 +1,255 @@
+import base64
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from backend import embedding_model
+from backend.config.agent_config import (EMBEDDING_DIMENSIONS,
+                                         EMBEDDING_BACKEND,
+                                         EMBEDDING_SERVER_HOST,
+                                         EMBEDDING_SERVER_PORT,
+                                         EMBEDDING_SERVER_MAX_BATCH,
+                                         EMBEDDING_SERVER_MAX_WAIT_MS)
+
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+
+class EmbeddingBatcher:
+    """
+    Merges embedding requests from concurrent clients into shared forward passes.
+
+    One worker thread owns the model. After taking the first waiting request it keeps
+    collecting requests for up to max_wait_ms or until max_batch texts are pending, embeds
+    them all at once and hands each client its own rows.
+    """
+
+    def __init__(self, encode_batch, max_batch: int = EMBEDDING_SERVER_MAX_BATCH,
+                 max_wait_ms: float = EMBEDDING_SERVER_MAX_WAIT_MS):
+        # encode_batch(texts) -> (len(texts), dim) float32 array, or None on failure
+        self.encode_batch = encode_batch
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "texts": 0, "batches": 0, "errors": 0,
+                       "busy_seconds": 0.0, "largest_batch": 0}
+        self.started_at = time.time()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, texts: list[str]) -> np.ndarray:
+        """Embeds texts in the next shared batch; raises RuntimeError if encoding fails."""
+        job = {"texts": texts, "done": threading.Event(), "vectors": None}
+        self._queue.put(job)
+        job["done"].wait()
+        if job["vectors"] is None:
+            raise RuntimeError("embedding model unavailable")
+        return job["vectors"]
+
+    def _collect(self) -> list[dict]:
+        jobs = [self._queue.get()]
+        pending = len(jobs[0]["texts"])
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while pending < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            jobs.append(job)
+            pending += len(job["texts"])
+        return jobs
+
+    def _run(self) -> None:
+        while True:
+            jobs = self._collect()
+            texts = [text for job in jobs for text in job["texts"]]
+            started = time.perf_counter()
+            try:
+                vectors = self.encode_batch(texts)
+            except Exception as e:
+                print(f"Error embedding a batch of {len(texts)} texts: {e}")
+                vectors = None
+            elapsed = time.perf_counter() - started
+
+            start = 0
+            for job in jobs:
+                end = start + len(job["texts"])
+                job["vectors"] = None if vectors is None else np.ascontiguousarray(vectors[start:end], dtype=np.float32)
+                job["done"].set()
+                start = end
+
+            with self._stats_lock:
+                self._stats["requests"] += len(jobs)
+                self._stats["texts"] += len(texts)
+                self._stats["batches"] += 1
+                self._stats["errors"] += len(jobs) if vectors is None else 0
+                self._stats["busy_seconds"] += elapsed
+                self._stats["largest_batch"] = max(self._stats["largest_batch"], len(texts))
+
+    def stats(self) -> dict:
+        """Lifetime throughput counters plus the current queue depth."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        uptime = time.time() - self.started_at
+        stats.update(
+            uptime_seconds=round(uptime, 1),
+            queue_depth=self._queue.qsize(),
+            mean_batch_texts=round(stats["texts"] / stats["batches"], 2) if stats["batches"] else 0.0,
+            texts_per_second=round(stats["texts"] / uptime, 2) if uptime else 0.0,
+            texts_per_busy_second=round(stats["texts"] / stats["busy_seconds"], 1) if stats["busy_seconds"] else 0.0,
+            utilization=round(stats["busy_seconds"] / uptime, 3) if uptime else 0.0,
+            busy_seconds=round(stats["busy_seconds"], 3),
+            max_batch=self.max_batch,
+            max_wait_ms=self.max_wait_ms,
+        )
+        return stats
+
+
+class EmbeddingRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /embed   {"texts": [...]} -> {"count", "dim", "embeddings": base64 float32 rows}
+    GET  /health  200 when the model is loaded, 503 otherwise
+    GET  /stats   batcher throughput counters
+    """
+
+    protocol_version = "HTTP/1.1"  # keep-alive, so each web worker reuses one connection
+
+    def _reply(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/health":
+            ready = self.server.model_ready()
+            self._reply(200 if ready else 503, {"status": "ok" if ready else "unavailable",
+                                                "backend": self.server.backend_name,
+                                                "dim": EMBEDDING_DIMENSIONS})
+        elif self.path == "/stats":
+            stats = self.server.batcher.stats()
+            stats.update(status="ok" if self.server.model_ready() else "unavailable",
+                         backend=self.server.backend_name)
+            self._reply(200, stats)
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/embed":
+            self._reply(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length > MAX_REQUEST_BYTES:
+                self._reply(413, {"error": "request too large"})
+                return
+            texts = json.loads(self.rfile.read(length)).get("texts")
+            if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                self._reply(400, {"error": "'texts' must be a list of strings"})
+                return
+        except Exception as e:
+            self._reply(400, {"error": f"invalid request: {e}"})
+            return
+        if not texts:
+            self._reply(200, {"count": 0, "dim": EMBEDDING_DIMENSIONS, "embeddings": ""})
+            return
+        try:
+            vectors = self.server.batcher.submit(texts)
+        except Exception as e:
+            self._reply(503, {"error": str(e)})
+            return
+        self._reply(200, {"count": vectors.shape[0], "dim": vectors.shape[1],
+                          "embeddings": base64.b64encode(vectors.tobytes()).decode("ascii")})
+
+    def log_message(self, format, *args):
+        pass  # one line per request would drown the server log
+
+
+class EmbeddingServer(ThreadingHTTPServer):
+    """Localhost HTTP server in front of one EmbeddingBatcher (and so one model)."""
+
+    daemon_threads = True
+
+    def __init__(self, host: str, port: int, batcher: EmbeddingBatcher, model_ready=lambda: True,
+                 backend_name: str = EMBEDDING_BACKEND):
+        super().__init__((host, port), EmbeddingRequestHandler)
+        self.batcher = batcher
+        self.model_ready = model_ready
+        self.backend_name = backend_name
+
+
+def serve(host: str = EMBEDDING_SERVER_HOST, port: int = EMBEDDING_SERVER_PORT) -> None:
+    """Loads the model once and serves embedding requests until interrupted."""
+    model = embedding_model.get_embedding_model()
+    if model is None:
+        print("Embedding model could not be loaded; /embed will answer 503")
+    batcher = EmbeddingBatcher(embedding_model._encode_many_local)
+    server = EmbeddingServer(host, port, batcher,
+                             model_ready=lambda: embedding_model.get_embedding_model() is not None,
+                             backend_name=type(model).__name__ if model is not None else EMBEDDING_BACKEND)
+    print(f"Embedding server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# -----------------------------
+# Server entry point and load test
+# -----------------------------
+# Run from the repository root:
+#   python -m backend.embedding_server [port]
+#   python -m backend.embedding_server bench <url> [clients] [requests per client]
+
+def run_benchmark(url: str, clients: int = 8, requests_per_client: int = 50) -> None:
+    import requests
+
+    texts = embedding_model._benchmark_sentences(requests_per_client)
+    latencies, lock = [], threading.Lock()
+
+    def client():
+        session = requests.Session()
+        for text in texts:
+            started = time.perf_counter()
+            session.post(url.rstrip("/") + "/embed", json={"texts": [text]}, timeout=60).raise_for_status()
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+    latencies = np.sort(latencies)
+    print(f"{clients} clients x {requests_per_client} single-text requests: {len(latencies) / seconds:.1f} requests/s, "
+          f"median {np.median(latencies):.1f} ms, p99 {latencies[int(0.99 * (len(latencies) - 1))]:.1f} ms")
+    print(json.dumps(requests.get(url.rstrip("/") + "/stats", timeout=5).json(), indent=2))
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 2 and sys.argv[1] == "bench":
+        run_benchmark(sys.argv[2],
+                      int(sys.argv[3]) if len(sys.argv) > 3 else 8,
+                      int(sys.argv[4]) if len(sys.argv) > 4 else 50)
+    elif len(sys.argv) > 1 and sys.argv[1].isdigit():
+        serve(port=int(sys.argv[1]))
+    elif len(sys.argv) == 1:
+        serve()
+    else:
+        print("usage: python -m backend.embedding_server [port]")
+        print("       python -m backend.embedding_server bench <url> [clients] [requests per client]")
@@ -5,6 +5,10 @@ import secrets
 import re
 from typing import Optional, Tuple
 
+from backend import openrouter_client
+from backend.agents.basic_agents import count_tokens
+from backend.config.agent_config import CONTEXT_TOKEN_BUDGET, CONTEXT_RECENT_MESSAGES
+
 # File paths
 LLM_CONFIG_FILE_PATH = os.path.join(os.getcwd(), "static/json/llm_config.json")
 GAME_CONFIG_FILE_PATH = os.path.join(os.getcwd(), "static/json/game_config.json")
@@ -101,12 +105,6 @@ def generate_character_backgrounds(game_config_data: dict) -> dict:
         content = " ".join(pieces).strip()
         return {"role": "system", "content": content if content else "No character data available."}
 
-    # Build messages for OpenRouter
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-
     # The user message will contain a compact JSON representation of the characters
     user_message = "CHARACTERS_JSON:\n" + json.dumps(payload_data, ensure_ascii=False, indent=2)
 
@@ -120,12 +118,7 @@ def generate_character_backgrounds(game_config_data: dict) -> dict:
     }
 
     try:
-        resp = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
+        resp = openrouter_client.post_chat_completion(api_key, payload, timeout=30)
         resp.raise_for_status()
         result = resp.json()
         generated = result["choices"][0]["message"]["content"].strip()
@@ -286,7 +279,6 @@ def generate_arrival_scenario(game_config_data: dict, resolved_year: Optional[in
         main_model = None
 
     if api_key and main_model:
-        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
         user_message = "ARRIVAL_CONTEXT_JSON:\n" + json.dumps(context, ensure_ascii=False, indent=2)
         payload = {
             "model": main_model,
@@ -297,8 +289,7 @@ def generate_arrival_scenario(game_config_data: dict, resolved_year: Optional[in
             "max_tokens": 600
         }
         try:
-            r = requests.post("https://openrouter.ai/api/v1/chat/completions",
-                              headers=headers, json=payload, timeout=45)
+            r = openrouter_client.post_chat_completion(api_key, payload, timeout=45)
             r.raise_for_status()
             generated = r.json()["choices"][0]["message"]["content"].strip()
             return {"role": "system", "content": generated}
@@ -367,30 +358,15 @@ def build_world_state_summary_from_messages(messages: list[dict]) -> str | None:
         return None
 
 # -----------------------------
-# LLM query function (integrated)
+# Helper: narrative prompt assembly
 # -----------------------------
-def query_llm(messages: list[dict]) -> str | None:
+def build_query_messages(messages: list[dict], rolling_summary: tuple[int, str | None] | None = None, memories: list[dict] | None = None, model_name: str = "gpt-4") -> list[dict]:
     """
-    Queries the OpenRouter LLM with the given conversation history using the main model.
-
-    Behavior changes:
-    - For the initial conversation (convo_len <= 2) the original three system messages
-      (posthuman premise, character backgrounds, arrival scenario) are still generated.
-    - For ongoing conversations (convo_len > 2), do NOT re-read or pass raw game_config.json.
-      Instead prepend a concise STORYLINE_CONTINUITY_SYS system prompt to guide the narrative LLM.
-    - This reduces excessive repetition of raw config fields and steers the model to use
-      the conversation history as the primary source of truth.
+    Builds the OpenRouter message list for the narrative model: the system prepends
+    (intro sequence or continuity prompt + scene date) followed by the conversation,
+    fitted to CONTEXT_TOKEN_BUDGET by fit_context_budget.
+    Shared by query_llm and stream_query_llm so both send exactly the same prompt.
     """
-    config = load_llm_config()
-    if not config:
-        return "Error: LLM configuration not loaded."
-
-    api_key = config.get("api_key")
-    main_model = config.get("main_model")
-
-    if not api_key or not main_model:
-        return "Error: API key or main model not found in LLM config."
-
     # Determine message count (count user+assistant messages)
     convo_len = len(messages) if isinstance(messages, list) else 0
     system_prepends = []
@@ -451,21 +427,98 @@ def query_llm(messages: list[dict]) -> str | None:
         print(f"Error building system messages for query_llm: {e}")
         system_prepends = [generate_posthuman_premise()]
 
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-
     # Format messages: prepend system messages, then the provided conversation
-    formatted_messages = []
+    formatted_system = []
     for s in system_prepends:
         if isinstance(s, dict) and s.get("content"):
-            formatted_messages.append({"role": "system", "content": s["content"]})
-    # Append original messages ensuring valid shape
+            formatted_system.append({"role": "system", "content": s["content"]})
+    # Original messages ensuring valid shape
+    formatted_conversation = []
     for msg in messages:
         role = msg.get("role", "user") if isinstance(msg, dict) else "user"
         content = msg.get("content", "") if isinstance(msg, dict) else str(msg)
-        formatted_messages.append({"role": role, "content": content})
+        formatted_conversation.append({"role": role, "content": content})
+
+    return fit_context_budget(formatted_system, formatted_conversation, rolling_summary, memories, model_name)
+
+def fit_context_budget(system_messages: list[dict], conversation: list[dict], rolling_summary: tuple[int, str | None] | None = None, memories: list[dict] | None = None, model_name: str = "gpt-4") -> list[dict]:
+    """
+    Assembles system messages + conversation within CONTEXT_TOKEN_BUDGET tokens.
+
+    - The system messages and the last CONTEXT_RECENT_MESSAGES messages are always kept verbatim.
+    - rolling_summary is (covered_count, summary) from RollingSummaryStore: when present, the
+      first covered_count messages are replaced by one "story so far" system message.
+    - If the prompt is still over budget (e.g. the summary lags behind), the oldest messages
+      outside the verbatim window are dropped.
+    - memories are recalled passages from MessageMemory.recall; those that are not sent
+      verbatim anyway are added as one "relevant earlier passages" system message.
+    """
+    covered_count, summary = rolling_summary or (0, None)
+    recent_start = max(len(conversation) - CONTEXT_RECENT_MESSAGES, 0)
+    # A summary may only stand in for messages older than the verbatim window
+    covered_count = min(covered_count, recent_start) if summary else 0
+
+    head = list(system_messages)
+    if covered_count:
+        head.append({"role": "system", "content": f"STORY SO FAR (summary of the first {covered_count} messages of this conversation):\n{summary}"})
+    tail = conversation[covered_count:]
+
+    def message_tokens(message: dict) -> int:
+        # ~4 tokens of per-message framing on top of the content
+        return count_tokens(message["content"], model_name) + 4
+
+    def memory_block(passages: list[dict]) -> dict | None:
+        if not passages:
+            return None
+        lines = [f"[message {p['position'] + 1}] {p['role']}: {p['content']}" for p in passages]
+        return {"role": "system", "content": "RELEVANT EARLIER PASSAGES (recalled from older parts of this conversation, for continuity only):\n" + "\n".join(lines)}
+
+    # Reserve room for every recalled passage; the ones still sent verbatim are filtered out below
+    all_memories = memory_block(memories or [])
+    budget = CONTEXT_TOKEN_BUDGET - sum(message_tokens(m) for m in head) - (message_tokens(all_memories) if all_memories else 0)
+    tail_tokens = [message_tokens(m) for m in tail]
+    total = sum(tail_tokens)
+    dropped = 0
+    while total > budget and len(tail) - dropped > CONTEXT_RECENT_MESSAGES:
+        total -= tail_tokens[dropped]
+        dropped += 1
+    if dropped:
+        print(f"Context over budget: dropped {dropped} older message(s) not yet covered by the rolling summary.")
+
+    recalled = memory_block([p for p in (memories or []) if p["position"] < covered_count + dropped])
+    if recalled:
+        head.append(recalled)
+
+    return head + tail[dropped:]
+
+# -----------------------------
+# LLM query function (integrated)
+# -----------------------------
+def query_llm(messages: list[dict], rolling_summary: tuple[int, str | None] | None = None, memories: list[dict] | None = None) -> str | None:
+    """
+    Queries the OpenRouter LLM with the given conversation history using the main model.
+    rolling_summary (see RollingSummaryStore.get) lets older turns be sent as a summary;
+    memories (see MessageMemory.recall) are relevant older passages to recall alongside it.
+
+    Behavior changes:
+    - For the initial conversation (convo_len <= 2) the original three system messages
+      (posthuman premise, character backgrounds, arrival scenario) are still generated.
+    - For ongoing conversations (convo_len > 2), do NOT re-read or pass raw game_config.json.
+      Instead prepend a concise STORYLINE_CONTINUITY_SYS system prompt to guide the narrative LLM.
+    - This reduces excessive repetition of raw config fields and steers the model to use
+      the conversation history as the primary source of truth.
+    """
+    config = load_llm_config()
+    if not config:
+        return "Error: LLM configuration not loaded."
+
+    api_key = config.get("api_key")
+    main_model = config.get("main_model")
+
+    if not api_key or not main_model:
+        return "Error: API key or main model not found in LLM config."
+
+    formatted_messages = build_query_messages(messages, rolling_summary, memories, main_model)
 
     payload = {
         "model": main_model,
@@ -474,12 +527,7 @@ def query_llm(messages: list[dict]) -> str | None:
     }
 
     try:
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
+        response = openrouter_client.post_chat_completion(api_key, payload, timeout=60)
         response.raise_for_status() # Raise an exception for HTTP errors
 
         result = response.json()
@@ -492,5 +540,43 @@ def query_llm(messages: list[dict]) -> str | None:
         return f"An unexpected error occurred: {e}"
 
 
+class LLMStreamError(Exception):
+    """Raised by stream_query_llm when the narrative could not be generated (in full)."""
+
+
+def stream_query_llm(messages: list[dict], rolling_summary: tuple[int, str | None] | None = None, memories: list[dict] | None = None):
+    """
+    Streaming variant of query_llm: yields narrative tokens as OpenRouter produces them
+    (stream: true), so the caller can relay them to the browser before generation finishes.
+
+    Unlike query_llm, problems are not turned into narrative text: the stream raises
+    LLMStreamError, possibly after some tokens, so the caller can tell a failed or cut-off
+    reply from a complete one and not persist it.
+    """
+    config = load_llm_config()
+    if not config:
+        raise LLMStreamError("LLM configuration not loaded.")
+
+    api_key = config.get("api_key")
+    main_model = config.get("main_model")
+
+    if not api_key or not main_model:
+        raise LLMStreamError("API key or main model not found in LLM config.")
+
+    payload = {
+        "model": main_model,
+        "messages": build_query_messages(messages, rolling_summary, memories, main_model),
+        "max_tokens": 800
+    }
+
+    try:
+        for token in openrouter_client.stream_chat_completion(api_key, payload, timeout=60):
+            yield token
+    except requests.exceptions.RequestException as e:
+        raise LLMStreamError(f"Error querying LLM: {e}") from e
+    except Exception as e:
+        raise LLMStreamError(f"An unexpected error occurred: {e}") from e
+
+
 if __name__ == "__main__":
     print("This module provides LangGraph helper functions and a stateful query wrapper.")
@@ -0,0 +1,146 @@
+import json
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backend.config.agent_config import (OPENROUTER_BASE_URL,
+                                         OPENROUTER_POOL_CONNECTIONS,
+                                         OPENROUTER_POOL_MAXSIZE,
+                                         OPENROUTER_CONNECT_TIMEOUT,
+                                         OPENROUTER_DEFAULT_READ_TIMEOUT,
+                                         RESPONSE_CACHE_MAX_ENTRIES,
+                                         RESPONSE_CACHE_TTL_SECONDS,
+                                         RESPONSE_CACHE_DISK_PATH)
+from backend.response_cache import ResponseCache, cache_key
+
+CHAT_COMPLETIONS_URL = f"{OPENROUTER_BASE_URL}/chat/completions"
+
+_session = None
+_session_lock = threading.Lock()
+
+# Shared cache for deterministic small-model calls (see cached_chat_completion)
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_DISK_PATH)
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the process-wide requests.Session used for every OpenRouter call.
+
+    The session keeps TCP+TLS connections to openrouter.ai alive between calls, so a chat
+    turn that triggers several agent requests only pays the handshake once per pooled connection.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=OPENROUTER_POOL_CONNECTIONS,
+                                      pool_maxsize=OPENROUTER_POOL_MAXSIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _timeout(read_timeout: float | None) -> tuple[float, float]:
+    """Builds a (connect, read) timeout tuple from the shared connect timeout."""
+    return (OPENROUTER_CONNECT_TIMEOUT, read_timeout or OPENROUTER_DEFAULT_READ_TIMEOUT)
+
+
+def _headers(api_key: str) -> dict:
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+
+def post_chat_completion(api_key: str, payload: dict, timeout: float | None = None) -> requests.Response:
+    """
+    POSTs a chat completion payload to OpenRouter over the pooled session.
+
+    Returns the raw response; callers keep their own raise_for_status()/parsing logic.
+    Raises requests.exceptions.RequestException on transport errors, exactly like requests.post.
+    """
+    return get_session().post(
+        CHAT_COMPLETIONS_URL,
+        headers=_headers(api_key),
+        json=payload,
+        timeout=_timeout(timeout)
+    )
+
+
+def cached_chat_completion(api_key: str, payload: dict, timeout: float | None = None, *, cacheable) -> dict:
+    """
+    Returns the parsed JSON of a chat completion, answering byte-identical requests
+    (same API key, model, messages and sampling params) from response_cache.
+
+    Meant for deterministic classifier/validator calls with fixed prompts, not for
+    generators whose callers expect a fresh answer each time: only payloads with
+    temperature 0 use the cache, other payloads always go to OpenRouter. cacheable(result)
+    must accept a reply before it is cached, so callers pass a predicate that parses the
+    reply the same way they do. Raises like post_chat_completion + raise_for_status on a
+    miss that fails.
+    """
+    use_cache = payload.get("temperature") == 0
+    key = cache_key(payload, api_key)
+    result = response_cache.get(key) if use_cache else None
+    if result is not None:
+        return result
+
+    response = post_chat_completion(api_key, payload, timeout)
+    response.raise_for_status()
+    result = response.json()
+    if use_cache and result.get("choices") and cacheable(result):
+        response_cache.put(key, result)
+    return result
+
+
+def stream_chat_completion(api_key: str, payload: dict, timeout: float | None = None):
+    """
+    Streams a chat completion from OpenRouter (stream: true, server-sent events).
+
+    Yields each non-empty content delta as it arrives. The read timeout applies between
+    chunks, not to the whole generation. Raises requests.exceptions.RequestException on
+    transport/HTTP errors, like post_chat_completion.
+    """
+    payload = dict(payload, stream=True)
+    with get_session().post(
+        CHAT_COMPLETIONS_URL,
+        headers=_headers(api_key),
+        json=payload,
+        timeout=_timeout(timeout),
+        stream=True
+    ) as response:
+        response.raise_for_status()
+        response.encoding = response.encoding or "utf-8"
+        for line in response.iter_lines(decode_unicode=True):
+            # SSE comments (": OPENROUTER PROCESSING") and keep-alive blank lines carry no data
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            try:
+                chunk = json.loads(data)
+            except json.JSONDecodeError:
+                continue
+            if "error" in chunk:
+                raise requests.exceptions.HTTPError(f"OpenRouter stream error: {chunk['error']}")
+            choices = chunk.get("choices") or []
+            if not choices:
+                continue
+            token = (choices[0].get("delta") or {}).get("content")
+            if token:
+                yield token
+
+
+def get(path: str, api_key: str, timeout: float | None = None) -> requests.Response:
+    """
+    GETs an OpenRouter API path (e.g. "/credits", "/key", "/models") over the pooled session.
+    """
+    return get_session().get(
+        f"{OPENROUTER_BASE_URL}{path}",
+        headers={"Authorization": f"Bearer {api_key}"},
+        timeout=_timeout(timeout)
+    )
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def cache_key(payload: dict, api_key: str | None = None) -> str:
+    """
+    Hashes a chat completion payload: model, messages (system prompt + user payload) and
+    every sampling parameter, so only byte-identical requests share an entry. The API key
+    is hashed in too (the key itself is never stored), so accounts don't share entries.
+    """
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    account = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{account}:{canonical}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache with per-entry TTL for parsed OpenRouter responses, with hit/miss
+    counters and an optional SQLite tier on disk that survives restarts.
+    Thread-safe: Flask request threads and background workers share one instance.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, disk_path: str | None = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            with self._disk() as db:
+                db.execute("CREATE TABLE IF NOT EXISTS response_cache ("
+                           "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)")
+                db.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+
+    def _disk(self):
+        return sqlite3.connect(self.disk_path, timeout=5)
+
+    def get(self, key: str):
+        """Returns the cached value, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        if self.disk_path:
+            try:
+                with self._disk() as db:
+                    row = db.execute("SELECT expires_at, value FROM response_cache WHERE key = ? AND expires_at > ?",
+                                     (key, now)).fetchone()
+                if row:
+                    value = json.loads(row[1])
+                    with self._lock:
+                        self._remember(key, row[0], value)
+                        self.disk_hits += 1
+                    return value
+            except (sqlite3.Error, ValueError) as e:
+                print(f"Error reading response cache from disk: {e}")
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, expires_at, value)
+        if self.disk_path:
+            try:
+                with self._disk() as db:
+                    db.execute("INSERT OR REPLACE INTO response_cache (key, expires_at, value) VALUES (?, ?, ?)",
+                               (key, expires_at, json.dumps(value)))
+            except sqlite3.Error as e:
+                print(f"Error writing response cache to disk: {e}")
+
+    def _remember(self, key: str, expires_at: float, value) -> None:
+        # Caller holds self._lock
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "disk_tier": bool(self.disk_path)
+            }
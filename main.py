@@ -5,20 +5,30 @@ from flask import (Flask,
                    url_for, 
                    session, 
                    jsonify)
-from flask_socketio import SocketIO, send
+from flask_socketio import SocketIO, send, join_room
 from datetime import date as dt_date
 import psycopg2
 from psycopg2.extras import RealDictCursor 
-import requests
 import os
 import pycountry
 import json
 from pathlib import Path  # Import Path from pathlib 
+from functools import partial
 
 from prompts import *
-from backend.agents.basic_agents import display_openrouter_balance, get_safety_level, get_perceived_time_of_day, get_environment_accuracy_modifier, get_location_terrain_category, get_temperature, count_tokens, get_total_input_tokens, get_total_output_tokens, get_tesa_indicator # Import token counters and TESA
-from backend.langgraph import query_llm, generate_posthuman_premise, generate_character_backgrounds, resolve_selected_year, generate_arrival_scenario # Import langgraph helpers
+from backend.agents.basic_agents import display_openrouter_balance, get_safety_level, get_perceived_time_of_day, get_environment_accuracy_modifier, get_location_terrain_category, get_temperature, count_tokens, get_total_input_tokens, get_total_output_tokens, get_tesa_indicator, session_headers, get_conversation_manager, get_world_state_indicators, refresh_indicators, annotate_scene, summarize_turns, WORLD_STATE_FIELDS # Import token counters, TESA and indicator refresh
+from backend.langgraph import query_llm, stream_query_llm, LLMStreamError, generate_posthuman_premise, generate_character_backgrounds, resolve_selected_year, generate_arrival_scenario # Import langgraph helpers
 from backend.database.db_manager import ConversationManager # Import ConversationManager
+from backend.database.indicator_snapshots import IndicatorSnapshotStore, latest_message_id # Persisted indicator snapshots
+from backend.database.scene_annotations import SceneAnnotationPipeline # Write-time scene annotations
+from backend.database.conversation_summaries import RollingSummaryStore # Rolling summaries for the narrative context
+from backend.database.message_memory import MessageMemory # Retrieval of relevant older passages
+from backend.database.pg_pool import pool_stats # Shared PostgreSQL connection pool
+from backend.database.conversation_snapshot import ConversationSnapshot # One history load per chat turn
+from backend.database.conversation_pages import ConversationPages, page_from_history # Paged history reads
+from backend.database.write_behind import WriteBehindQueue # Optional write-behind message persistence
+from backend import openrouter_client # Pooled OpenRouter HTTP client
+from backend.config.db_config import PG, WRITE_BEHIND_ENABLED # PostgreSQL connection settings, write-behind switch
 import uuid # Import uuid for session IDs
 
 app = Flask(
@@ -33,9 +43,6 @@ GAME_CONFIG_FILE = Path(os.path.join(os.getcwd(), "static/json/game_config.json"
 
 SAVES_DIR = os.path.join(os.getcwd(), "saves")
 
-PG = dict(dbname="roleplay_db", user="rp_user", password="rp_pass",
-          host="localhost", port=5432)
-
 # ---------------------------------------------------
 #  Validate an OpenRouter API key once and cache later
 # ---------------------------------------------------
@@ -50,20 +57,12 @@ def api_test_key():
         return jsonify({"valid": False}), 400
     try:
         	# quick validity probe
-            meta = requests.get(
-                "https://openrouter.ai/api/v1/key",
-                headers={"Authorization": f"Bearer {api_key}"},
-                timeout=8,
-            )
+            meta = openrouter_client.get("/key", api_key, timeout=8)
             if meta.status_code != 200:
                 return jsonify({"valid": False})
 
             # fetch balance
-            bal = requests.get(
-                "https://openrouter.ai/api/v1/credits",
-                headers={"Authorization": f"Bearer {api_key}"},
-                timeout=8,
-            )
+            bal = openrouter_client.get("/credits", api_key, timeout=8)
             credits = None
             if bal.status_code == 200:
                 d = bal.json().get("data", {})
@@ -86,17 +85,43 @@ def api_test_model():
         return jsonify({"valid": False}), 400
 
     try:
-        resp = requests.get(
-            "https://openrouter.ai/api/v1/models",
-            headers={"Authorization": f"Bearer {api_key}"},
-            timeout=10,
-        )
+        resp = openrouter_client.get("/models", api_key, timeout=10)
         resp.raise_for_status()
         models = {m["id"] for m in resp.json().get("data", [])}
         return jsonify({"valid": model in models})
     except Exception:
         return jsonify({"valid": False})
     
+def is_validator_verdict(result: dict) -> bool:
+    """Only cache validator answers that are a usable 'accept' / 'reject' verdict."""
+    try:
+        answer = result["choices"][0]["message"]["content"].strip().lower()
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return False
+    return answer.replace("\n", "").replace(" ", "") in ("accept", "reject")
+
+@app.get("/api/get_response_cache_stats")
+def api_get_response_cache_stats():
+    """
+    Returns hit/miss counters and size of the small-model response cache.
+    """
+    return jsonify(openrouter_client.response_cache.stats())
+
+@app.get("/api/get_db_pool_stats")
+def api_get_db_pool_stats():
+    """
+    Returns size, usage and acquisition-wait metrics of the PostgreSQL connection pool.
+    """
+    return jsonify(pool_stats())
+
+@app.get("/api/get_write_behind_stats")
+def api_get_write_behind_stats():
+    """
+    Returns the write-behind queue depth and flush counters (running is false when
+    WRITE_BEHIND_ENABLED is off and messages are saved synchronously).
+    """
+    return jsonify(write_behind.stats())
+
 @app.post("/api/validate_name")
 def api_validate_name():
     """
@@ -120,28 +145,21 @@ def api_validate_name():
     user_prompt = NAME_VALIDATOR_USER.format(name=name)
 
     # ---- call OpenRouter ----
-    import requests, time
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+    import time
     payload = {
         "model": helper_model,
         "messages": [
             {"role": "system", "content": sys_prompt},
             {"role": "user",   "content": user_prompt}
         ],
-        "max_tokens": 1
+        "max_tokens": 1,
+        "temperature": 0.0
     }
 
     for _ in range(3):                 # retry up to 3×
         try:
-            r = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers, json=payload, timeout=20
-            )
-            r.raise_for_status()
-            answer = r.json()["choices"][0]["message"]["content"].strip().lower()
+            result = openrouter_client.cached_chat_completion(api_key, payload, timeout=20, cacheable=is_validator_verdict)
+            answer = result["choices"][0]["message"]["content"].strip().lower()
             answer = answer.replace("\n", "").replace(" ", "")
             if answer in ("accept", "reject"):
                 return jsonify({"valid": answer == "accept"})
@@ -169,25 +187,21 @@ def api_validate_profession():
     sys_prompt  = PROF_VALIDATOR_SYS
     user_prompt = PROF_VALIDATOR_USER.format(profession=prof)
 
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
     payload = {
         "model": helper_model,
         "messages": [
             {"role": "system", "content": sys_prompt},
             {"role": "user",   "content": user_prompt}
         ],
-        "max_tokens": 1
+        "max_tokens": 1,
+        "temperature": 0.0
     }
 
     import time
     for _ in range(3):
         try:
-            r = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers, json=payload, timeout=20
-            )
-            r.raise_for_status()
-            ans = r.json()["choices"][0]["message"]["content"].strip().lower()
+            result = openrouter_client.cached_chat_completion(api_key, payload, timeout=20, cacheable=is_validator_verdict)
+            ans = result["choices"][0]["message"]["content"].strip().lower()
             ans = ans.replace("\n", "").replace(" ", "")
             if ans in ("accept", "reject"):
                 return jsonify({"valid": ans == "accept"})
@@ -207,25 +221,21 @@ def api_validate_items():
     if not api_key or not helper:
         return jsonify({"valid": False}), 500
 
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
     payload = {
         "model": helper,
         "messages": [
             {"role": "system", "content": ITEMS_VALIDATOR_SYS},
             {"role": "user",   "content": ITEMS_VALIDATOR_USER.format(items=txt)}
         ],
-        "max_tokens": 1
+        "max_tokens": 1,
+        "temperature": 0.0
     }
 
-    import time, requests
+    import time
     for _ in range(3):
         try:
-            r = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers, json=payload, timeout=20
-            )
-            r.raise_for_status()
-            ans = r.json()["choices"][0]["message"]["content"].strip().lower()
+            result = openrouter_client.cached_chat_completion(api_key, payload, timeout=20, cacheable=is_validator_verdict)
+            ans = result["choices"][0]["message"]["content"].strip().lower()
             ans = ans.replace(" ", "").replace("\n", "")
             if ans in ("accept", "reject"):
                 return jsonify({"valid": ans == "accept"})
@@ -245,25 +255,21 @@ def api_validate_description():
     if not api_key or not helper:
         return jsonify({"valid": False}), 500
 
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
     payload = {
         "model": helper,
         "messages": [
             {"role": "system", "content": DESCRIPTION_VALIDATOR_SYS},
             {"role": "user",   "content": DESCRIPTION_VALIDATOR_USER.format(description=txt)}
         ],
-        "max_tokens": 1
+        "max_tokens": 1,
+        "temperature": 0.0
     }
 
-    import requests, time
+    import time
     for _ in range(3):
         try:
-            r = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers, json=payload, timeout=20
-            )
-            r.raise_for_status()
-            ans = r.json()["choices"][0]["message"]["content"].strip().lower()
+            result = openrouter_client.cached_chat_completion(api_key, payload, timeout=20, cacheable=is_validator_verdict)
+            ans = result["choices"][0]["message"]["content"].strip().lower()
             ans = ans.replace(" ", "").replace("\n", "")
             if ans in ("accept", "reject"):
                 return jsonify({"valid": ans == "accept"})
@@ -390,106 +396,141 @@ def gameplay():
     # The conversation history will be loaded dynamically via a separate API call.
     return render_template('gameplay.html', session_id=current_session_id)
 
-@app.route('/api/get_conversation_history', methods=['GET'])
-def get_conversation_history():
+def initialize_session_intro(session_id: str) -> None:
     """
-    Fetches the conversation history for the current session ID.
-    If the conversation is empty (no rows), and the DB/file exist, initialize
-    the session with the three-part introduction (posthuman premise, character backgrounds,
-    arrival scenario) and save those messages into the conversation DB so the frontend
-    will display them on first load.
+    Initializes an empty session with the three-part introduction (posthuman premise,
+    character backgrounds, arrival scenario) and saves those messages into the
+    conversation DB so the frontend will display them on first load.
     """
-    session_id = request.args.get('session_id')
-    if not session_id:
-        return jsonify({"error": "Session ID is required"}), 400
+    try:
+        # Section 1: posthuman premise (static)
+        premise_msg = generate_posthuman_premise()  # dict with role/content
+
+        # Load game_config for character backgrounds and arrival
+        game_cfg = {}
+        try:
+            if GAME_CONFIG_FILE.exists():
+                with open(GAME_CONFIG_FILE, 'r', encoding='utf-8') as f:
+                    game_cfg = json.load(f)
+        except Exception:
+            game_cfg = {}
 
-    # Load existing history
-    history = conversation_manager.load_conversation(session_id)
+        # Section 2: character backgrounds
+        backgrounds_msg = generate_character_backgrounds(game_cfg)
 
-    # If no messages exist for this session, generate and persist the intro sequence
-    if not history:
+        # Section 3: resolve year and arrival scenario
+        resolved_year = resolve_selected_year(game_cfg) if isinstance(game_cfg, dict) else None
+        # If the start year was requested as 'random', persist the resolved concrete year
+        # into game_config.json so subsequent DB inserts use a stable base year.
         try:
-            # Section 1: posthuman premise (static)
-            premise_msg = generate_posthuman_premise()  # dict with role/content
+            if isinstance(game_cfg, dict) and game_cfg.get("selected_start_year") == "random" and resolved_year is not None:
+                # Overwrite the selected_start_year with the resolved integer year
+                game_cfg["selected_start_year"] = int(resolved_year)
+                # Write back to the game config file so db_manager.save_message can read it
+                GAME_CONFIG_FILE.parent.mkdir(parents=True, exist_ok=True)
+                with open(GAME_CONFIG_FILE, 'w', encoding='utf-8') as f:
+                    json.dump(game_cfg, f, indent=2)
+        except Exception:
+            # If persistence fails, continue without blocking arrival generation
+            pass
 
-            # Load game_config for character backgrounds and arrival
-            game_cfg = {}
-            try:
-                if GAME_CONFIG_FILE.exists():
-                    with open(GAME_CONFIG_FILE, 'r', encoding='utf-8') as f:
-                        game_cfg = json.load(f)
-            except Exception:
-                game_cfg = {}
+        arrival_msg = generate_arrival_scenario(game_cfg, resolved_year)
 
-            # Section 2: character backgrounds
-            backgrounds_msg = generate_character_backgrounds(game_cfg)
+        # Persist the three messages to the conversation DB as assistant messages
+        saved = []
+        for i, sys_msg in enumerate((premise_msg, backgrounds_msg, arrival_msg)):
+            content = sys_msg.get("content") if isinstance(sys_msg, dict) else str(sys_msg)
+            # Save as 'assistant' role so the frontend will render them
+            conversation_manager.save_message(session_id, "assistant", content, output_tokens=0, objective_time=0)
+            saved.append({"role": "assistant", "content": content})
 
-            # Section 3: resolve year and arrival scenario
-            resolved_year = resolve_selected_year(game_cfg) if isinstance(game_cfg, dict) else None
-            # If the start year was requested as 'random', persist the resolved concrete year
-            # into game_config.json so subsequent DB inserts use a stable base year.
-            try:
-                if isinstance(game_cfg, dict) and game_cfg.get("selected_start_year") == "random" and resolved_year is not None:
-                    # Overwrite the selected_start_year with the resolved integer year
-                    game_cfg["selected_start_year"] = int(resolved_year)
-                    # Write back to the game config file so db_manager.save_message can read it
-                    GAME_CONFIG_FILE.parent.mkdir(parents=True, exist_ok=True)
-                    with open(GAME_CONFIG_FILE, 'w', encoding='utf-8') as f:
-                        json.dump(game_cfg, f, indent=2)
-            except Exception:
-                # If persistence fails, continue without blocking arrival generation
-                pass
+            # After the second message (character backgrounds), trigger indicator updates
+            if i == 1:  # After backgrounds_msg (index 1)
+                try:
+                    # The session held nothing before the intro, so the history up to this
+                    # point is exactly the messages just saved; no need to reload it
+                    game_state = session.get('game_state', {})
 
-            arrival_msg = generate_arrival_scenario(game_cfg, resolved_year)
+                    # Score all world-state indicators in one request (concurrently
+                    # with TESA), then store them in session for frontend access
+                    game_state.update(refresh_indicators(list(saved), session_id, partial(score_world_state_indicators, session_id)))
 
-            # Persist the three messages to the conversation DB as assistant messages
-            for i, sys_msg in enumerate((premise_msg, backgrounds_msg, arrival_msg)):
-                content = sys_msg.get("content") if isinstance(sys_msg, dict) else str(sys_msg)
-                # Save as 'assistant' role so the frontend will render them
-                conversation_manager.save_message(session_id, "assistant", content, output_tokens=0, objective_time=0)
+                    session['game_state'] = game_state
 
-                # After the second message (character backgrounds), trigger indicator updates
-                if i == 1:  # After backgrounds_msg (index 1)
-                    try:
-                        # Load current history up to this point
-                        current_history = conversation_manager.load_conversation(session_id)
-
-                        # Calculate and store indicator values in session
-                        game_state = session.get('game_state', {})
-
-                        # Get all indicator values
-                        safety_level = get_safety_level(current_history)
-                        perceived_time = get_perceived_time_of_day(current_history)
-                        environment_mod = get_environment_accuracy_modifier(current_history)
-                        location_category = get_location_terrain_category(current_history)
-                        temperature = get_temperature(current_history)
-
-                        # Store in session for frontend access
-                        game_state.update({
-                            'safety_level': safety_level,
-                            'perceived_time_of_day': perceived_time,
-                            'environment_accuracy_modifier': environment_mod,
-                            'location_terrain_category': location_category,
-                            'temperature': temperature
-                        })
-
-                        # Also calculate TESA if needed
-                        tesa_data = get_tesa_indicator(session_id)
-                        game_state['tesa'] = tesa_data
-
-                        session['game_state'] = game_state
-
-                    except Exception as e:
-                        app.logger.error(f"Error updating indicators after second message: {e}")
-
-            # Reload final history after inserting all intro messages
-            history = conversation_manager.load_conversation(session_id)
-        except Exception as e:
-            app.logger.error(f"Error initializing intro messages for session {session_id}: {e}")
-            # Fall back to returning empty history if insertion fails
+                except Exception as e:
+                    app.logger.error(f"Error updating indicators after second message: {e}")
+    except Exception as e:
+        app.logger.error(f"Error initializing intro messages for session {session_id}: {e}")
+
+def _optional_int_arg(name: str):
+    value = request.args.get(name)
+    return None if value in (None, "") else int(value)
+
+@app.route('/api/get_conversation_history', methods=['GET'])
+def get_conversation_history():
+    """
+    Fetches the conversation history for the current session ID.
+    If the conversation is empty (no rows), the session is first initialized with the
+    three-part introduction (see initialize_session_intro).
+
+    Without paging arguments the whole history is returned as a list. With any of
+      limit      page size (default HISTORY_PAGE_SIZE, capped at HISTORY_PAGE_MAX)
+      before_id  the page of messages just older than this id (scrolling back)
+      since_id   only the messages newer than this id (incremental refresh)
+    the response is one page: { messages, has_more, oldest_id, newest_id }, oldest first.
+    Without before_id/since_id the page is the newest one.
+    """
+    session_id = request.args.get('session_id')
+    if not session_id:
+        return jsonify({"error": "Session ID is required"}), 400
+
+    try:
+        limit, before_id, since_id = (_optional_int_arg(name) for name in ("limit", "before_id", "since_id"))
+    except ValueError:
+        return jsonify({"error": "limit, before_id and since_id must be integers"}), 400
+
+    if limit is None and before_id is None and since_id is None:
+        history = conversation_manager.load_conversation(session_id)
+        if not history:
+            initialize_session_intro(session_id)
             history = conversation_manager.load_conversation(session_id)
+        return jsonify(history)
+
+    # Paged reads go to the table directly, so write out the session's queued messages first
+    write_behind.flush(session_id)
 
-    return jsonify(history)
+    def read_page():
+        if since_id is not None:
+            page = conversation_pages.since(session_id, since_id, limit)
+        else:
+            page = conversation_pages.before(session_id, before_id, limit)
+        if page is None:
+            # Paged reads unavailable: cut the page from a full load instead
+            page = page_from_history(conversation_manager.load_conversation(session_id), before_id, since_id, limit)
+        return page
+
+    try:
+        page = read_page()
+        if not page["messages"] and before_id is None and since_id is None:
+            # An empty table read only means a new session if ConversationManager agrees
+            history = conversation_manager.load_conversation(session_id)
+            if not history:
+                initialize_session_intro(session_id)
+                page = read_page()
+            if not page["messages"]:
+                page = page_from_history(history or conversation_manager.load_conversation(session_id), limit=limit)
+    except ValueError as e:
+        return jsonify({"error": f"History paging unavailable: {e}"}), 409
+    return jsonify(page)
+
+def latest_scene_hint(session_id: str, label: str):
+    """
+    Returns the newest annotated hint for a scene label, or None when there is none yet
+    or the session still has assistant messages waiting to be annotated.
+    """
+    if not scene_annotations.is_current(session_id):
+        return None
+    return scene_annotations.latest_hints(session_id).get(label)
 
 @app.route('/api/get_safety_level', methods=['GET'])
 def api_get_safety_level():
@@ -502,7 +543,7 @@ def api_get_safety_level():
     
     conversation_history = conversation_manager.load_conversation(session_id)
     
-    safety_level = get_safety_level(conversation_history)
+    safety_level = indicator_snapshots.get_or_compute(session_id, 'safety_level', conversation_history, get_safety_level)
     return jsonify(safety_level=safety_level)
 
 @app.route('/api/get_perceived_time_of_day', methods=['GET'])
@@ -514,13 +555,18 @@ def api_get_perceived_time_of_day():
     if not session_id:
         return jsonify({"error": "Session ID is required"}), 400
     
+    # Answer from the write-time scene annotations when they are up to date
+    hint = latest_scene_hint(session_id, 'perceived_time_of_day')
+    if hint is not None:
+        return jsonify(perceived_time_of_day=hint)
+
     conversation_history = conversation_manager.load_conversation(session_id)
     
     # Ensure there's a conversation to analyze
     if not conversation_history:
         return jsonify(perceived_time_of_day=13) # Default to unknown
 
-    perceived_time_of_day = get_perceived_time_of_day(conversation_history)
+    perceived_time_of_day = indicator_snapshots.get_or_compute(session_id, 'perceived_time_of_day', conversation_history, get_perceived_time_of_day)
     return jsonify(perceived_time_of_day=perceived_time_of_day)
 
 @app.route('/api/get_environment_accuracy_modifier', methods=['GET'])
@@ -532,13 +578,18 @@ def api_get_environment_accuracy_modifier():
     if not session_id:
         return jsonify({"error": "Session ID is required"}), 400
     
+    # Answer from the write-time scene annotations when they are up to date
+    hint = latest_scene_hint(session_id, 'environment_accuracy_modifier')
+    if hint is not None:
+        return jsonify(environment_accuracy_modifier=hint)
+
     conversation_history = conversation_manager.load_conversation(session_id)
     
     # Ensure there's a conversation to analyze
     if not conversation_history:
         return jsonify(environment_accuracy_modifier=5) # Default to Indoors/Dark
 
-    environment_accuracy_modifier = get_environment_accuracy_modifier(conversation_history)
+    environment_accuracy_modifier = indicator_snapshots.get_or_compute(session_id, 'environment_accuracy_modifier', conversation_history, partial(get_environment_accuracy_modifier, session_id=session_id))
     return jsonify(environment_accuracy_modifier=environment_accuracy_modifier)
 
 @app.route('/api/get_location_terrain_category', methods=['GET'])
@@ -550,13 +601,18 @@ def api_get_location_terrain_category():
     if not session_id:
         return jsonify({"error": "Session ID is required"}), 400
     
+    # Answer from the write-time scene annotations when they are up to date
+    hint = latest_scene_hint(session_id, 'location_terrain_category')
+    if hint is not None:
+        return jsonify(location_terrain_category=hint)
+
     conversation_history = conversation_manager.load_conversation(session_id)
     
     # Ensure there's a conversation to analyze
     if not conversation_history:
         return jsonify(location_terrain_category=19) # Default to Unknown/Obscured
 
-    location_terrain_category = get_location_terrain_category(conversation_history)
+    location_terrain_category = indicator_snapshots.get_or_compute(session_id, 'location_terrain_category', conversation_history, partial(get_location_terrain_category, session_id=session_id))
     return jsonify(location_terrain_category=location_terrain_category)
 
 @app.route('/api/get_temperature', methods=['GET'])
@@ -568,11 +624,54 @@ def api_get_temperature():
     if not session_id:
         return jsonify({"error": "Session ID is required"}), 400
     
+    # Answer from the write-time scene annotations when they are up to date
+    hint = latest_scene_hint(session_id, 'temperature')
+    if hint is not None:
+        return jsonify(temperature=hint)
+
     conversation_history = conversation_manager.load_conversation(session_id)
     
-    temperature = get_temperature(conversation_history)
+    temperature = indicator_snapshots.get_or_compute(session_id, 'temperature', conversation_history, partial(get_temperature, session_id=session_id))
     return jsonify(temperature=temperature)
 
+@app.route('/api/get_world_state_indicators', methods=['GET'])
+def api_get_world_state_indicators():
+    """
+    Scores safety level, perceived time of day, environment accuracy modifier,
+    location/terrain category and temperature with a single classifier request.
+    """
+    session_id = request.args.get('session_id')
+    if not session_id:
+        return jsonify({"error": "Session ID is required"}), 400
+
+    conversation_history = conversation_manager.load_conversation(session_id)
+    return jsonify(score_world_state_indicators(session_id, conversation_history))
+
+def score_world_state_indicators(session_id: str, conversation_history: list[dict]) -> dict:
+    """
+    Returns the five world-state indicators for the session's current history version.
+    Concurrent callers for the same session and newest message (e.g. a second tab, or the
+    frontend's startup fetch while get_conversation_history is scoring) share one computation.
+    """
+    message_id = latest_message_id(conversation_history)
+    return indicator_snapshots.flights.do((session_id, 'world_state', message_id), _score_world_state_indicators,
+                                          session_id, message_id, conversation_history)
+
+def _score_world_state_indicators(session_id: str, message_id: int, conversation_history: list[dict]) -> dict:
+    # Reuse stored snapshots when none of the five indicators is older than the newest message
+    indicators = indicator_snapshots.get_many(session_id, message_id, WORLD_STATE_FIELDS)
+    if len(indicators) == len(WORLD_STATE_FIELDS):
+        return indicators
+
+    # When every scene label is known from the write-time annotations, only safety needs the LLM
+    hints = scene_annotations.latest_hints(session_id) if scene_annotations.is_current(session_id) else {}
+    if hints and all(value is not None for value in hints.values()):
+        return dict(hints, safety_level=indicator_snapshots.get_or_compute(session_id, 'safety_level', conversation_history, get_safety_level))
+
+    indicators = get_world_state_indicators(conversation_history, session_id)
+    indicator_snapshots.put_many(session_id, message_id, indicators)
+    return indicators
+
 @app.route('/api/get_total_input_tokens', methods=['GET'])
 def api_get_total_input_tokens():
     """
@@ -642,7 +741,6 @@ def api_generate_job_title():
     if not api_key or not helper:
         return jsonify({"title": ""}), 500
 
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
     payload = {
         "model": helper,
         "messages": [
@@ -653,11 +751,10 @@ def api_generate_job_title():
         "max_tokens": 16
     }
 
-    import requests, time
+    import time
     for _ in range(3):
         try:
-            r = requests.post("https://openrouter.ai/api/v1/chat/completions",
-                               headers=headers, json=payload, timeout=20)
+            r = openrouter_client.post_chat_completion(api_key, payload, timeout=20)
             r.raise_for_status()
             title = r.json()["choices"][0]["message"]["content"].strip()
             if 0 < len(title) <= 128:
@@ -676,8 +773,7 @@ def api_generate_items():
     if age is None or not api_key or not model:
         return jsonify({"items": ""}), 400
 
-    import requests, time
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+    import time
     sys_prompt  = ITEMS_GENERATOR_SYS_PROMPT.format(age=age, gender=gender, job=job, date=date)
     user_prompt = ITEMS_GENERATOR_USER_PROMPT
     payload = {
@@ -691,8 +787,7 @@ def api_generate_items():
 
     for _ in range(3):
         try:
-            r = requests.post("https://openrouter.ai/api/v1/chat/completions",
-                               headers=headers, json=payload, timeout=30)
+            r = openrouter_client.post_chat_completion(api_key, payload, timeout=30)
             r.raise_for_status()
             text = r.json()["choices"][0]["message"]["content"].strip()
             if 20 <= len(text) <= 2000:
@@ -714,7 +809,6 @@ def api_generate_description():
     if age is None or not api_key or not model:
         return jsonify({"desc": ""}), 400
 
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
     payload = {
         "model": model,
         "messages": [
@@ -726,11 +820,10 @@ def api_generate_description():
         "max_tokens": 160       # fits <2000 chars comfortably
     }
 
-    import requests, time
+    import time
     for _ in range(3):
         try:
-            r = requests.post("https://openrouter.ai/api/v1/chat/completions",
-                               headers=headers, json=payload, timeout=30)
+            r = openrouter_client.post_chat_completion(api_key, payload, timeout=30)
             r.raise_for_status()
             text = r.json()["choices"][0]["message"]["content"].strip()
             if 20 <= len(text) <= 2000:
@@ -753,7 +846,6 @@ def api_generate_name():
     if not api_key or not model:
         return jsonify({"name": ""}), 500
 
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
     payload = {
         "model": model,
         "messages": [
@@ -764,11 +856,10 @@ def api_generate_name():
         "max_tokens": 8
     }
 
-    import requests, time
+    import time
     for _ in range(3):
         try:
-            r = requests.post("https://openrouter.ai/api/v1/chat/completions",
-                               headers=headers, json=payload, timeout=20)
+            r = openrouter_client.post_chat_completion(api_key, payload, timeout=20)
             r.raise_for_status()
             name = r.json()["choices"][0]["message"]["content"].strip()
             if " " in name and 3 < len(name) < 128:
@@ -912,6 +1003,58 @@ def handle_message(message):
     print('received message: ' + message)
     send(message, broadcast=True)
 
+@socketio.on('join_session')
+def handle_join_session(data):
+    """
+    Joins the client to its game session's room so streamed narrative tokens
+    (see stream_narrative_to_session) only reach that session's tabs.
+    """
+    session_id = (data or {}).get('session_id')
+    if session_id:
+        join_room(session_id)
+
+def stream_narrative_to_session(session_id: str, conversation: ConversationSnapshot, main_model_name: str, objective_time: int):
+    """
+    Background task for streaming chat turns: relays query_llm tokens to the session's
+    Socket.IO room as they arrive ('narrative_token'), then persists the full response
+    and emits 'narrative_done' with the final text and refreshed TESA data.
+    conversation is the request's snapshot, handed over by api_chat_query.
+
+    'narrative_done' is always emitted, so the client can close the reply; when the turn
+    failed it carries an 'error' field, and a failed or cut-off reply is not saved.
+    """
+    llm_response, tesa_data, error = "", None, None
+    try:
+        conversation_history = conversation.history
+        chunks = []
+        memories = message_memory.recall(session_id, conversation_history)
+        try:
+            for token in stream_query_llm(conversation_history, rolling_summaries.get(session_id), memories):
+                chunks.append(token)
+                socketio.emit('narrative_token', {'token': token}, to=session_id)
+        except LLMStreamError as e:
+            error = str(e)
+            app.logger.error(f"Narrative stream failed for session {session_id}: {e}")
+
+        llm_response = "".join(chunks).strip()
+        if error is None:
+            try:
+                llm_output_tokens = count_tokens(llm_response, main_model_name)
+                conversation.save_message("assistant", llm_response, output_tokens=llm_output_tokens, objective_time=objective_time)
+            except Exception as e:
+                app.logger.error(f"Failed to save streamed response for session {session_id}: {e}")
+
+        # The Flask session cookie can't be written from a background task, so TESA travels with the event
+        tesa_data = get_tesa_indicator(session_id, conversation)
+    except Exception as e:
+        error = error or f"An unexpected error occurred: {e}"
+        app.logger.error(f"Streaming turn failed for session {session_id}: {e}")
+    finally:
+        done = {'response': llm_response, 'tesa': tesa_data}
+        if error is not None:
+            done['error'] = error
+        socketio.emit('narrative_done', done, to=session_id)
+
 @app.route('/update_label', methods=['POST'])
 def update_label():
     data = request.get_json()
@@ -925,10 +1068,13 @@ def api_chat_query():
     queries the LLM for a response, and returns that response. Saves conversation to DB.
     If validation fails, generate a short assistant warning (and save it) instead of querying
     the main storyline LLM.
+    With { stream: true } the narrative is streamed to the session's Socket.IO room instead
+    and the route returns { streaming: true } immediately.
     """
     data = request.get_json(silent=True) or {}
     user_message = data.get("message", "").strip()
     session_id = data.get("session_id")  # Get session_id from frontend
+    stream = bool(data.get("stream"))  # Relay narrative tokens over Socket.IO instead of waiting
 
     if not user_message:
         return jsonify({"response": "No message provided."}), 400
@@ -950,21 +1096,25 @@ def api_chat_query():
     # Calculate input tokens for the user message
     user_input_tokens = count_tokens(user_message, small_model_name)  # small_model for user input context
 
+    # One snapshot of the session for this turn: the validator, the narrative query and TESA
+    # all read it instead of each loading the history again
+    conversation = ConversationSnapshot(conversation_manager, session_id, session_headers)
+
     # Get the latest objective time and increment it by 60 seconds
-    latest_objective_time = conversation_manager.get_latest_objective_time(session_id)
+    latest_objective_time = conversation.latest_objective_time()
     new_objective_time = latest_objective_time + 60
 
     # Save user message with input token count and new objective time
-    conversation_manager.save_message(session_id, "user", user_message, input_tokens=user_input_tokens, objective_time=new_objective_time)
+    conversation.save_message("user", user_message, input_tokens=user_input_tokens, objective_time=new_objective_time)
 
     # Load entire conversation history for the session (includes the user message we just saved)
-    conversation_history = conversation_manager.load_conversation(session_id)
+    conversation_history = conversation.history
 
     # Validation step: run the validator only when the intro (three system messages) exists.
     # validate_player_response is liberal and defaults to allow on errors.
     try:
         from backend.agents.basic_agents import validate_player_response
-        is_valid = validate_player_response(session_id, user_message)
+        is_valid = validate_player_response(session_id, user_message, conversation)
     except Exception as e:
         # If something goes wrong importing/running validator, default to allow
         app.logger.debug(f"Validator error; allowing message by default: {e}")
@@ -989,7 +1139,6 @@ def api_chat_query():
 
             warning_text = ""
             if api_key and small_model_name:
-                headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
                 payload = {
                     "model": small_model_name,
                     "messages": [
@@ -999,11 +1148,10 @@ def api_chat_query():
                     "max_tokens": 80,
                     "temperature": 0.2
                 }
-                import requests, time
+                import time
                 for _ in range(2):
                     try:
-                        r = requests.post("https://openrouter.ai/api/v1/chat/completions",
-                                          headers=headers, json=payload, timeout=20)
+                        r = openrouter_client.post_chat_completion(api_key, payload, timeout=20)
                         r.raise_for_status()
                         warning_text = r.json()["choices"][0]["message"]["content"].strip()
                         if warning_text:
@@ -1018,13 +1166,13 @@ def api_chat_query():
             # Save the assistant warning to conversation DB
             try:
                 out_tokens = count_tokens(warning_text, small_model_name) if small_model_name else 0
-                conversation_manager.save_message(session_id, "assistant", warning_text, output_tokens=out_tokens, objective_time=new_objective_time)
+                conversation.save_message("assistant", warning_text, output_tokens=out_tokens, objective_time=new_objective_time)
             except Exception as e:
                 app.logger.error(f"Failed to save validation warning to DB: {e}")
 
             # Update TESA as usual
             try:
-                tesa_data = get_tesa_indicator(session_id)
+                tesa_data = get_tesa_indicator(session_id, conversation)
                 game_state = session.get('game_state', {})
                 game_state['tesa'] = tesa_data
                 session['game_state'] = game_state
@@ -1037,16 +1185,21 @@ def api_chat_query():
             return jsonify({"response": "Your message appears unrealistic for the setting."}), 200
 
     # If valid, proceed to query the main storyline LLM
-    llm_response = query_llm(conversation_history)
+    if stream:
+        # Tokens go to the session's Socket.IO room; the response is saved once the stream completes
+        socketio.start_background_task(stream_narrative_to_session, session_id, conversation, main_model_name, new_objective_time)
+        return jsonify({"streaming": True})
+
+    llm_response = query_llm(conversation_history, rolling_summaries.get(session_id), message_memory.recall(session_id, conversation_history))
 
     # Calculate output tokens for the LLM response
     llm_output_tokens = count_tokens(llm_response, main_model_name)  # main_model for LLM response
 
     # Save assistant response with output token count and the same new objective time
-    conversation_manager.save_message(session_id, "assistant", llm_response, output_tokens=llm_output_tokens, objective_time=new_objective_time)
+    conversation.save_message("assistant", llm_response, output_tokens=llm_output_tokens, objective_time=new_objective_time)
 
     # Calculate and store TESA data
-    tesa_data = get_tesa_indicator(session_id)
+    tesa_data = get_tesa_indicator(session_id, conversation)
     game_state = session.get('game_state', {})
     game_state['tesa'] = tesa_data
     session['game_state'] = game_state
@@ -1109,9 +1262,10 @@ def get_game_state():
 @app.get("/api/get_vectorization_status")
 def api_get_vectorization_status():
     """
-    Returns the current vectorization status for monitoring progress.
+    Returns the current vectorization status for monitoring progress: queue depth,
+    backpressure and batch throughput of the background vectorizer.
     """
-    status = conversation_manager.get_vectorization_status()
+    status = message_memory.vectorization_status()
     return jsonify(status)
 
 
@@ -1124,8 +1278,37 @@ def load_llm_config() -> dict | None:
 
 # Initialize ConversationManager globally
 conversation_manager = ConversationManager()
-# Start background vectorization for content
-conversation_manager.start_background_vectorization(interval_seconds=5)
+# Keyset-paginated history reads for /api/get_conversation_history
+conversation_pages = ConversationPages()
+# Per-session indicator results keyed by the newest message they were computed from
+indicator_snapshots = IndicatorSnapshotStore()
+# Classify each new assistant message once for scene hints (weather, terrain, temperature, time of day)
+scene_annotations = SceneAnnotationPipeline(annotate_scene)
+scene_annotations.attach_to(conversation_manager)
+# Fold turns that leave the verbatim context window into a per-session rolling summary
+rolling_summaries = RollingSummaryStore(summarize_turns, conversation_manager.load_conversation)
+rolling_summaries.attach_to(conversation_manager)
+# Embed saved messages (queued by save_message, batched) so query_llm can recall relevant older passages
+message_memory = MessageMemory(conversation_manager.load_conversation)
+message_memory.attach_to(conversation_manager)
+# Optional write-behind persistence: save_message only queues the message and a background
+# flusher writes queued messages through the manager's save_message. Attached last, so the
+# stores' hooks above run when a message is actually written; reads through the agents' own
+# manager and the session headers include queued messages too.
+write_behind = WriteBehindQueue()
+if WRITE_BEHIND_ENABLED:
+    write_behind.attach_to(conversation_manager)
+    write_behind.attach_reads(get_conversation_manager())
+    write_behind.attach_reads(session_headers)
+
+# Embedding pool processes (VECTORIZE_PROCESSES) re-import this module as __mp_main__;
+# only the real server process runs the background workers.
+if __name__ != "__mp_main__":
+    scene_annotations.start()
+    rolling_summaries.start()
+    message_memory.start()
+    if WRITE_BEHIND_ENABLED:
+        write_behind.start()
 
 if __name__ == "__main__":
     os.makedirs(SAVES_DIR, exist_ok=True)  # ensure saves folder exists
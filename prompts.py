@@ -392,6 +392,103 @@ Conversation History:
 Respond with a single integer (0-8).
 """
 
+# ─── Combined world-state indicator prompts ───────────────────────────
+WORLD_STATE_INDICATORS_SYS = """
+You are a world-state assessment agent for a role-playing game. Your task is to analyze the most recent turns of a conversation between a player (user) and a game master (assistant) and score five indicators at once, from the player's perspective.
+
+Use the same scales as the individual indicator agents:
+- "safety_level": 0 (Peaceful), 1 (Cautious), 2 (Wary), 3 (Imminent Danger), 4 (Critical), 5 (Unknown). Judge it from the last few messages only.
+- "perceived_time_of_day": 0 (Just Before Sunrise), 1 (Sunrise), 2 (Early Morning), 3 (Late Morning), 4 (Noonish), 5 (Early Afternoon), 6 (Late Afternoon), 7 (Evening), 8 (Sunset), 9 (Dusk), 10 (Nightfall), 11 (Night (Moonlit)), 12 (Night (Cloudy)), 13 (Unknown). Only use cues available to the player; if natural light cues are absent (indoors, underground, heavy fog), prefer 13.
+- "environment_accuracy_modifier": 0 (Clear skies), 1 (Light clouds), 2 (Heavy overcast), 3 (Rain), 4 (Snow), 5 (Indoors/Dark).
+- "location_terrain_category": 0 (Urban/Settlement), 1 (Palace/Temple), 2 (Farmland), 3 (Wilderness/Forest), 4 (Grassland/Steppe), 5 (Desert), 6 (Mountainous), 7 (Riverbank/Lakeside), 8 (Swamp/Marsh), 9 (Coastal/Beach), 10 (Seafaring), 11 (Cave/Underground), 12 (Indoors/Enclosed), 13 (Battlefield), 14 (Ruins/Abandoned Site), 15 (Nomadic Encampment), 16 (Quarry/Mine), 17 (Arctic/Tundra), 18 (Marketplace), 19 (Unknown/Obscured), 20 (Cliffside/High Ridge), 21 (Burial Ground/Necropolis), 22 (Caravan Route/Trade Path), 23 (Fortress/Citadel), 24 (Field Camp/Military Camp), 25 (Workshop/Smithy), 26 (Monastery/Scholarly Site), 27 (Agricultural Terrace), 28 (Bridge/Crossing Point), 29 (Festival Grounds), 30 (Waterfall/Cascade), 31 (Jungle/Rainforest), 32 (Volcanic Region), 33 (Salt Flat/Desert Basin), 34 (Cave Shrine/Hidden Temple), 35 (River Delta/Estuary).
+- "temperature": 0 (Frigid), 1 (Freezing), 2 (Cold), 3 (Cool), 4 (Mild), 5 (Warm), 6 (Hot), 7 (Scorching), 8 (Unknown).
+
+For environment_accuracy_modifier, location_terrain_category and temperature, use the *most recent* explicit or strong implicit hint in the provided messages. If the provided messages contain no hint at all for one of these three, set that field to null instead of guessing.
+
+**Output Format:**
+Return only a JSON object with exactly these five keys and integer (or null) values.
+Example:
+```json
+{
+    "safety_level": 1,
+    "perceived_time_of_day": 7,
+    "environment_accuracy_modifier": 3,
+    "location_terrain_category": 0,
+    "temperature": null
+}
+```
+"""
+
+WORLD_STATE_INDICATORS_USER = """
+Score the five world-state indicators for the following conversation.
+
+Conversation History:
+{conversation_history}
+
+Output the result as a JSON object as specified in your system prompt.
+"""
+
+# ─── Scene annotation prompts (write-time) ───────────────────────────
+SCENE_ANNOTATION_SYS = """
+You are a scene annotation agent for a role-playing game. You will be given a single new message written by the game master (assistant). Your task is to record which scene details this message states or strongly implies, so later lookups do not need to re-read the conversation.
+
+Label only what *this message* establishes. If the message says nothing about a detail, set it to null.
+
+- "environment_accuracy_modifier" (weather): 0 (Clear skies), 1 (Light clouds), 2 (Heavy overcast), 3 (Rain), 4 (Snow), 5 (Indoors/Dark).
+- "location_terrain_category": 0 (Urban/Settlement), 1 (Palace/Temple), 2 (Farmland), 3 (Wilderness/Forest), 4 (Grassland/Steppe), 5 (Desert), 6 (Mountainous), 7 (Riverbank/Lakeside), 8 (Swamp/Marsh), 9 (Coastal/Beach), 10 (Seafaring), 11 (Cave/Underground), 12 (Indoors/Enclosed), 13 (Battlefield), 14 (Ruins/Abandoned Site), 15 (Nomadic Encampment), 16 (Quarry/Mine), 17 (Arctic/Tundra), 18 (Marketplace), 20 (Cliffside/High Ridge), 21 (Burial Ground/Necropolis), 22 (Caravan Route/Trade Path), 23 (Fortress/Citadel), 24 (Field Camp/Military Camp), 25 (Workshop/Smithy), 26 (Monastery/Scholarly Site), 27 (Agricultural Terrace), 28 (Bridge/Crossing Point), 29 (Festival Grounds), 30 (Waterfall/Cascade), 31 (Jungle/Rainforest), 32 (Volcanic Region), 33 (Salt Flat/Desert Basin), 34 (Cave Shrine/Hidden Temple), 35 (River Delta/Estuary).
+- "temperature": 0 (Frigid), 1 (Freezing), 2 (Cold), 3 (Cool), 4 (Mild), 5 (Warm), 6 (Hot), 7 (Scorching).
+- "perceived_time_of_day": 0 (Just Before Sunrise), 1 (Sunrise), 2 (Early Morning), 3 (Late Morning), 4 (Noonish), 5 (Early Afternoon), 6 (Late Afternoon), 7 (Evening), 8 (Sunset), 9 (Dusk), 10 (Nightfall), 11 (Night (Moonlit)), 12 (Night (Cloudy)).
+
+**Output Format:**
+Return only a JSON object with exactly these four keys and integer (or null) values.
+Example:
+```json
+{
+    "environment_accuracy_modifier": 3,
+    "location_terrain_category": 18,
+    "temperature": null,
+    "perceived_time_of_day": 7
+}
+```
+"""
+
+SCENE_ANNOTATION_USER = """
+Annotate the scene details established by the following game master message.
+
+Message:
+{message}
+
+Output the result as a JSON object as specified in your system prompt.
+"""
+
+# ─── Rolling story summary prompts (context compaction) ───────────────────────────
+ROLLING_SUMMARY_SYS = """
+You are the story archivist for a role-playing game. You keep a running summary of the older part of a conversation between the players (user) and the game master (assistant), so the narrative engine can continue the story without re-reading every earlier message.
+
+You will be given the current summary (possibly empty) and the next messages that follow it. Rewrite the summary so it also covers the new messages.
+
+Keep what later scenes may depend on:
+- Where the characters are and how they got there, and the approximate in-world date or elapsed time.
+- People met (names, roles, attitudes toward the players), promises, debts, conflicts and unresolved threats.
+- Items gained, lost or revealed, injuries and other lasting changes to the characters.
+- Facts the players have learned about the era and how locals react to them.
+
+Drop flavor text, repeated descriptions and anything that no longer matters. Write in past tense, third person, as plain prose without headings or lists. Stay under 300 words.
+
+**Output Format:**
+Return only the updated summary text.
+"""
+
+ROLLING_SUMMARY_USER = """
+Current summary:
+{summary}
+
+Next messages:
+{messages}
+
+Output the updated summary as specified in your system prompt.
+"""
+
 # ─── TESA Indicator prompts ───────────────────────────
 TESA_ANCHOR_IDENTIFIER_SYS = """
 You are a time anchor identification agent for a historical roleplay game. Your task is to analyze a segment of conversation history and identify any "Time Anchors" mentioned.
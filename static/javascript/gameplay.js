@@ -610,7 +610,7 @@ class GameStateController {
     }
 
     // Chat Window Methods
-    _addMessageToChatWindow(message, type, timestamp = new Date()) {
+    _addMessageToChatWindow(message, type, timestamp = new Date(), prepend = false) {
         const messageElement = document.createElement("div");
         messageElement.classList.add("chat-message");
         messageElement.classList.add(`${type}-message`);
@@ -637,6 +637,15 @@ class GameStateController {
         messageElement.appendChild(messageContent);
         messageElement.appendChild(timestampElement);
         
+        if (prepend) {
+            // Older history page: insert above without moving what the player is reading
+            const chatWindow = this.elements.chatWindow;
+            const distanceFromBottom = chatWindow.scrollHeight - chatWindow.scrollTop;
+            chatWindow.insertBefore(messageElement, chatWindow.firstChild);
+            chatWindow.scrollTop = chatWindow.scrollHeight - distanceFromBottom;
+            return true;
+        }
+
         this.elements.chatWindow.appendChild(messageElement);
         // Scroll to the bottom of the chat window
         this.elements.chatWindow.scrollTop = this.elements.chatWindow.scrollHeight;
@@ -650,6 +659,51 @@ class GameStateController {
     addMessageAsResponse(message, timestamp = new Date()) {
         return this._addMessageToChatWindow(message, "response", timestamp);
     }
+
+    prependMessageAsUser(message, timestamp = new Date()) {
+        return this._addMessageToChatWindow(message, "user", timestamp, true);
+    }
+
+    prependMessageAsResponse(message, timestamp = new Date()) {
+        return this._addMessageToChatWindow(message, "response", timestamp, true);
+    }
+
+    // Streaming Response Methods
+    beginStreamingResponse(timestamp = new Date()) {
+        this._addMessageToChatWindow("", "response", timestamp);
+        this._streamingContent = this.elements.chatWindow.lastElementChild.querySelector(".message-content");
+        return true;
+    }
+
+    appendToStreamingResponse(token) {
+        if (!this._streamingContent) {
+            this.beginStreamingResponse();
+        }
+        this._streamingContent.textContent += token;
+        this.elements.chatWindow.scrollTop = this.elements.chatWindow.scrollHeight;
+        return true;
+    }
+
+    endStreamingResponse(finalText, openIfMissing = true) {
+        if (!this._streamingContent && finalText && openIfMissing) {
+            // The reply finished before any token reached this tab
+            this.beginStreamingResponse();
+        }
+        if (this._streamingContent && finalText !== undefined) {
+            this._streamingContent.textContent = finalText;
+        }
+        this._streamingContent = null;
+        return true;
+    }
+
+    // Removes the bubble of a reply that is still streaming (tokens may have been missed)
+    discardStreamingResponse() {
+        if (this._streamingContent) {
+            this._streamingContent.parentElement.remove();
+            this._streamingContent = null;
+        }
+        return true;
+    }
 }
 
 // Initialize the DOM State Controller and make it globally accessible
@@ -675,27 +729,121 @@ document.addEventListener('DOMContentLoaded', () => {
         return;
     }
 
-    // Function to fetch and load conversation history
+    // The history is fetched a page at a time: the newest page on load, older pages when
+    // the player scrolls to the top, and only messages newer than the newest one seen when
+    // the tab comes back or the websocket reconnects.
+    const HISTORY_PAGE_SIZE = 50;
+    let oldestMessageId = null;   // id of the oldest message shown (cursor for scrolling back)
+    let newestMessageId = null;   // id of the newest message seen (cursor for new messages)
+    let hasOlderMessages = false;
+    let loadingOlderMessages = false;
+
+    function historyUrl(params) {
+        const query = new URLSearchParams({ session_id: gameSessionId, limit: HISTORY_PAGE_SIZE, ...params });
+        return `/api/get_conversation_history?${query}`;
+    }
+
+    function showHistoryMessage(msg, prepend = false) {
+        const timestamp = new Date(msg.timestamp);
+        if (msg.role === 'user') {
+            prepend ? gameState.prependMessageAsUser(msg.content, timestamp) : gameState.addMessageAsUser(msg.content, timestamp);
+        } else if (msg.role === 'assistant') {
+            prepend ? gameState.prependMessageAsResponse(msg.content, timestamp) : gameState.addMessageAsResponse(msg.content, timestamp);
+        }
+    }
+
+    // Function to fetch and load conversation history (newest page)
     async function loadConversationHistory() {
         try {
-            const response = await fetch(`/api/get_conversation_history?session_id=${gameSessionId}`);
+            const response = await fetch(historyUrl({}));
             if (!response.ok) {
                 console.error("Failed to fetch conversation history:", response.statusText);
                 return;
             }
-            const history = await response.json();
-            history.forEach(msg => {
-                if (msg.role === 'user') {
-                    gameState.addMessageAsUser(msg.content, new Date(msg.timestamp));
-                } else if (msg.role === 'assistant') {
-                    gameState.addMessageAsResponse(msg.content, new Date(msg.timestamp));
-                }
-            });
+            const page = await response.json();
+            page.messages.forEach(msg => showHistoryMessage(msg));
+            oldestMessageId = page.oldest_id;
+            newestMessageId = page.newest_id;
+            hasOlderMessages = page.has_more;
         } catch (error) {
             console.error("Error loading conversation history:", error);
         }
     }
 
+    // Prepends the page of messages just older than the oldest one shown
+    async function loadOlderMessages() {
+        if (!hasOlderMessages || loadingOlderMessages || oldestMessageId === null) {
+            return;
+        }
+        loadingOlderMessages = true;
+        try {
+            const response = await fetch(historyUrl({ before_id: oldestMessageId }));
+            if (!response.ok) {
+                console.error("Failed to fetch older messages:", response.statusText);
+                return;
+            }
+            const page = await response.json();
+            page.messages.slice().reverse().forEach(msg => showHistoryMessage(msg, true));
+            if (page.oldest_id !== null) {
+                oldestMessageId = page.oldest_id;
+            }
+            hasOlderMessages = page.has_more;
+        } catch (error) {
+            console.error("Error loading older messages:", error);
+        } finally {
+            loadingOlderMessages = false;
+        }
+    }
+
+    // Fetches the messages saved after the newest one seen. With show = false the cursor
+    // just moves past them (messages this tab already displayed while sending).
+    async function syncNewMessages(show = true) {
+        if (newestMessageId === null) {
+            return;
+        }
+        try {
+            let hasMore = true;
+            while (hasMore) {
+                const response = await fetch(historyUrl({ since_id: newestMessageId }));
+                if (!response.ok) {
+                    console.error("Failed to fetch new messages:", response.statusText);
+                    return;
+                }
+                const page = await response.json();
+                if (show) {
+                    page.messages.forEach(msg => {
+                        // This tab already shows the messages it sent itself
+                        if (msg.role === 'user' && localUserMessages.length && localUserMessages[0] === msg.content) {
+                            localUserMessages.shift();
+                            return;
+                        }
+                        showHistoryMessage(msg);
+                    });
+                } else {
+                    localUserMessages = [];
+                }
+                if (page.newest_id !== null) {
+                    newestMessageId = page.newest_id;
+                }
+                hasMore = page.has_more;
+            }
+        } catch (error) {
+            console.error("Error fetching new messages:", error);
+        }
+    }
+
+    gameState.elements.chatWindow.addEventListener('scroll', () => {
+        if (gameState.elements.chatWindow.scrollTop < 50) {
+            loadOlderMessages();
+        }
+    });
+
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'visible' && !gameState._streamingContent && turnsInFlight === 0) {
+            syncNewMessages();
+        }
+    });
+
     // Load the history when the page loads
     loadConversationHistory();
 
@@ -797,11 +945,22 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 
     const sendButton = document.getElementById("send-button");
+    let narrativesDone = 0; // 'narrative_done' events received so far
+    // Turns sent and not finished yet (reply not shown, or streamed reply not done). While
+    // one is in flight this tab has shown the player's message but not moved its history
+    // cursor past it, so a sync would show that message a second time.
+    let turnsInFlight = 0;
+    // Player messages this tab has shown but its history cursor has not moved past yet
+    let localUserMessages = [];
 
     async function sendMessage() {
         const message = gameState.getChatInput().trim();
         if (message) {
+            const narrativesDoneBefore = narrativesDone;
+            let streaming = false;
+            turnsInFlight += 1;
             gameState.addMessageAsUser(message);
+            localUserMessages.push(message);
             console.log("Sending message:", message);
             gameState.setChatInput(""); // Clear input using the setter
 
@@ -811,7 +970,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     headers: {
                         'Content-Type': 'application/json'
                     },
-                    body: JSON.stringify({ message: message, session_id: gameSessionId })
+                    body: JSON.stringify({ message: message, session_id: gameSessionId, stream: socket.connected })
                 });
 
                 if (!response.ok) {
@@ -821,28 +980,39 @@ document.addEventListener('DOMContentLoaded', () => {
                 }
 
                 const data = await response.json();
+                if (data.streaming) {
+                    // The turn ends with its 'narrative_done' (which may already have come)
+                    streaming = true;
+                    // Tokens arrive over the websocket ('narrative_token' / 'narrative_done').
+                    // The server starts streaming before it answers, so the first token may
+                    // already have opened the reply's bubble, or the reply may even be done.
+                    if (!gameState._streamingContent && narrativesDone === narrativesDoneBefore) {
+                        gameState.beginStreamingResponse();
+                    }
+                    return;
+                }
                 gameState.addMessageAsResponse(data.response);
-
-                // Update safety level after getting a response
-                updateSafetyLevel();
-                // Update perceived time of day after getting a response
-                updatePerceivedTimeOfDay();
-                // Update environment accuracy modifier after getting a response
-                updateEnvironmentAccuracyModifier();
-                // Update location/terrain category after getting a response
-                updateLocationTerrainCategory();
-                // Update temperature after getting a response
-                updateTemperature();
-                // Update token counters after getting a response
-                updateTokenCounters();
+                syncNewMessages(false);
+                updateIndicatorsAfterResponse();
 
             } catch (error) {
                 console.error("Error sending message to LLM:", error);
                 gameState.addMessageAsResponse("Error: An unexpected error occurred while communicating with the LLM.");
+            } finally {
+                if (!streaming && turnsInFlight > 0) {
+                    turnsInFlight -= 1;
+                }
             }
         }
     }
 
+    function updateIndicatorsAfterResponse() {
+        // Update all world-state indicators after getting a response
+        updateWorldStateIndicators();
+        // Update token counters after getting a response
+        updateTokenCounters();
+    }
+
     sendButton.addEventListener("click", sendMessage);
 
     gameState.elements.chatInput.addEventListener("keydown", (event) => {
@@ -1140,115 +1310,40 @@ document.addEventListener('DOMContentLoaded', () => {
     // Update balance every 30 seconds
     setInterval(updateOpenRouterBalance, 30000);
 
-    // Function to fetch and update safety level
-    async function updateSafetyLevel() {
+    // Function to fetch and update all world-state indicators (safety level, perceived time of day,
+    // environment accuracy modifier, location/terrain category, temperature) with one request
+    async function updateWorldStateIndicators() {
         if (!gameSessionId) return;
 
         try {
-            const response = await fetch(`/api/get_safety_level?session_id=${gameSessionId}`);
+            const response = await fetch(`/api/get_world_state_indicators?session_id=${gameSessionId}`);
             if (!response.ok) {
-                console.error("Failed to fetch safety level:", response.statusText);
+                console.error("Failed to fetch world-state indicators:", response.statusText);
                 return;
             }
             const data = await response.json();
             if (data.safety_level !== undefined) {
                 gameState.setDangerIndex(data.safety_level);
             }
-        } catch (error) {
-            console.error("Error fetching safety level:", error);
-        }
-    }
-
-    // Update safety level on page load (once)
-    updateSafetyLevel();
-
-    // Function to fetch and update perceived time of day
-    async function updatePerceivedTimeOfDay() {
-        if (!gameSessionId) return;
-
-        try {
-            const response = await fetch(`/api/get_perceived_time_of_day?session_id=${gameSessionId}`);
-            if (!response.ok) {
-                console.error("Failed to fetch perceived time of day:", response.statusText);
-                return;
-            }
-            const data = await response.json();
             if (data.perceived_time_of_day !== undefined) {
                 gameState.setTimeOfDayIndex(data.perceived_time_of_day);
             }
-        } catch (error) {
-            console.error("Error fetching perceived time of day:", error);
-        }
-    }
-
-    // Update perceived time of day on page load (once)
-    updatePerceivedTimeOfDay();
-
-    // Function to fetch and update environment accuracy modifier
-    async function updateEnvironmentAccuracyModifier() {
-        if (!gameSessionId) return;
-
-        try {
-            const response = await fetch(`/api/get_environment_accuracy_modifier?session_id=${gameSessionId}`);
-            if (!response.ok) {
-                console.error("Failed to fetch environment accuracy modifier:", response.statusText);
-                return;
-            }
-            const data = await response.json();
             if (data.environment_accuracy_modifier !== undefined) {
                 gameState.setEnvironmentIndex(data.environment_accuracy_modifier);
             }
-        } catch (error) {
-            console.error("Error fetching environment accuracy modifier:", error);
-        }
-    }
-
-    // Update environment accuracy modifier on page load (once)
-    updateEnvironmentAccuracyModifier();
-
-    // Function to fetch and update location/terrain category
-    async function updateLocationTerrainCategory() {
-        if (!gameSessionId) return;
-
-        try {
-            const response = await fetch(`/api/get_location_terrain_category?session_id=${gameSessionId}`);
-            if (!response.ok) {
-                console.error("Failed to fetch location/terrain category:", response.statusText);
-                return;
-            }
-            const data = await response.json();
             if (data.location_terrain_category !== undefined) {
                 gameState.setLocationIndex(data.location_terrain_category);
             }
-        } catch (error) {
-            console.error("Error fetching location/terrain category:", error);
-        }
-    }
-
-    // Update location/terrain category on page load (once)
-    updateLocationTerrainCategory();
-
-    // Function to fetch and update temperature
-    async function updateTemperature() {
-        if (!gameSessionId) return;
-
-        try {
-            const response = await fetch(`/api/get_temperature?session_id=${gameSessionId}`);
-            if (!response.ok) {
-                console.error("Failed to fetch temperature:", response.statusText);
-                return;
-            }
-            const data = await response.json();
             if (data.temperature !== undefined) {
                 gameState.setTemperatureIndex(data.temperature);
             }
         } catch (error) {
-            console.error("Error fetching temperature:", error);
+            console.error("Error fetching world-state indicators:", error);
         }
     }
 
-    // Update temperature on page load (once)
-    updateTemperature();
+    // Update world-state indicators on page load (once)
+    updateWorldStateIndicators();
 
     // Function to fetch and update token counters
     async function updateTokenCounters() {
@@ -1283,8 +1378,47 @@ document.addEventListener('DOMContentLoaded', () => {
 
     const socket = io.connect('http://' + document.domain + ':' + location.port);
 
+    let socketConnectedBefore = false;
     socket.on('connect', function() {
         console.log('Websocket connected!');
+        // Join this game session's room to receive streamed narrative tokens
+        socket.emit('join_session', { session_id: gameSessionId });
+        // After a reconnect, pick up messages saved while the socket was down
+        if (socketConnectedBefore) {
+            if (gameState._streamingContent || turnsInFlight > 0) {
+                // The reply's tokens or its 'narrative_done' may have been lost with the old
+                // socket: drop the partial bubble and take the turn from the history instead.
+                // A reply still streaming reopens a bubble with its next token.
+                gameState.discardStreamingResponse();
+                turnsInFlight = 0;
+            }
+            syncNewMessages();
+        }
+        socketConnectedBefore = true;
+    });
+
+    socket.on('narrative_token', function(data) {
+        gameState.appendToStreamingResponse(data.token);
+    });
+
+    socket.on('narrative_done', function(data) {
+        narrativesDone += 1;
+        // A turn recovered after a reconnect may already show its reply from the history
+        const ownTurn = turnsInFlight > 0;
+        if (ownTurn) {
+            turnsInFlight -= 1;
+        }
+        if (data.error) {
+            console.error("Narrative stream failed:", data.error);
+            gameState.endStreamingResponse("Error: Could not get a response from the LLM.", ownTurn);
+        } else {
+            gameState.endStreamingResponse(data.response, ownTurn);
+        }
+        syncNewMessages(false);
+        if (data.tesa && data.tesa.perceived_time_days && data.tesa.temporal_drift_days) {
+            gameState.setTESAData(data.tesa.perceived_time_days, data.tesa.temporal_drift_days);
+        }
+        updateIndicatorsAfterResponse();
     });
 
     socket.on('update', function(data) {